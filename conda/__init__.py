@@ -5,10 +5,9 @@
 from __future__ import absolute_import, division, print_function, unicode_literals
 
 import os
-from os.path import dirname
+from os.path import dirname, join
 import sys
 
-from ._vendor.auxlib.packaging import get_version
 from .common.compat import text_type
 
 __all__ = (
@@ -17,8 +16,20 @@ __all__ = (
     "__copyright__",
 )
 
+
+def _get_version():
+    # Installed conda ships a .version file written at build time. Reading it directly
+    # avoids importing auxlib.packaging, which pulls in distutils on every startup.
+    try:
+        with open(join(dirname(__file__), '.version')) as fh:
+            return fh.read().strip()
+    except EnvironmentError:
+        from ._vendor.auxlib.packaging import get_version
+        return get_version(__file__)
+
+
 __name__ = "conda"
-__version__ = get_version(__file__)
+__version__ = _get_version()
 __author__ = "Anaconda, Inc."
 __email__ = "conda@continuum.io"
 __license__ = "BSD-3-Clause"
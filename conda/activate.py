@@ -53,6 +53,10 @@ class _Activator(object):
 
     hook_source_path = None
 
+    # When set, the output of 'activate' is stored in this conda.gateways.activation_cache
+    # ActivationCache, to be served on repeat activations without loading the context.
+    activation_cache = None
+
     def __init__(self, arguments=None):
         self._raw_arguments = arguments
 
@@ -80,7 +84,22 @@ class _Activator(object):
             builder_result = self.build_stack(self.env_name_or_prefix)
         else:
             builder_result = self.build_activate(self.env_name_or_prefix)
-        return self._finalize(self._yield_commands(builder_result), self.tempfile_extension)
+        commands = tuple(self._yield_commands(builder_result))
+        if self.activation_cache is not None:
+            self.activation_cache.save(
+                self.command_join.join(concatv(commands, ('',))),
+                self.tempfile_extension,
+                self._activation_dependencies(self._locate_prefix(self.env_name_or_prefix)),
+            )
+        return self._finalize(commands, self.tempfile_extension)
+
+    def _activation_dependencies(self, prefix):
+        # paths, besides the condarc files, whose change invalidates a cached activation
+        paths = [join(prefix, 'conda-meta'), join(prefix, 'etc', 'conda', 'activate.d')]
+        old_conda_prefix = self.environ.get('CONDA_PREFIX')
+        if old_conda_prefix:
+            paths.append(join(old_conda_prefix, 'etc', 'conda', 'deactivate.d'))
+        return paths
 
     def deactivate(self):
         return self._finalize(self._yield_commands(self.build_deactivate()),
@@ -183,15 +202,7 @@ class _Activator(object):
         return self._build_activate_stack(env_name_or_prefix, True)
 
     def _build_activate_stack(self, env_name_or_prefix, stack):
-        if re.search(r'\\|/', env_name_or_prefix):
-            prefix = expand(env_name_or_prefix)
-            if not isdir(join(prefix, 'conda-meta')):
-                from .exceptions import EnvironmentLocationNotFound
-                raise EnvironmentLocationNotFound(prefix)
-        elif env_name_or_prefix in (ROOT_ENV_NAME, 'root'):
-            prefix = context.root_prefix
-        else:
-            prefix = locate_prefix_by_name(env_name_or_prefix)
+        prefix = self._locate_prefix(env_name_or_prefix)
 
         # query environment
         old_conda_shlvl = int(self.environ.get('CONDA_SHLVL', '').strip() or 0)
@@ -264,6 +275,19 @@ class _Activator(object):
             'activate_scripts': activate_scripts,
         }
 
+    @staticmethod
+    def _locate_prefix(env_name_or_prefix):
+        if re.search(r'\\|/', env_name_or_prefix):
+            prefix = expand(env_name_or_prefix)
+            if not isdir(join(prefix, 'conda-meta')):
+                from .exceptions import EnvironmentLocationNotFound
+                raise EnvironmentLocationNotFound(prefix)
+        elif env_name_or_prefix in (ROOT_ENV_NAME, 'root'):
+            prefix = context.root_prefix
+        else:
+            prefix = locate_prefix_by_name(env_name_or_prefix)
+        return prefix
+
     def build_deactivate(self):
         # query environment
         old_conda_prefix = self.environ.get('CONDA_PREFIX')
@@ -802,6 +826,7 @@ activator_map = {
 
 def main(argv=None):
     from .common.compat import init_std_stream_encoding
+    from .gateways.activation_cache import ActivationCache
 
     context.__init__()  # On import, context does not include SEARCH_PATH. This line fixes that.
 
@@ -816,6 +841,7 @@ def main(argv=None):
     except KeyError:
         raise CondaError("%s is not a supported shell." % shell)
     activator = activator_cls(activator_args)
+    activator.activation_cache = ActivationCache(shell, activator_args)
     try:
         print(activator.execute(), end='')
         return 0
@@ -4,9 +4,11 @@
 from __future__ import absolute_import, division, print_function, unicode_literals
 
 from errno import ENOENT
+import json
 from logging import getLogger
 import os
-from os.path import abspath, basename, expanduser, isdir, isfile, join, split as path_split
+from os.path import (abspath, basename, dirname, expanduser, isdir, isfile, join,
+                     split as path_split)
 import platform
 import sys
 
@@ -15,7 +17,7 @@ from .constants import (APP_NAME, DEFAULTS_CHANNEL_NAME, DEFAULT_AGGRESSIVE_UPDA
                         DepsModifier, ERROR_UPLOAD_URL, PLATFORM_DIRECTORIES, PREFIX_MAGIC_FILE,
                         PathConflict, ROOT_ENV_NAME, SEARCH_PATH, SafetyChecks, UpdateModifier)
 from .. import __version__ as CONDA_VERSION
-from .._vendor.appdirs import user_data_dir
+from .._vendor.appdirs import user_cache_dir, user_data_dir
 from .._vendor.auxlib.decorators import memoize, memoizedproperty
 from .._vendor.auxlib.ish import dals
 from .._vendor.boltons.setutils import IndexedSet
@@ -26,7 +28,7 @@ from ..common.configuration import (Configuration, ConfigurationLoadError, MapPa
                                     PrimitiveParameter, SequenceParameter, ValidationError)
 from ..common.disk import conda_bld_ensure_dir
 from ..common.path import expand
-from ..common.os.linux import linux_get_libc_version
+from ..common.os.linux import linux_get_boot_id, linux_get_cpu_flags, linux_get_libc_version
 from ..common.url import has_scheme, path_to_url, split_scheme_auth_token
 
 try:
@@ -62,6 +64,9 @@ _arch_names = {
 user_rc_path = abspath(expanduser('~/.condarc'))
 sys_rc_path = join(sys.prefix, '.condarc')
 
+CPU_INFO_CACHE_PATH = expand(join('~', '.conda', 'cpu_info.json'))
+CPU_INFO_CACHE_VERSION = 1
+
 
 def channel_alias_validation(value):
     if value and not has_scheme(value):
@@ -118,6 +123,7 @@ class Context(Configuration):
     enable_private_envs = PrimitiveParameter(False)
     force_32bit = PrimitiveParameter(False)
     non_admin_enabled = PrimitiveParameter(True)
+    post_link_threads = PrimitiveParameter(1, element_type=int)
 
     pip_interop_enabled = PrimitiveParameter(False)
 
@@ -132,6 +138,7 @@ class Context(Configuration):
     disallowed_packages = SequenceParameter(string_types, aliases=('disallow',),
                                             string_delimiter='&')
     rollback_enabled = PrimitiveParameter(True)
+    solve_cache_enabled = PrimitiveParameter(True)
     track_features = SequenceParameter(string_types)
     use_index_cache = PrimitiveParameter(False)
 
@@ -139,6 +146,7 @@ class Context(Configuration):
     _envs_dirs = SequenceParameter(string_types, aliases=('envs_dirs', 'envs_path'),
                                    string_delimiter=os.pathsep)
     _pkgs_dirs = SequenceParameter(string_types, aliases=('pkgs_dirs',))
+    _content_store_dir = PrimitiveParameter('', aliases=('content_store_dir',))
     _subdir = PrimitiveParameter('', aliases=('subdir',))
     _subdirs = SequenceParameter(string_types, aliases=('subdirs',))
 
@@ -159,6 +167,7 @@ class Context(Configuration):
     remote_connect_timeout_secs = PrimitiveParameter(9.15)
     remote_read_timeout_secs = PrimitiveParameter(60.)
     remote_max_retries = PrimitiveParameter(3)
+    fetch_threads = PrimitiveParameter(5, element_type=int)
 
     add_anaconda_token = PrimitiveParameter(True, aliases=('add_binstar_token',))
 
@@ -170,6 +179,7 @@ class Context(Configuration):
                                         aliases=('channel_alias',),
                                         validation=channel_alias_validation)
     channel_priority = PrimitiveParameter(True)
+    strict_channel_priority = PrimitiveParameter(False)
     _channels = SequenceParameter(string_types, default=(DEFAULTS_CHANNEL_NAME,),
                                   aliases=('channels', 'channel',))  # channel for args.channel
     _custom_channels = MapParameter(string_types, DEFAULT_CUSTOM_CHANNELS,
@@ -424,6 +434,10 @@ class Context(Configuration):
                 self._user_data_dir,
             )))
 
+    @property
+    def content_store_dir(self):
+        return expand(self._content_store_dir) if self._content_store_dir else None
+
     @memoizedproperty
     def trash_dir(self):
         # TODO: this inline import can be cleaned up by moving pkgs_dir write detection logic
@@ -441,6 +455,11 @@ class Context(Configuration):
         else:
             return expand(join('~', '.conda'))
 
+    @property
+    def _raw_data_cache_dir(self):
+        # parsed condarc files; see YamlRawParameter.make_raw_parameters_from_cached_file
+        return join(user_cache_dir(APP_NAME, APP_NAME), 'condarc')
+
     @property
     def default_prefix(self):
         if self.active_prefix:
@@ -668,7 +687,10 @@ class Context(Configuration):
 
     @memoizedproperty
     def cpu_flags(self):
-        # DANGER: This is rather slow
+        # /proc/cpuinfo is cheap to read; elsewhere fall back to the (rather slow) cpuinfo module
+        flags = linux_get_cpu_flags()
+        if flags is not None:
+            return flags
         info = _get_cpu_info()
         return info['flags']
 
@@ -692,10 +714,12 @@ class Context(Configuration):
             'env_prompt',
             'envs_dirs',
             'pkgs_dirs',
+            'content_store_dir',
         )),
         ('Network Configuration', (
             'client_ssl_cert',
             'client_ssl_cert_key',
+            'fetch_threads',
             'local_repodata_ttl',
             'offline',
             'proxy_servers',
@@ -708,12 +732,14 @@ class Context(Configuration):
             'aggressive_update_packages',
             'auto_update_conda',
             'channel_priority',
+            'strict_channel_priority',
             'create_default_packages',
             'disallowed_packages',
             'pinned_packages',
             'track_features',
             'prune',
             'force_reinstall',
+            'solve_cache_enabled',
         )),
         ('Package Linking and Install-time Configuration', (
             'allow_softlinks',
@@ -724,6 +750,7 @@ class Context(Configuration):
             'safety_checks',
             'shortcuts',
             'non_admin_enabled',
+            'post_link_threads',
         )),
         ('Conda-build Configuration', (
             'bld_path',
@@ -810,7 +837,8 @@ class Context(Configuration):
                 """),
             'always_copy': dals("""
                 Register a preference that files be copied into a prefix during install rather
-                than hard-linked.
+                than hard-linked. On filesystems supporting copy-on-write clones (e.g. btrfs, or
+                XFS with reflink), files are cloned rather than having their contents copied.
                 """),
             'always_softlink': dals("""
                 Register a preference that files be soft-linked (symlinked) into a prefix during
@@ -873,6 +901,16 @@ class Context(Configuration):
             'create_default_packages': dals("""
                 Packages that are by default added to a newly created environments.
                 """),  # TODO: This is a bad parameter name. Consider an alternate.
+            'content_store_dir': dals("""
+                A directory holding one copy of each file of the packages extracted into
+                pkgs_dirs, keyed by the file's sha256. Extracted packages hardlink their files
+                to it, so identical files across package builds and across package caches share
+                disk space. Only package caches on the same filesystem as this directory are
+                deduplicated. A store may be shared between users, but files are only linked
+                to store copies the current user added, as a file's owner can change it in
+                place. Files no longer used by any package are removed by
+                'conda clean --packages'. Disabled when empty.
+                """),
             'croot': dals("""
                 The location where conda-build will put built packages. Same as 'bld_path', but
                 'croot' takes precedence when both are defined. Also used in construction of the
@@ -927,6 +965,10 @@ class Context(Configuration):
                 flag), or otherwise holds the value of '{prefix}'. Templating uses python's
                 str.format() method.
                 """),
+            'fetch_threads': dals("""
+                The number of packages downloaded and extracted concurrently when installing
+                from an explicit list of package urls.
+                """),
             'force_reinstall': dals("""
                 Ensure that any user-requested package for the current operation is uninstalled
                 and reinstalled, even if that package already exists in the environment.
@@ -991,6 +1033,12 @@ class Context(Configuration):
                 install time. Packages not locally available are downloaded and extracted
                 into the first writable directory.
                 """),
+            'post_link_threads': dals("""
+                The number of post-link scripts run at the same time once a transaction's
+                packages are linked. A package's script always waits for the scripts of its
+                dependencies. Scripts of independent packages that write shared files, such
+                as editing the same config, may need this kept at 1.
+                """),
             'proxy_servers': dals("""
                 A mapping to enable proxy settings. Keys can be either (1) a scheme://hostname
                 form, which will match any request to the given scheme and exact hostname, or
@@ -1038,6 +1086,17 @@ class Context(Configuration):
             'show_channel_urls': dals("""
                 Show channel URLs when displaying what is going to be downloaded.
                 """),
+            'strict_channel_priority': dals("""
+                When True, and channel_priority is enabled, packages of a given name are only
+                taken from the highest-priority channel that carries that name. Lower-priority
+                channels are not considered for that name at all, which also keeps their
+                dependencies out of the solve.
+                """),
+            'solve_cache_enabled': dals("""
+                Reuse the solution of an earlier, identical solve while the repodata of every
+                channel is unchanged and unexpired. Solutions are kept in
+                ~/.conda/solve_cache.
+                """),
             'ssl_verify': dals("""
                 Conda verifies SSL certificates for HTTPS requests, just like a web
                 browser. By default, SSL verification is enabled, and conda operations will
@@ -1083,9 +1142,60 @@ def reset_context(search_path=SEARCH_PATH, argparse_args=None):
 
 @memoize
 def _get_cpu_info():
-    # DANGER: This is rather slow
-    from .._vendor.cpuinfo import get_cpu_info
-    return frozendict(get_cpu_info())
+    # DANGER: This is rather slow, so the result is kept on disk for as long as the host,
+    # kernel and boot are unchanged
+    fingerprint = _cpu_info_fingerprint()
+    info = _read_cpu_info_cache(fingerprint)
+    if info is None:
+        from .._vendor.cpuinfo import get_cpu_info
+        info = get_cpu_info()
+        _write_cpu_info_cache(fingerprint, info)
+    return frozendict(info)
+
+
+def _cpu_info_fingerprint():
+    try:
+        cpuinfo_mtime = os.stat('/proc/cpuinfo').st_mtime
+    except EnvironmentError:
+        cpuinfo_mtime = None
+    return [
+        list(platform.uname()),
+        linux_get_boot_id(),
+        cpuinfo_mtime,
+        sys.executable,
+        sys.version,
+    ]
+
+
+def _read_cpu_info_cache(fingerprint):
+    try:
+        with open(CPU_INFO_CACHE_PATH) as fh:
+            cache = json.load(fh)
+    except (EnvironmentError, ValueError):
+        return None
+    if (not isinstance(cache, dict) or cache.get('version') != CPU_INFO_CACHE_VERSION
+            or cache.get('fingerprint') != fingerprint):
+        return None
+    return cache.get('info')
+
+
+def _write_cpu_info_cache(fingerprint, info):
+    tmp_path = '%s.%s.tmp' % (CPU_INFO_CACHE_PATH, os.getpid())
+    try:
+        if not isdir(dirname(CPU_INFO_CACHE_PATH)):
+            os.makedirs(dirname(CPU_INFO_CACHE_PATH))
+        with open(tmp_path, 'w') as fh:
+            json.dump({
+                'version': CPU_INFO_CACHE_VERSION,
+                'fingerprint': fingerprint,
+                'info': info,
+            }, fh)
+        if on_win and isfile(CPU_INFO_CACHE_PATH):
+            os.unlink(CPU_INFO_CACHE_PATH)
+        os.rename(tmp_path, CPU_INFO_CACHE_PATH)
+    except (EnvironmentError, TypeError, ValueError) as e:
+        # the cache is only an optimization
+        log.debug("unable to write cpu info cache %s: %r", CPU_INFO_CACHE_PATH, e)
 
 
 def locate_prefix_by_name(name, envs_dirs=None):
@@ -5,6 +5,7 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 
 from argparse import (ArgumentParser as ArgumentParserBase, REMAINDER, RawDescriptionHelpFormatter,
                       SUPPRESS, _CountAction, _HelpAction)
+from functools import partial
 from logging import getLogger
 import os
 from os.path import abspath, expanduser, join
@@ -25,7 +26,14 @@ escaped_user_rc_path = user_rc_path.replace("%", "%%")
 escaped_sys_rc_path = abspath(join(sys.prefix, '.condarc')).replace("%", "%%")
 
 
-def generate_parser():
+def generate_parser(command=None):
+    """Build the conda argument parser.
+
+    When ``command`` names a known subcommand, only that subcommand's parser is configured,
+    which keeps startup cheap for the common case of running a single command. Otherwise
+    (no command, 'help', or an unknown command that may be an external ``conda-<command>``)
+    every subcommand is configured.
+    """
     p = ArgumentParser(
         description='conda is a tool for managing and deploying applications,'
                     ' environments and packages.',
@@ -54,21 +62,29 @@ def generate_parser():
     # http://stackoverflow.com/a/18283730/1599393
     sub_parsers.required = True
 
-    configure_parser_clean(sub_parsers)
-    configure_parser_config(sub_parsers)
-    configure_parser_create(sub_parsers)
-    configure_parser_help(sub_parsers)
-    configure_parser_info(sub_parsers)
-    configure_parser_init(sub_parsers)
-    configure_parser_install(sub_parsers)
-    configure_parser_list(sub_parsers)
-    configure_parser_package(sub_parsers)
-    configure_parser_remove(sub_parsers)
-    configure_parser_remove(sub_parsers, name='uninstall')
-    configure_parser_run(sub_parsers)
-    configure_parser_search(sub_parsers)
-    configure_parser_update(sub_parsers)
-    configure_parser_update(sub_parsers, name='upgrade')
+    configure_subcommands = (
+        ('clean', configure_parser_clean),
+        ('config', configure_parser_config),
+        ('create', configure_parser_create),
+        ('help', configure_parser_help),
+        ('info', configure_parser_info),
+        ('init', configure_parser_init),
+        ('install', configure_parser_install),
+        ('list', configure_parser_list),
+        ('package', configure_parser_package),
+        ('remove', configure_parser_remove),
+        ('uninstall', partial(configure_parser_remove, name='uninstall')),
+        ('run', configure_parser_run),
+        ('search', configure_parser_search),
+        ('update', configure_parser_update),
+        ('upgrade', partial(configure_parser_update, name='upgrade')),
+    )
+    if command == 'help' or command not in {name for name, _ in configure_subcommands}:
+        # 'conda help' prints the top-level usage, which lists every subcommand
+        command = None
+    for name, configure_subcommand in configure_subcommands:
+        if command is None or name == command:
+            configure_subcommand(sub_parsers)
 
     return p
 
@@ -872,6 +888,15 @@ def configure_parser_package(sub_parsers):
         default=0,
         help="Package build number of the created package.",
     )
+    p.add_argument(
+        "--compress-threads",
+        action="store",
+        type=int,
+        default=1,
+        help="Number of threads used to bzip2-compress the created package. With more "
+             "than one thread, the package is written as a multi-stream bzip2 file, which "
+             "older conda versions running on Python 2 can't fully read.",
+    )
     p.set_defaults(func='.main_package.execute')
 
 
@@ -1386,6 +1411,15 @@ def add_parser_solver_mode(p):
         help="Package version takes precedence over channel priority. "
              "Overrides the value given by `conda config --show channel_priority`."
     )
+    solver_mode_options.add_argument(
+        "--strict-channel-priority",
+        action="store_true",
+        dest="strict_channel_priority",
+        default=NULL,
+        help="Packages of a given name are only taken from the highest-priority channel "
+             "that has them. Overrides the value given by "
+             "`conda config --show strict_channel_priority`."
+    )
     deps_modifiers.add_argument(
         "--no-deps",
         action="store_const",
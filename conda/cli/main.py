@@ -39,16 +39,19 @@ import sys
 PARSER = None
 
 
-def generate_parser():
+def generate_parser(command=None):
     # Generally using `global` is an anti-pattern.  But it's the lightest-weight way to memoize
     # or do a singleton.  I'd normally use the `@memoize` decorator here, but I don't want
     # to copy in the code or take the import hit.
+    # Parsers built for a single command only configure that subcommand, and aren't memoized.
     global PARSER
-    if PARSER is not None:
+    if command is None and PARSER is not None:
         return PARSER
     from .conda_argparse import generate_parser
-    PARSER = generate_parser()
-    return PARSER
+    parser = generate_parser(command)
+    if command is None:
+        PARSER = parser
+    return parser
 
 
 def init_loggers(context=None):
@@ -68,7 +71,9 @@ def _main(*args, **kwargs):
     if len(args) == 1:
         args = args + ('-h',)
 
-    p = generate_parser()
+    # the first positional argument is the subcommand; top-level options take no values
+    command = next((arg for arg in args[1:] if not arg.startswith('-')), None)
+    p = generate_parser(command)
     args = p.parse_args(args[1:])
 
     from ..base.context import context
@@ -101,8 +106,14 @@ def main(*args, **kwargs):
         try:
             argv1 = args[1].strip()
             if argv1.startswith('shell.'):
+                # Serve repeat activations before conda.activate pulls in the context.
+                from ..gateways.activation_cache import ActivationCache
+                output = ActivationCache(argv1.replace('shell.', '', 1), args[2:]).load()
+                if output is not None:
+                    print(output, end='')
+                    return 0
                 from ..activate import main as activator_main
-                return activator_main()
+                return activator_main(args)
             elif argv1.startswith('..'):
                 import conda.cli.activate as activate
                 activate.main()
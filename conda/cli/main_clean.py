@@ -3,7 +3,8 @@
 # SPDX-License-Identifier: BSD-3-Clause
 from __future__ import absolute_import, division, print_function, unicode_literals
 
-from collections import defaultdict
+from collections import Counter, defaultdict
+from functools import partial
 from logging import getLogger
 from os import listdir, lstat, walk
 from os.path import getsize, isdir, join, exists
@@ -89,54 +90,95 @@ def find_pkgs():
     # themselves, like bin/python3.3 and bin/python3.3m in the Python package
     warnings = []
 
-    from ..gateways.disk.link import CrossPlatformStLink
-    cross_platform_st_nlink = CrossPlatformStLink()
+    from ..common.io import ThreadLimitedThreadPoolExecutor
     pkgs_dirs = defaultdict(list)
+    totalsize = 0
+    pkgsizes = defaultdict(list)
+    cache_links = None
+    if context.content_store_dir:
+        cache_links = _count_cache_links(context.pkgs_dirs, context.content_store_dir)
     for pkgs_dir in context.pkgs_dirs:
         if not exists(pkgs_dir):
             if not context.json:
                 print("WARNING: {0} does not exist".format(pkgs_dir))
             continue
         pkgs = [i for i in listdir(pkgs_dir) if isdir(join(pkgs_dir, i, 'info'))]
-        for pkg in pkgs:
-            breakit = False
-            for root, dir, files in walk(join(pkgs_dir, pkg)):
-                for fn in files:
-                    try:
-                        st_nlink = cross_platform_st_nlink(join(root, fn))
-                    except OSError as e:
-                        warnings.append((fn, e))
-                        continue
-                    if st_nlink > 1:
-                        # print('%s is installed: %s' % (pkg, join(root, fn)))
-                        breakit = True
-                        break
-
-                if breakit:
-                    break
-            else:
+        # each package's check is independent, and mostly waiting on the filesystem
+        with ThreadLimitedThreadPoolExecutor() as executor:
+            results = tuple(executor.map(partial(_check_pkg_unused, cache_links=cache_links),
+                                         (join(pkgs_dir, pkg) for pkg in pkgs)))
+        for pkg, (unused, pkgsize, pkg_warnings) in zip(pkgs, results):
+            warnings.extend(pkg_warnings)
+            if unused:
                 pkgs_dirs[pkgs_dir].append(pkg)
-
-    totalsize = 0
-    pkgsizes = defaultdict(list)
-    for pkgs_dir in pkgs_dirs:
-        for pkg in pkgs_dirs[pkgs_dir]:
-            pkgsize = 0
-            for root, dir, files in walk(join(pkgs_dir, pkg)):
-                for fn in files:
-                    # We don't have to worry about counting things twice:  by
-                    # definition these files all have a link count of 1!
-                    size = lstat(join(root, fn)).st_size
-                    totalsize += size
-                    pkgsize += size
-            pkgsizes[pkgs_dir].append(pkgsize)
+                pkgsizes[pkgs_dir].append(pkgsize)
+                totalsize += pkgsize
 
     return pkgs_dirs, warnings, totalsize, pkgsizes
 
 
+def _count_cache_links(pkgs_dirs, content_store_dir):
+    # The content store makes identical files of different packages share one inode. Returns,
+    #   for each inode with several links, how many of them are in extracted packages or the
+    #   store; only links beyond those come from outside the caches, i.e. from environments.
+    cache_links = Counter()
+    roots = [join(pkgs_dir, pkg) for pkgs_dir in pkgs_dirs if isdir(pkgs_dir)
+             for pkg in listdir(pkgs_dir) if isdir(join(pkgs_dir, pkg, 'info'))]
+    roots.append(content_store_dir)
+    for root_dir in roots:
+        for root, _, files in walk(root_dir):
+            for fn in files:
+                try:
+                    st = lstat(join(root, fn))
+                except OSError:
+                    continue
+                if st.st_nlink > 1:
+                    cache_links[(st.st_dev, st.st_ino)] += 1
+    return cache_links
+
+
+def _check_pkg_unused(pkg_path, cache_links=None):
+    # returns a tuple of (unused, size of package, warnings)
+    # The usage record maintained by UnlinkLinkTransaction answers that a package is in use
+    #   without touching its files. Otherwise, the package is confirmed unused by finding no
+    #   file with a link count greater than one. By definition, every file in an unused package
+    #   has a link count of one, so the package size is summed in the same walk. With the
+    #   content store, links from other packages and from the store itself aren't counted; a
+    #   file shared with an environment keeps every package it's in.
+    from ..core.package_cache_data import PackageUsageData
+    from ..gateways.disk.link import CrossPlatformStLink
+    if PackageUsageData(pkg_path).in_use():
+        return False, 0, ()
+
+    warnings = []
+    cross_platform_st_nlink = CrossPlatformStLink()
+    if cache_links is None and context.content_store_dir:
+        cache_links = _count_cache_links(context.pkgs_dirs, context.content_store_dir)
+    pkgsize = 0
+    for root, dir, files in walk(pkg_path):
+        for fn in files:
+            path = join(root, fn)
+            try:
+                st_nlink = cross_platform_st_nlink(path)
+                if cache_links and st_nlink > 1:
+                    st = lstat(path)
+                    # the package's own link is the one left
+                    st_nlink -= (cache_links.get((st.st_dev, st.st_ino)) or 1) - 1
+            except OSError as e:
+                warnings.append((fn, e))
+                continue
+            if st_nlink > 1:
+                return False, 0, warnings
+            try:
+                pkgsize += lstat(path).st_size
+            except OSError as e:
+                warnings.append((fn, e))
+    return True, pkgsize, warnings
+
+
 def rm_pkgs(args, pkgs_dirs, warnings, totalsize, pkgsizes, verbose=True):
     from .common import confirm_yn
-    from ..gateways.disk.delete import rm_rf
+    from ..gateways.disk.delete import bulk_rm_rf
     from ..utils import human_bytes
     if verbose:
         for pkgs_dir in pkgs_dirs:
@@ -168,11 +210,20 @@ def rm_pkgs(args, pkgs_dirs, warnings, totalsize, pkgsizes, verbose=True):
     if context.json and args.dry_run:
         return
 
+    paths = []
     for pkgs_dir in pkgs_dirs:
         for pkg in pkgs_dirs[pkgs_dir]:
             if verbose:
                 print("removing %s" % pkg)
-            rm_rf(join(pkgs_dir, pkg))
+            paths.append(join(pkgs_dir, pkg))
+    bulk_rm_rf(paths)
+
+    if context.content_store_dir:
+        from ..core.package_cache_data import PackageContentStore
+        freed = PackageContentStore(context.content_store_dir).prune()
+        if verbose and freed:
+            print("removed %s of unused files from %s"
+                  % (human_bytes(freed), context.content_store_dir))
 
 
 def rm_index_cache():
@@ -18,7 +18,7 @@ from ..base.context import context, sys_rc_path, user_rc_path
 from ..common.compat import Mapping, Sequence, isiterable, iteritems, itervalues, string_types
 from ..common.configuration import pretty_list, pretty_map
 from ..common.io import timeout
-from ..common.serialize import yaml, yaml_dump, yaml_load
+from ..common.serialize import get_yaml, yaml_dump, yaml_load
 
 
 def execute(args, parser):
@@ -342,6 +342,7 @@ def execute_config(args, parser):
         def enum_representer(dumper, data):
             return dumper.represent_str(str(data))
 
+        yaml = get_yaml()
         yaml.representer.RoundTripRepresenter.add_representer(SafetyChecks, enum_representer)
         yaml.representer.RoundTripRepresenter.add_representer(PathConflict, enum_representer)
         yaml.representer.RoundTripRepresenter.add_representer(DepsModifier, enum_representer)
@@ -11,7 +11,7 @@ from .install import install
 from ..base.context import context
 from ..common.path import paths_equal
 from ..exceptions import CondaValueError
-from ..gateways.disk.delete import delete_trash, rm_rf
+from ..gateways.disk.delete import bulk_rm_rf, delete_trash
 from ..gateways.disk.test import is_conda_environment
 
 log = getLogger(__name__)
@@ -26,7 +26,8 @@ def execute(args, parser):
                    default='no',
                    dry_run=False)
         log.info("Removing existing environment %s", context.target_prefix)
-        rm_rf(context.target_prefix)
+        # moved out of the way now; the contents are deleted by delete_trash() below
+        bulk_rm_rf((context.target_prefix,), defer=True)
     elif isdir(context.target_prefix):
         confirm_yn("WARNING: A directory already exists at the target location '%s'\n"
                    "but it is not a conda environment.\n"
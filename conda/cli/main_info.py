@@ -17,7 +17,6 @@ from ..base.context import conda_in_private_env, context, sys_rc_path, user_rc_p
 from ..common.compat import iteritems, itervalues, on_win, text_type
 from ..common.url import mask_anaconda_token
 from ..core.envs_manager import env_name
-from ..core.subdir_data import SubdirData
 from ..models.channel import all_channel_urls, offline_keep
 from ..models.match_spec import MatchSpec
 from ..utils import human_bytes
@@ -83,7 +82,7 @@ def pretty_package(prec):
 
 
 def print_package_info(packages):
-
+    from ..core.subdir_data import SubdirData
     results = {}
     for package in packages:
         spec = MatchSpec(package)
@@ -303,9 +302,14 @@ def execute(args, parser):
     if args.all or context.json:
         for option in options:
             setattr(args, option, True)
-    info_dict = get_info_dict(args.system)
+    show_main_info = args.all or all(not getattr(args, opt) for opt in options)
+    if show_main_info or args.system or context.json:
+        info_dict = get_info_dict(args.system)
+    else:
+        # 'conda info --envs' alone doesn't need the (import-heavy) info dict
+        info_dict = {}
 
-    if (args.all or all(not getattr(args, opt) for opt in options)) and not context.json:
+    if show_main_info and not context.json:
         print(get_main_info_str(info_dict))
 
     if args.envs:
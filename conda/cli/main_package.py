@@ -3,6 +3,8 @@
 # SPDX-License-Identifier: BSD-3-Clause
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+import bz2
+from collections import deque
 import hashlib
 import json
 import os
@@ -14,9 +16,9 @@ import tempfile
 from .._vendor.auxlib.entity import EntityEncoder
 from ..base.context import context
 from ..common.compat import PY3
-from ..common.path import paths_equal
+from ..common.io import ThreadLimitedThreadPoolExecutor
 from ..core.prefix_data import PrefixData
-from ..gateways.disk.delete import rmtree
+from ..gateways.disk.delete import rm_rf, rmtree
 from ..install import PREFIX_PLACEHOLDER
 from ..misc import untracked
 
@@ -43,8 +45,8 @@ def execute(args, parser):
     prefix = context.target_prefix
 
     if args.which:
-        for path in args.which:
-            for prec in which_package(path):
+        for path, precs in which_packages(args.which):
+            for prec in precs:
                 print('%-50s  %s' % (path, prec.dist_str()))
         return
 
@@ -64,7 +66,8 @@ def execute(args, parser):
     make_tarbz2(prefix,
                 name=args.pkg_name.lower(),
                 version=args.pkg_version,
-                build_number=int(args.pkg_build))
+                build_number=int(args.pkg_build),
+                compress_threads=args.compress_threads)
 
 
 def get_installed_version(prefix, name):
@@ -129,51 +132,172 @@ def _add_info_dir(t, tmp_dir, files, has_prefix, info):
         t.add(join(info_dir, fn), 'info/' + fn)
 
 
-def create_conda_pkg(prefix, files, info, tar_path, update_info=None):
+def create_conda_pkg(prefix, files, info, tar_path, update_info=None, compress_threads=1):
     """
     create a conda package with `files` (in `prefix` and `info` metadata)
     at `tar_path`, and return a list of warning strings
+
+    With compress_threads > 1, independent blocks of the tarball are compressed
+    concurrently (see ParallelBZ2Writer).
     """
     files = sorted(files)
     warnings = []
     has_prefix = []
     tmp_dir = tempfile.mkdtemp()
-    t = tarfile.open(tar_path, 'w:bz2')
-    h = hashlib.new('sha1')
-    for f in files:
-        assert not (f.startswith('/') or f.endswith('/') or '\\' in f or f == ''), f
-        path = join(prefix, f)
-        if f.startswith('bin/') and fix_shebang(tmp_dir, path):
-            path = join(tmp_dir, basename(path))
-            has_prefix.append(f)
-        t.add(path, f)
-        h.update(f.encode('utf-8'))
-        h.update(b'\x00')
-        if islink(path):
-            link = os.readlink(path)
-            if PY3 and isinstance(link, str):
-                h.update(bytes(link, 'utf-8'))
+    tar_fh = bz2_writer = t = None
+    try:
+        if compress_threads > 1:
+            tar_fh = open(tar_path, 'wb')
+            bz2_writer = ParallelBZ2Writer(tar_fh, compress_threads)
+            t = tarfile.open(mode='w|', fileobj=bz2_writer)
+        else:
+            t = tarfile.open(tar_path, 'w:bz2')
+        h = hashlib.new('sha1')
+        for f in files:
+            assert not (f.startswith('/') or f.endswith('/') or '\\' in f or f == ''), f
+            path = join(prefix, f)
+            if f.startswith('bin/') and fix_shebang(tmp_dir, path):
+                path = join(tmp_dir, basename(path))
+                has_prefix.append(f)
+            h.update(f.encode('utf-8'))
+            h.update(b'\x00')
+            tarinfo = t.gettarinfo(path, f)
+            if tarinfo.isreg():
+                # file contents are hashed as they're read into the tarball
+                with open(path, 'rb') as fh:
+                    t.addfile(tarinfo, _HashingReader(fh, h))
             else:
-                h.update(link)
-            if link.startswith('/'):
-                warnings.append('found symlink to absolute path: %s -> %s' %
-                                (f, link))
-        elif isfile(path):
-            h.update(open(path, 'rb').read())
-            if path.endswith('.egg-link'):
-                warnings.append('found egg link: %s' % f)
-
-    info['file_hash'] = h.hexdigest()
-    if update_info:
-        update_info(info)
-    _add_info_dir(t, tmp_dir, files, has_prefix, info)
-    t.close()
-    rmtree(tmp_dir)
+                t.add(path, f)
+            if islink(path):
+                link = os.readlink(path)
+                if PY3 and isinstance(link, str):
+                    h.update(bytes(link, 'utf-8'))
+                else:
+                    h.update(link)
+                if link.startswith('/'):
+                    warnings.append('found symlink to absolute path: %s -> %s' %
+                                    (f, link))
+            elif isfile(path):
+                if not tarinfo.isreg():
+                    # a hard link to a file already in the tarball
+                    with open(path, 'rb') as fh:
+                        for chunk in iter(lambda: fh.read(HASH_CHUNK_SIZE), b''):
+                            h.update(chunk)
+                if path.endswith('.egg-link'):
+                    warnings.append('found egg link: %s' % f)
+
+        info['file_hash'] = h.hexdigest()
+        if update_info:
+            update_info(info)
+        _add_info_dir(t, tmp_dir, files, has_prefix, info)
+        t.close()
+        if bz2_writer:
+            bz2_writer.close()
+            tar_fh.close()
+    except:
+        # a partially written package isn't left behind
+        if bz2_writer:
+            bz2_writer.abort()
+        if tar_fh:
+            tar_fh.close()
+        elif t:
+            t.fileobj.close()
+        rm_rf(tar_path)
+        raise
+    finally:
+        rmtree(tmp_dir)
     return warnings
 
 
+HASH_CHUNK_SIZE = 262144  # 256 KB
+
+
+class _HashingReader(object):
+    """Read-only file wrapper that feeds everything read to a hash object."""
+
+    def __init__(self, fh, hasher):
+        self._fh = fh
+        self._hasher = hasher
+
+    def read(self, size=-1):
+        data = self._fh.read(size)
+        self._hasher.update(data)
+        return data
+
+
+class ParallelBZ2Writer(object):
+    """
+    write-only file object that bzip2-compresses blocks of its input on a
+    thread pool
+
+    Each block becomes a complete bzip2 stream, and the streams are written
+    in order.  The output is a multi-stream bzip2 file, as written by pbzip2,
+    which the bzip2 tool and Python 3's bz2 and tarfile modules read like
+    any other.  On Python 2, conda's extract_tarball reads the streams one
+    after the other, but older conda versions stop after the first one.
+    Blocks are a multiple of bzip2's own 900 KB block size, so the
+    compression ratio is about the same as single-threaded output.
+    """
+
+    block_size = 4 * 900000
+
+    def __init__(self, fileobj, threads, compresslevel=9):
+        self._fileobj = fileobj
+        self._compresslevel = compresslevel
+        self._executor = ThreadLimitedThreadPoolExecutor(threads)
+        # bounds memory use when compression can't keep up with writes
+        self._max_pending = 2 * threads
+        self._pending = deque()
+        self._buffer = []
+        self._buffered = 0
+        self._streams = 0
+
+    def write(self, data):
+        self._buffer.append(data)
+        self._buffered += len(data)
+        if self._buffered >= self.block_size:
+            data = b''.join(self._buffer)
+            block_count = len(data) // self.block_size
+            for q in range(block_count):
+                self._submit(data[q * self.block_size:(q + 1) * self.block_size])
+            remainder = data[block_count * self.block_size:]
+            self._buffer = [remainder]
+            self._buffered = len(remainder)
+
+    def close(self):
+        if self._executor is None:
+            return
+        if self._buffered or not self._streams:
+            self._submit(b''.join(self._buffer))
+        self._buffer = []
+        self._buffered = 0
+        while self._pending:
+            self._fileobj.write(self._pending.popleft().result())
+        self._executor.shutdown()
+        self._executor = None
+
+    def abort(self):
+        """Stop compressing, without writing out the blocks that are still pending."""
+        if self._executor is None:
+            return
+        for future in self._pending:
+            future.cancel()
+        self._pending.clear()
+        self._buffer = []
+        self._buffered = 0
+        self._executor.shutdown()
+        self._executor = None
+
+    def _submit(self, block):
+        # bz2.compress releases the GIL while compressing
+        self._pending.append(self._executor.submit(bz2.compress, block, self._compresslevel))
+        self._streams += 1
+        while len(self._pending) > self._max_pending:
+            self._fileobj.write(self._pending.popleft().result())
+
+
 def make_tarbz2(prefix, name='unknown', version='0.0', build_number=0,
-                files=None):
+                files=None, compress_threads=1):
     if files is None:
         files = untracked(prefix)
     print("# files: %d" % len(files))
@@ -190,7 +314,7 @@ def make_tarbz2(prefix, name='unknown', version='0.0', build_number=0,
 
     info = create_info(name, version, build_number, requires_py)
     tarbz2_fn = '%(name)s-%(version)s-%(build)s.tar.bz2' % info
-    create_conda_pkg(prefix, files, info, tarbz2_fn)
+    create_conda_pkg(prefix, files, info, tarbz2_fn, compress_threads=compress_threads)
     print('# success')
     print(tarbz2_fn)
     return tarbz2_fn
@@ -208,9 +332,27 @@ def which_package(path):
         from ..exceptions import CondaVerificationError
         raise CondaVerificationError("could not determine conda prefix from: %s" % path)
 
-    for prec in PrefixData(prefix).iter_records():
-        if any(paths_equal(join(prefix, f), path) for f in prec['files'] or ()):
-            yield prec
+    for prec in PrefixData(prefix).iter_path_owners(path):
+        yield prec
+
+
+def which_packages(paths):
+    """
+    batch form of which_package; yields (path, tuple of package records) for each
+    of the given paths, in order.  Prefix lookups are shared between paths in the
+    same directory.
+    """
+    prefixes = {}
+    for path in paths:
+        full_path = abspath(path)
+        path_dir = full_path if isdir(join(full_path, 'conda-meta')) else dirname(full_path)
+        if path_dir not in prefixes:
+            prefixes[path_dir] = which_prefix(path_dir)
+        prefix = prefixes[path_dir]
+        if prefix is None:
+            from ..exceptions import CondaVerificationError
+            raise CondaVerificationError("could not determine conda prefix from: %s" % path)
+        yield path, tuple(PrefixData(prefix).iter_path_owners(full_path))
 
 
 def which_prefix(path):
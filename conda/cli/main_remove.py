@@ -15,7 +15,7 @@ from ..core.link import PrefixSetup, UnlinkLinkTransaction
 from ..core.prefix_data import PrefixData
 from ..core.solve import Solver
 from ..exceptions import CondaEnvironmentError, CondaValueError
-from ..gateways.disk.delete import delete_trash, rm_rf
+from ..gateways.disk.delete import bulk_rm_rf, delete_trash
 from ..gateways.disk.test import is_conda_environment
 from ..models.match_spec import MatchSpec
 
@@ -60,7 +60,7 @@ def execute(args, parser):
             txn = UnlinkLinkTransaction(stp)
             handle_txn(txn, prefix, args, False, True)
 
-        rm_rf(prefix)
+        bulk_rm_rf((prefix,))
         unregister_env(prefix)
 
         return
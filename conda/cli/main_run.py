@@ -1,79 +1,153 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+from hashlib import md5
 import json
+from logging import getLogger
 import os
-from os.path import abspath, join
+from os.path import isdir, isfile, join
 from subprocess import PIPE, Popen
 import sys
 from tempfile import NamedTemporaryFile
 
+from .._vendor.toolz import concatv
 from ..base.context import context
 from ..common.compat import ensure_binary, iteritems, on_win
+from ..common.path import expand
+from ..gateways.activation_cache import condarc_search_path, dependency_stamps, key_digest
+
+log = getLogger(__name__)
+
+ACTIVATED_ENV_CACHE_DIR = expand(join('~', '.conda', 'run_cache'))
+ACTIVATED_ENV_CACHE_VERSION = 2
+
+_DUMP_ENVIRON = "import os, json; print(json.dumps(dict(os.environ)))"
 
 
 def get_activated_env_vars():
     env_location = context.target_prefix
-    if on_win:
-        env_var_map = _get_activated_env_vars_win(env_location)
-    else:
-        env_var_map = _get_activated_env_vars_unix(env_location)
+    env_var_map = _get_activated_env_vars(env_location)
     env_var_map = {str(k): str(v) for k, v in iteritems(env_var_map)}
     return env_var_map
 
 
-def _get_activated_env_vars_win(env_location):
-    try:
-        conda_bat = os.environ["CONDA_BAT"]
-    except KeyError:
-        conda_bat = abspath(join(sys.prefix, 'condacmd', 'conda.bat'))
+def _get_activated_env_vars(env_location):
+    """Compute the environment `conda activate` would produce for env_location.
+
+    Environment variables are computed in-process with the same activator the shell
+    integration uses. A shell is only started when the environment (or the one being
+    deactivated) ships activate.d/deactivate.d scripts, and that result is cached per
+    prefix until conda-meta, the scripts, or the incoming environment change.
+    """
+    from ..activate import CmdExeActivator, PosixActivator
+    activator = CmdExeActivator() if on_win else PosixActivator()
+    builder_result = activator.build_activate(env_location)
+
+    env_var_map = activator.environ.copy()
+    for key in builder_result.get('unset_vars', ()):
+        env_var_map.pop(key, None)
+    env_var_map.update((key, str(value))
+                       for key, value in iteritems(builder_result.get('export_vars', {})))
+
+    if not (builder_result.get('activate_scripts') or builder_result.get('deactivate_scripts')):
+        return env_var_map
+
+    cache_key = _activated_env_cache_key(env_location, activator.environ, env_var_map)
+    cached = _read_activated_env_cache(env_location, cache_key, activator.environ)
+    if cached is not None:
+        return cached
+
+    commands = concatv(
+        activator._yield_commands(builder_result),
+        ('"%s" -c "%s"' % (sys.executable, _DUMP_ENVIRON),),
+    )
+    script = activator.command_join.join(commands)
+    if on_win:
+        env_var_map = _run_activation_script_win(script)
+    else:
+        env_var_map = json.loads(_check_output(("sh", "-c", script)))
+    _write_activated_env_cache(env_location, cache_key, activator.environ, env_var_map)
+    return env_var_map
 
+
+def _run_activation_script_win(script):
     temp_path = None
     try:
         with NamedTemporaryFile('w+b', suffix='.bat', delete=False) as tf:
             temp_path = tf.name
-            tf.write(ensure_binary(
-                "@%CONDA_PYTHON_EXE% -c \"import os, json; print(json.dumps(dict(os.environ)))\""
-            ))
-        # TODO: refactor into single function along with code in conda.core.link.run_script
-        inner_builder = (
-            "@SET PROMPT= ",
-            "&&",
-            "@SET CONDA_CHANGEPS1=false",
-            "&&",
-            "@CALL {0} activate \"{1}\"".format(conda_bat, env_location),
-            "&&",
-            "\"{0}\"".format(tf.name),
-        )
-        cmd = "{0} /C \"{1}\"".format(os.getenv('COMSPEC', 'cmd.exe'), " ".join(inner_builder))
+            tf.write(ensure_binary("@SET PROMPT= \r\n@SET CONDA_CHANGEPS1=false\r\n" + script))
+        cmd = "{0} /C \"{1}\"".format(os.getenv('COMSPEC', 'cmd.exe'), temp_path)
         stdout = _check_output(cmd)
     finally:
         if temp_path:
             from ..gateways.disk.delete import rm_rf
             rm_rf(temp_path)
+    return json.loads(stdout)
 
-    env_var_map = json.loads(stdout)
-    return env_var_map
+
+def _activated_env_cache_path(env_location):
+    return join(ACTIVATED_ENV_CACHE_DIR,
+                md5(ensure_binary(env_location)).hexdigest()[:16] + '.json')
 
 
-def _get_activated_env_vars_unix(env_location):
+def _activated_env_cache_key(env_location, environ, activated_environ):
+    # Activation scripts can read anything from the incoming environment, so the key
+    # covers it in full, along with every file whose change could alter the outcome.
+    stamps = dependency_stamps(condarc_search_path() + [
+        join(env_location, 'conda-meta'),
+        join(env_location, 'etc', 'conda', 'activate.d'),
+        join(env_location, 'etc', 'conda', 'deactivate.d'),
+    ])
+    key_data = {
+        'version': ACTIVATED_ENV_CACHE_VERSION,
+        'stamps': stamps,
+        'environ': sorted(iteritems(environ)),
+        'activated_environ': sorted(iteritems(activated_environ)),
+    }
+    return key_digest(key_data)
+
+
+def _read_activated_env_cache(env_location, cache_key, environ):
     try:
-        conda_exe = os.environ["CONDA_EXE"]
-    except KeyError:
-        conda_exe = abspath(join(sys.prefix, 'bin', 'conda'))
-
-    inner_builder = (
-        "eval \"$(\"{0}\" shell.posix hook)\"".format(conda_exe),
-        "&&",
-        "conda activate \"{0}\"".format(env_location),
-        "&&",
-        "\"$CONDA_PYTHON_EXE\" -c \"import os, json; print(json.dumps(dict(os.environ)))\"",
-    )
-    cmd = ("sh", "-c", " ".join(inner_builder))
-    env_var_map = json.loads(_check_output(cmd))
+        with open(_activated_env_cache_path(env_location)) as fh:
+            cache = json.load(fh)
+    except (EnvironmentError, ValueError):
+        return None
+    if not isinstance(cache, dict) or cache.get('key') != cache_key:
+        return None
+    log.debug("using cached activation environment for %s", env_location)
+    env_var_map = environ.copy()
+    for key in cache.get('unset_vars', ()):
+        env_var_map.pop(key, None)
+    env_var_map.update(cache.get('export_vars', {}))
     return env_var_map
 
 
+def _write_activated_env_cache(env_location, cache_key, environ, env_var_map):
+    # Only the change activation made to environ is kept; the incoming environment, with
+    # whatever credentials it holds, is already covered by the key. The entry can still hold
+    # values exported by activate.d scripts, so it's only readable by the user.
+    cache_path = _activated_env_cache_path(env_location)
+    temp_path = '%s.%s.tmp' % (cache_path, os.getpid())
+    try:
+        if not isdir(ACTIVATED_ENV_CACHE_DIR):
+            os.makedirs(ACTIVATED_ENV_CACHE_DIR, 0o700)
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as fh:
+            json.dump({
+                'key': cache_key,
+                'prefix': env_location,
+                'export_vars': {key: value for key, value in iteritems(env_var_map)
+                                if environ.get(key) != value},
+                'unset_vars': sorted(key for key in environ if key not in env_var_map),
+            }, fh)
+        if on_win and isfile(cache_path):
+            os.unlink(cache_path)
+        os.rename(temp_path, cache_path)
+    except EnvironmentError as e:
+        log.debug("unable to write activation cache %s: %r", cache_path, e)
+
+
 def _check_output(cmd):
     p = Popen(cmd, stdout=PIPE, stderr=PIPE)
     stdout, stderr = p.communicate()
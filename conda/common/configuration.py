@@ -21,19 +21,22 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 from abc import ABCMeta, abstractmethod
 from collections import Mapping, defaultdict
 from glob import glob
+from hashlib import md5
 from itertools import chain
+import json
 from logging import getLogger
+import os
 from os import environ, stat
-from os.path import basename, join
+from os.path import basename, isdir, join
 from stat import S_IFDIR, S_IFMT, S_IFREG
 
 from enum import Enum, EnumMeta
 
-from .compat import (isiterable, iteritems, itervalues, odict, primitive_types, string_types,
-                     text_type, with_metaclass)
+from .compat import (ensure_binary, isiterable, iteritems, itervalues, odict, primitive_types,
+                     string_types, text_type, with_metaclass)
 from .constants import NULL
 from .path import expand
-from .serialize import yaml_load
+from .serialize import get_yaml, yaml_load
 from .. import CondaError, CondaMultiError
 from .._vendor.auxlib.collection import AttrDict, first, last, make_immutable
 from .._vendor.auxlib.exceptions import ThisShouldNeverHappenError
@@ -42,15 +45,6 @@ from .._vendor.frozendict import frozendict
 from .._vendor.boltons.setutils import IndexedSet
 from .._vendor.toolz import concat, concatv, excepts, merge, unique
 
-try:  # pragma: no cover
-    from ruamel_yaml.comments import CommentedSeq, CommentedMap
-    from ruamel_yaml.reader import ReaderError
-    from ruamel_yaml.scanner import ScannerError
-except ImportError:  # pragma: no cover
-    from ruamel.yaml.comments import CommentedSeq, CommentedMap  # pragma: no cover
-    from ruamel.yaml.reader import ReaderError
-    from ruamel.yaml.scanner import ScannerError
-
 log = getLogger(__name__)
 
 EMPTY_MAP = frozendict()
@@ -257,6 +251,7 @@ class ArgParseRawParameter(RawParameter):
 
 class YamlRawParameter(RawParameter):
     # this class should encapsulate all direct use of ruamel.yaml in this module
+    # ruamel.yaml is only imported once a yaml file is actually read; see get_yaml()
 
     def __init__(self, source, key, raw_value, keycomment):
         self._keycomment = keycomment
@@ -276,11 +271,12 @@ class YamlRawParameter(RawParameter):
     def __process(self, parameter_obj):
         if hasattr(self, '_value'):
             return
-        elif isinstance(self._raw_value, CommentedSeq):
+        comments = get_yaml().comments
+        if isinstance(self._raw_value, comments.CommentedSeq):
             valuecomments = self._get_yaml_list_comments(self._raw_value)
             self._valueflags = tuple(ParameterFlag.from_string(s) for s in valuecomments)
             self._value = tuple(self._raw_value)
-        elif isinstance(self._raw_value, CommentedMap):
+        elif isinstance(self._raw_value, comments.CommentedMap):
             valuecomments = self._get_yaml_map_comments(self._raw_value)
             self._valueflags = dict((k, ParameterFlag.from_string(v))
                                     for k, v in iteritems(valuecomments) if v is not None)
@@ -326,10 +322,11 @@ class YamlRawParameter(RawParameter):
 
     @classmethod
     def make_raw_parameters_from_file(cls, filepath):
+        yaml = get_yaml()
         with open(filepath, 'r') as fh:
             try:
                 ruamel_yaml = yaml_load(fh)
-            except ScannerError as err:
+            except yaml.scanner.ScannerError as err:
                 mark = err.problem_mark
                 raise ConfigurationLoadError(
                     filepath,
@@ -337,24 +334,132 @@ class YamlRawParameter(RawParameter):
                     line=mark.line,
                     column=mark.column
                 )
-            except ReaderError as err:
+            except yaml.reader.ReaderError as err:
                 raise ConfigurationLoadError(filepath,
                                              "  reason: invalid yaml at position %(position)s",
                                              position=err.position)
             return cls.make_raw_parameters(filepath, ruamel_yaml) or EMPTY_MAP
 
+    @classmethod
+    def make_raw_parameters_from_cached_file(cls, filepath, cache_dir):
+        """Like make_raw_parameters_from_file, but served from a parsed copy in cache_dir.
+
+        The cached copy holds each parameter's processed value and comment flags, and is
+        used while the file's (path, size, mtime_ns, inode) stamp is unchanged, so the
+        round-trip yaml parser only runs for files that changed since they were last read.
+        """
+        cache_path = join(cache_dir, md5(ensure_binary(filepath)).hexdigest()[:16] + '.json')
+        stamp = _file_stamp(filepath)
+        try:
+            with open(cache_path) as fh:
+                cached = json.load(fh, object_pairs_hook=odict)
+            if (cached['version'] == RAW_PARAMETER_CACHE_VERSION
+                    and cached['path'] == filepath and cached['stamp'] == stamp):
+                return cls._from_cache_entries(filepath, cached['parameters'])
+        except (EnvironmentError, ValueError, KeyError, TypeError):
+            pass
+
+        raw_parameters = cls.make_raw_parameters_from_file(filepath)
+        entries = cls._to_cache_entries(raw_parameters)
+        if entries is not None:
+            try:
+                if not isdir(cache_dir):
+                    os.makedirs(cache_dir)
+                temp_path = '%s.%s.tmp' % (cache_path, os.getpid())
+                with open(temp_path, 'w') as fh:
+                    json.dump({
+                        'version': RAW_PARAMETER_CACHE_VERSION,
+                        'path': filepath,
+                        'stamp': stamp,
+                        'parameters': entries,
+                    }, fh)
+                try:
+                    os.rename(temp_path, cache_path)
+                except EnvironmentError:
+                    # windows won't rename over an existing file
+                    os.unlink(temp_path)
+            except (EnvironmentError, TypeError, ValueError) as e:
+                log.debug("unable to cache parsed configuration file %s: %r", filepath, e)
+        return raw_parameters
+
+    @classmethod
+    def _to_cache_entries(cls, raw_parameters):
+        # returns None if any value can't be represented faithfully in json
+        entries = odict()
+        for key, raw_parameter in iteritems(raw_parameters):
+            raw_parameter.__process(None)
+            value, valueflags = raw_parameter._value, raw_parameter._valueflags
+            if isinstance(value, tuple):
+                kind = 'sequence'
+                valueflags = [flag and flag.value for flag in valueflags]
+            elif isinstance(value, Mapping):
+                kind = 'map'
+                value = odict(iteritems(value))
+                valueflags = odict((k, flag and flag.value) for k, flag in iteritems(valueflags))
+            else:
+                kind = 'primitive'
+            if not _is_json_native(value):
+                return None
+            entries[key] = [raw_parameter._keycomment, kind, value, valueflags]
+        return entries
 
-def load_file_configs(search_path):
+    @classmethod
+    def _from_cache_entries(cls, source, entries):
+        raw_parameters = {}
+        for key, (keycomment, kind, value, valueflags) in iteritems(entries):
+            raw_parameter = cls(source, key, value, keycomment)
+            if kind == 'sequence':
+                raw_parameter._value = tuple(value)
+                raw_parameter._valueflags = tuple(ParameterFlag.from_string(flag)
+                                                  for flag in valueflags)
+            elif kind == 'map':
+                raw_parameter._value = frozendict(value)
+                raw_parameter._valueflags = dict((k, ParameterFlag.from_string(flag))
+                                                 for k, flag in iteritems(valueflags))
+            else:
+                raw_parameter._value = value
+                raw_parameter._valueflags = None
+            raw_parameters[key] = raw_parameter
+        return raw_parameters or EMPTY_MAP
+
+
+RAW_PARAMETER_CACHE_VERSION = 1
+
+
+def _file_stamp(path):
+    st = stat(path)
+    mtime_ns = getattr(st, 'st_mtime_ns', None) or int(st.st_mtime * 1e9)
+    return [st.st_size, mtime_ns, st.st_ino]
+
+
+def _is_json_native(value):
+    if isinstance(value, (list, tuple)):
+        return all(_is_json_native(v) for v in value)
+    elif isinstance(value, Mapping):
+        return all(isinstance(k, string_types) and _is_json_native(v)
+                   for k, v in iteritems(value))
+    else:
+        return value is None or isinstance(value, string_types + (bool, int, float))
+
+
+def load_file_configs(search_path, cache_dir=None):
     # returns an ordered map of filepath and dict of raw parameter objects
+    # when cache_dir is given, parsed files are cached there; see
+    #   YamlRawParameter.make_raw_parameters_from_cached_file
+
+    def _load_raw_parameters(fullpath):
+        if cache_dir:
+            return YamlRawParameter.make_raw_parameters_from_cached_file(fullpath, cache_dir)
+        return YamlRawParameter.make_raw_parameters_from_file(fullpath)
 
     def _file_yaml_loader(fullpath):
         assert fullpath.endswith((".yml", ".yaml")) or "condarc" in basename(fullpath), fullpath
-        yield fullpath, YamlRawParameter.make_raw_parameters_from_file(fullpath)
+        yield fullpath, _load_raw_parameters(fullpath)
 
     def _dir_yaml_loader(fullpath):
         for filepath in sorted(concatv(glob(join(fullpath, "*.yml")),
                                        glob(join(fullpath, "*.yaml")))):
-            yield filepath, YamlRawParameter.make_raw_parameters_from_file(filepath)
+            yield filepath, _load_raw_parameters(filepath)
 
     # map a stat result to a file loader or a directory loader
     _loader = {
@@ -720,6 +825,9 @@ class ConfigurationType(type):
 @with_metaclass(ConfigurationType)
 class Configuration(object):
 
+    # Subclasses can set a directory in which parsed configuration files are cached.
+    _raw_data_cache_dir = None
+
     def __init__(self, search_path=(), app_name=None, argparse_args=None):
         # Currently, __init__ does a **full** disk reload of all files.
         # A future improvement would be to cache files that are already loaded.
@@ -734,7 +842,7 @@ class Configuration(object):
 
     def _set_search_path(self, search_path):
         self._search_path = IndexedSet(search_path)
-        self._set_raw_data(load_file_configs(search_path))
+        self._set_raw_data(load_file_configs(search_path, self._raw_data_cache_dir))
         self._reset_cache()
         return self
 
@@ -27,7 +27,6 @@ from .path import expand
 from .._vendor.auxlib.decorators import memoizemethod
 from .._vendor.auxlib.logz import NullHandler
 from .._vendor.auxlib.type_coercion import boolify
-from .._vendor.tqdm import tqdm
 
 log = getLogger(__name__)
 
@@ -424,6 +423,7 @@ class ProgressBar(object):
         if json:
             pass
         elif enabled:
+            from .._vendor.tqdm import tqdm
             bar_format = "{desc}{bar} | {percentage:3.0f}% "
             try:
                 self.pbar = tqdm(desc=description, bar_format=bar_format, ascii=True, total=1,
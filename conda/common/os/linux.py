@@ -73,3 +73,36 @@ def linux_get_libc_version():
         log.warning("Failed to detect non-glibc family, assuming %s (%s)", family, version)
         return family, version
     return family, version
+
+
+def linux_get_cpu_flags(cpuinfo_path='/proc/cpuinfo'):
+    """
+    If on linux, returns the sorted cpu flags listed in /proc/cpuinfo, otherwise None.
+
+    This is the field the vendored cpuinfo module reports as 'flags' ('Features' on arm),
+    read directly rather than through a `cat` subprocess.
+    """
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        with open(cpuinfo_path) as fh:
+            for line in fh:
+                key, sep, value = line.partition(':')
+                if sep and key.strip() in ('flags', 'Features'):
+                    return sorted(value.split())
+    except EnvironmentError as e:
+        log.debug("unable to read %s: %r", cpuinfo_path, e)
+    return None
+
+
+def linux_get_boot_id():
+    """
+    If on linux, returns the kernel's random id for the current boot, otherwise None.
+    """
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        with open('/proc/sys/kernel/random/boot_id') as fh:
+            return fh.read().strip() or None
+    except EnvironmentError:
+        return None
@@ -5,16 +5,18 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 
 import json
 from logging import getLogger
+import sys
 
 from .compat import PY2, odict, ensure_text_type
 from .._vendor.auxlib.decorators import memoize
-from .._vendor.auxlib.entity import EntityEncoder
 
 log = getLogger(__name__)
 
 
 @memoize
 def get_yaml():
+    # ruamel is by far the most expensive import in conda's startup path, and many commands
+    # never read or write yaml, so it's only imported on first use.
     try:
         import ruamel_yaml as yaml
     except ImportError:  # pragma: no cover
@@ -24,35 +26,31 @@ def get_yaml():
             raise ImportError("No yaml library available.\n"
                               "To proceed, conda install "
                               "ruamel_yaml")
-    return yaml
-
-
-yaml = get_yaml()
-
-
-def represent_ordereddict(dumper, data):
-    value = []
 
-    for item_key, item_value in data.items():
-        node_key = dumper.represent_data(item_key)
-        node_value = dumper.represent_data(item_value)
+    def represent_ordereddict(dumper, data):
+        value = []
 
-        value.append((node_key, node_value))
+        for item_key, item_value in data.items():
+            node_key = dumper.represent_data(item_key)
+            node_value = dumper.represent_data(item_value)
 
-    return yaml.nodes.MappingNode(u'tag:yaml.org,2002:map', value)
+            value.append((node_key, node_value))
 
+        return yaml.nodes.MappingNode(u'tag:yaml.org,2002:map', value)
 
-yaml.representer.RoundTripRepresenter.add_representer(odict, represent_ordereddict)
+    yaml.representer.RoundTripRepresenter.add_representer(odict, represent_ordereddict)
 
-if PY2:
-    def represent_unicode(self, data):
-        return self.represent_str(data.encode('utf-8'))
+    if PY2:
+        def represent_unicode(self, data):
+            return self.represent_str(data.encode('utf-8'))
 
+        yaml.representer.RoundTripRepresenter.add_representer(unicode, represent_unicode)  # NOQA
 
-    yaml.representer.RoundTripRepresenter.add_representer(unicode, represent_unicode)  # NOQA
+    return yaml
 
 
 def yaml_load(string):
+    yaml = get_yaml()
     return yaml.load(string, Loader=yaml.RoundTripLoader, version="1.2")
 
 
@@ -63,6 +61,7 @@ def yaml_load_safe(string):
         {'key': 'value'}
 
     """
+    yaml = get_yaml()
     return yaml.load(string, Loader=yaml.SafeLoader, version="1.2")
 
 
@@ -73,20 +72,40 @@ def yaml_load_standard(string):
         >>> yaml_load_standard("prefix: !!python/unicode '/Users/darwin/test'")
         {'prefix': '/Users/darwin/test'}
     """
+    yaml = get_yaml()
     return yaml.load(string, Loader=yaml.Loader, version="1.2")
 
 
 def yaml_dump(object):
     """dump object to string"""
+    yaml = get_yaml()
     return yaml.dump(object, Dumper=yaml.RoundTripDumper,
                      block_seq_indent=2, default_flow_style=False,
                      indent=2)
 
 
+def __getattr__(name):
+    # Module attributes that used to be imported with this module, still available to code
+    #   outside of conda that imports them from here (PEP 562).
+    if name == 'yaml':
+        return get_yaml()
+    if name == 'EntityEncoder':
+        from .._vendor.auxlib.entity import EntityEncoder
+        return EntityEncoder
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
+
+if sys.version_info < (3, 7):  # pragma: no cover
+    # no module __getattr__, so these are imported eagerly, as they were before
+    yaml = __getattr__('yaml')
+    EntityEncoder = __getattr__('EntityEncoder')
+
+
 def json_load(string):
     return json.loads(string)
 
 
 def json_dump(object):
+    from .._vendor.auxlib.entity import EntityEncoder
     return ensure_text_type(json.dumps(object, indent=2, sort_keys=True,
                                        separators=(',', ': '), cls=EntityEncoder))
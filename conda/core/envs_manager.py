@@ -4,7 +4,9 @@
 from __future__ import absolute_import, division, print_function, unicode_literals
 
 from errno import EACCES
+import json
 from logging import getLogger
+import os
 from os import listdir
 from os.path import dirname, isdir, isfile, join, normpath, split as path_split
 
@@ -12,6 +14,7 @@ from .prefix_data import PrefixData
 from ..base.constants import ROOT_ENV_NAME
 from ..base.context import context
 from ..common.compat import ensure_text_type, on_win, open
+from ..common.io import ThreadLimitedThreadPoolExecutor
 from ..common.path import expand, paths_equal
 from ..gateways.disk.read import yield_lines
 from ..gateways.disk.test import is_conda_environment
@@ -20,6 +23,8 @@ log = getLogger(__name__)
 
 
 USER_ENVIRONMENTS_TXT_FILE = expand(join('~', '.conda', 'environments.txt'))
+USER_ENVIRONMENTS_INDEX_FILE = expand(join('~', '.conda', 'environments_index.json'))
+ENVIRONMENTS_INDEX_VERSION = 1
 
 
 def register_env(location):
@@ -50,7 +55,8 @@ def unregister_env(location):
     if isdir(location):
         meta_dir = join(location, 'conda-meta')
         if isdir(meta_dir):
-            meta_dir_contents = listdir(meta_dir)
+            # hidden files are sidecar indexes, e.g. of conda-meta/history
+            meta_dir_contents = [fn for fn in listdir(meta_dir) if not fn.startswith('.')]
             if len(meta_dir_contents) > 1:
                 # if there are any files left other than 'conda-meta/history'
                 #   then don't unregister
@@ -91,12 +97,107 @@ def list_all_known_prefixes():
 
 
 def query_all_prefixes(spec):
-    for prefix in list_all_known_prefixes():
-        prefix_recs = tuple(PrefixData(prefix).query(spec))
+    """Yield (prefix, package_records) for every known prefix with records matching spec.
+
+    Package summaries come from an :class:`EnvironmentsIndex`, so only prefixes whose
+    conda-meta changed since the last query are loaded from disk, and those are loaded
+    concurrently.  The records yielded are PackageRecords, not full PrefixRecords.
+    """
+    from ..models.match_spec import MatchSpec
+    spec = MatchSpec(spec)
+    prefixes = list_all_known_prefixes()
+    environments_index = EnvironmentsIndex()
+    with ThreadLimitedThreadPoolExecutor() as executor:
+        all_package_records = tuple(executor.map(environments_index.package_records, prefixes))
+    environments_index.save(prefixes)
+    for prefix, package_records in zip(prefixes, all_package_records):
+        prefix_recs = tuple(prec for prec in package_records if spec.match(prec))
         if prefix_recs:
             yield prefix, prefix_recs
 
 
+class EnvironmentsIndex(object):
+    """Persistent per-prefix package summaries for the environments known to this user.
+
+    Each entry holds the PackageRecord fields of every package installed in a prefix, and is
+    valid while the stat of the prefix's conda-meta directory and history file are unchanged.
+    Installing or removing a package adds or deletes a record file in conda-meta and appends
+    to history, so either change invalidates the entry.
+    """
+
+    def __init__(self, index_file=None):
+        self.index_file = index_file or USER_ENVIRONMENTS_INDEX_FILE
+        self._entries = self._read_entries()
+        self._dirty = False
+
+    def package_records(self, prefix):
+        from ..models.records import PackageRecord
+        if context.pip_interop_enabled:
+            # site-packages contents aren't covered by the conda-meta stamp
+            return tuple(PackageRecord.from_objects(prefix_rec)
+                         for prefix_rec in PrefixData(prefix).iter_records())
+
+        stamp = _conda_meta_stamp(prefix)
+        entry = self._entries.get(prefix)
+        if entry and stamp is not None and entry['stamp'] == stamp:
+            return tuple(PackageRecord(**record) for record in entry['records'])
+
+        package_records = tuple(PackageRecord.from_objects(prefix_rec)
+                                for prefix_rec in PrefixData(prefix).iter_records())
+        self._entries[prefix] = {
+            'stamp': stamp,
+            'records': [prec.dump() for prec in package_records],
+        }
+        self._dirty = True
+        return package_records
+
+    def save(self, known_prefixes=None):
+        """Write the index, dropping entries for prefixes no longer in known_prefixes."""
+        if known_prefixes is not None:
+            known_prefixes = set(known_prefixes)
+            for prefix in tuple(self._entries):
+                if prefix not in known_prefixes:
+                    del self._entries[prefix]
+                    self._dirty = True
+        if not self._dirty:
+            return
+        temp_path = "%s.%s.tmp" % (self.index_file, os.getpid())
+        try:
+            with open(temp_path, 'w') as fh:
+                fh.write(ensure_text_type(json.dumps({
+                    'version': ENVIRONMENTS_INDEX_VERSION,
+                    'prefixes': self._entries,
+                })))
+            if on_win and isfile(self.index_file):
+                os.unlink(self.index_file)
+            os.rename(temp_path, self.index_file)
+            self._dirty = False
+        except EnvironmentError as e:
+            # the index is only an optimization
+            log.debug("unable to write environments index %s: %r", self.index_file, e)
+
+    def _read_entries(self):
+        try:
+            with open(self.index_file) as fh:
+                data = json.load(fh)
+            if data['version'] == ENVIRONMENTS_INDEX_VERSION:
+                return data['prefixes']
+        except (EnvironmentError, ValueError, KeyError, TypeError):
+            pass
+        return {}
+
+
+def _conda_meta_stamp(prefix):
+    stamp = []
+    for path in (join(prefix, 'conda-meta'), join(prefix, 'conda-meta', 'history')):
+        try:
+            st = os.stat(path)
+        except EnvironmentError:
+            return None
+        stamp.append([st.st_size, st.st_mtime, st.st_ino])
+    return stamp
+
+
 def env_name(prefix):
     if not prefix:
         return None
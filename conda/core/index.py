@@ -171,9 +171,37 @@ def get_reduced_index(prefix, channels, subdirs, specs):
         pending_names = set()
         pending_track_features = set()
 
+        # With strict channel priority, a name only gets records from the highest-priority
+        #   channel carrying it.  Lower-priority records are dropped as they are queried,
+        #   so they are never collected and their dependencies are never expanded.
+        strict_priority = context.channel_priority and context.strict_channel_priority
+        channel_priorities = {}
+        for sd in subdir_datas:
+            channel_priorities.setdefault(sd.channel.canonical_name, len(channel_priorities))
+        name_priorities = {}  # Dict[package_name, priority of the channel supplying it]
+        # a name requested from a given channel (e.g. conda-forge::foo) is never pruned
+        channel_spec_names = set(spec.get_exact_value('name') for spec in specs
+                                 if spec.get_exact_value('channel'))
+
         def query_all(spec):
             futures = tuple(executor.submit(sd.query, spec) for sd in subdir_datas)
-            return tuple(concat(future.result() for future in as_completed(futures)))
+            if not strict_priority:
+                return tuple(concat(future.result() for future in as_completed(futures)))
+            results = tuple((channel_priorities[sd.channel.canonical_name],
+                             tuple(future.result()))
+                            for sd, future in zip(subdir_datas, futures))
+            name = spec.get_exact_value('name')
+            if name and name not in channel_spec_names:
+                priorities = [priority for priority, recs in results if recs]
+                if not priorities:
+                    return ()
+                name_priorities[name] = min(priorities)
+            return tuple(rec for priority, recs in results for rec in recs
+                         if name_priorities.get(rec.name, priority) == priority)
+
+        def has_name_priority(record):
+            priority = channel_priorities[record.channel.canonical_name]
+            return name_priorities.get(record.name, priority) == priority
 
         def push_spec(spec):
             name = spec.get_raw_value('name')
@@ -214,6 +242,18 @@ def get_reduced_index(prefix, channels, subdirs, specs):
                 collected_track_features.add(feature_name)
                 spec = MatchSpec(track_features=feature_name)
                 new_records = query_all(spec)
+                if strict_priority:
+                    # The names of these records are queried first, so records from a
+                    #   lower-priority channel are dropped before their dependencies are
+                    #   expanded.
+                    for name in set(rec.name for rec in new_records) - collected_names:
+                        pending_names.discard(name)
+                        collected_names.add(name)
+                        name_records = query_all(MatchSpec(name))
+                        for record in name_records:
+                            push_record(record)
+                        records.update(name_records)
+                    new_records = tuple(rec for rec in new_records if has_name_priority(rec))
                 for record in new_records:
                     push_record(record)
                 records.update(new_records)
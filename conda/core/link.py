@@ -4,11 +4,13 @@
 from __future__ import absolute_import, division, print_function, unicode_literals
 
 from collections import defaultdict, namedtuple
+from concurrent.futures import FIRST_COMPLETED, wait
 from logging import getLogger
 import os
 from os.path import basename, dirname, isdir, join
 from subprocess import CalledProcessError
 import sys
+from time import time
 from traceback import format_exception_only
 import warnings
 
@@ -26,7 +28,7 @@ from .._vendor.toolz import concat, concatv, interleave, take
 from ..base.constants import DEFAULTS_CHANNEL_NAME, SafetyChecks
 from ..base.context import context
 from ..common.compat import ensure_text_type, iteritems, itervalues, odict, on_win, text_type
-from ..common.io import Spinner, dashlist, time_recorder
+from ..common.io import Spinner, ThreadLimitedThreadPoolExecutor, dashlist, time_recorder
 from ..common.path import (explode_directories, get_all_directories, get_major_minor_version,
                            get_python_site_packages_short_path)
 from ..common.signals import signal_handler
@@ -35,9 +37,11 @@ from ..exceptions import (DisallowedPackageError, KnownPackageClobberError, Link
 from ..gateways.disk import mkdir_p
 from ..gateways.disk.delete import rm_rf
 from ..gateways.disk.read import isfile, lexists, read_package_info
-from ..gateways.disk.test import hardlink_supported, is_conda_environment, softlink_supported
+from ..gateways.disk.test import (hardlink_supported, is_conda_environment, reflink_supported,
+                                  softlink_supported)
 from ..gateways.subprocess import subprocess_call
 from ..models.enums import LinkType
+from ..models.prefix_graph import PrefixGraph
 from ..models.version import VersionOrder
 from ..resolve import MatchSpec
 from ..utils import human_bytes
@@ -48,6 +52,9 @@ log = getLogger(__name__)
 def determine_link_type(extracted_package_dir, target_prefix):
     source_test_file = join(extracted_package_dir, 'info', 'index.json')
     if context.always_copy:
+        # a copy-on-write clone is indistinguishable from a copy, but nearly free
+        if reflink_supported(source_test_file, target_prefix):
+            return LinkType.reflink
         return LinkType.copy
     if context.always_softlink:
         return LinkType.softlink
@@ -499,20 +506,46 @@ class UnlinkLinkTransaction(object):
     def _execute(cls, all_action_groups):
         with signal_handler(conda_signal_handler), time_recorder("unlink_link_execute"):
             pkg_idx = 0
+            finishing_prefix = None
             try:
                 with Spinner("Executing transaction", not context.verbosity and not context.quiet,
                              context.json):
+                    # prefix records are written together once all of a prefix's packages are
+                    # linked; so are post-link scripts run when they run concurrently
+                    linked_precs = defaultdict(list)
                     for pkg_idx, axngroup in enumerate(all_action_groups):
+                        target_prefix = axngroup.target_prefix
+                        if axngroup.type != 'link' and linked_precs[target_prefix]:
+                            finishing_prefix = target_prefix
+                            cls._finish_linking(target_prefix, linked_precs.pop(target_prefix))
+                            finishing_prefix = None
                         cls._execute_actions(pkg_idx, axngroup)
-            except CondaMultiError as e:
-                action, is_unlink = (None, axngroup.type == 'unlink')
-                prec = axngroup.pkg_data
+                        if axngroup.type == 'link':
+                            linked_precs[target_prefix].append(axngroup.pkg_data.repodata_record)
+                    pkg_idx = len(all_action_groups)
+                    for target_prefix, precs in iteritems(linked_precs):
+                        if precs:
+                            finishing_prefix = target_prefix
+                            cls._finish_linking(target_prefix, precs)
+                    finishing_prefix = None
+            except Exception as e:
+                if finishing_prefix is not None:
+                    # every executed package is rolled back
+                    log.error("An error occurred while finishing the transaction for prefix "
+                              "'%s'.\n"
+                              "%r\n"
+                              "Attempting to roll back.\n", finishing_prefix, e)
+                elif not isinstance(e, CondaMultiError):
+                    raise
+                else:
+                    action, is_unlink = (None, axngroup.type == 'unlink')
+                    prec = axngroup.pkg_data
 
-                log.error("An error occurred while %s package '%s'.\n"
-                          "%r\n"
-                          "Attempting to roll back.\n",
-                          'uninstalling' if is_unlink else 'installing',
-                          prec and prec.dist_str(), e.errors[0])
+                    log.error("An error occurred while %s package '%s'.\n"
+                              "%r\n"
+                              "Attempting to roll back.\n",
+                              'uninstalling' if is_unlink else 'installing',
+                              prec and prec.dist_str(), e.errors[0])
 
                 # reverse all executed packages except the one that failed
                 rollback_excs = []
@@ -526,6 +559,10 @@ class UnlinkLinkTransaction(object):
                         for pkg_idx, axngroup in reverse_actions:
                             excs = cls._reverse_actions(pkg_idx, axngroup)
                             rollback_excs.extend(excs)
+                # records of packages left linked still need writing
+                for target_prefix in set(axngroup.target_prefix
+                                         for axngroup in all_action_groups):
+                    PrefixData(target_prefix).flush()
 
                 raise CondaMultiError(tuple(concatv(
                     (e.errors
@@ -567,8 +604,14 @@ class UnlinkLinkTransaction(object):
                            target_prefix)
             for axn_idx, action in enumerate(axngroup.actions):
                 action.execute()
-            if axngroup.type in ('unlink', 'link'):
-                run_script(target_prefix, prec, 'post-unlink' if is_unlink else 'post-link')
+            if axngroup.type == 'unlink':
+                run_script(target_prefix, prec, 'post-unlink')
+            elif axngroup.type == 'link' and context.post_link_threads <= 1:
+                # one at a time, a package's post-link script runs right after it's linked,
+                #   before anything depending on it is linked
+                if isfile(_script_path(target_prefix, prec, 'post-link')):
+                    PrefixData(target_prefix).flush()
+                run_script(target_prefix, prec, 'post-link')
         except Exception as e:  # this won't be a multi error
             # reverse this package
             log.debug("Error in action #%d for pkg_idx #%d %r", axn_idx, pkg_idx, action,
@@ -587,6 +630,19 @@ class UnlinkLinkTransaction(object):
                 reverse_excs,
             )))
 
+    @staticmethod
+    def _finish_linking(target_prefix, precs):
+        with time_recorder("unlink_link_write_prefix_records"):
+            PrefixData(target_prefix).flush()
+        if context.post_link_threads <= 1:
+            # already run by _execute_actions
+            return
+        log.info("===> RUNNING POST-LINK SCRIPTS <===\n"
+                 "  prefix=%s\n", target_prefix)
+        with time_recorder("unlink_link_post_link_scripts"):
+            run_scripts(target_prefix, precs, 'post-link',
+                        max_workers=context.post_link_threads)
+
     @staticmethod
     def _reverse_actions(pkg_idx, axngroup, reverse_from_idx=-1):
         target_prefix = axngroup.target_prefix
@@ -931,11 +987,91 @@ def run_script(prefix, prec, action='post-link', env_prefix=None):
     call the post-link (or pre-unlink) script, and return True on success,
     False on failure
     """
-    path = join(prefix,
+    try:
+        response = _run_script(prefix, prec, action, env_prefix)
+    except CalledProcessError as e:  # pragma: no cover
+        _report_script_output(prefix, prec, action, e.output)
+        return _script_failed(prefix, prec, action)
+    if response is None:
+        return True
+    elif response is False:
+        return False
+    _report_script_output(prefix, prec, action, response.stdout, response.stderr)
+    messages(prefix)
+    return True
+
+
+def run_scripts(prefix, precs, action='post-link', env_prefix=None, max_workers=1):
+    """
+    call the `action` script of each of precs, running up to max_workers of them at a time,
+    and return True if all succeeded
+
+    A package's script is only started once the scripts of the packages it depends on
+    within precs have finished.  The output of the scripts, and the messages they leave in
+    $PREFIX/.messages.txt, are reported once every started script has finished, and a failed
+    pre-link or post-link script raises LinkError at that point.
+    """
+    scripted = tuple(prec for prec in precs if isfile(_script_path(prefix, prec, action)))
+    if not scripted:
+        return True
+    graph = PrefixGraph(precs)
+    waiting_on = {prec: set(graph.all_ancestors(prec)).intersection(scripted)
+                  for prec in scripted}
+
+    max_workers = max(1, max_workers)
+    pending, running, finished, failed = list(scripted), {}, set(), []
+    results = {}
+    with ThreadLimitedThreadPoolExecutor(max_workers) as executor:
+        while pending or running:
+            ready = [prec for prec in pending if waiting_on[prec] <= finished]
+            if not ready and not running:
+                # dependency cycle; fall back to the given order
+                ready = pending[:1]
+            for prec in ready[:max_workers - len(running)]:
+                pending.remove(prec)
+                future = executor.submit(_run_script, prefix, prec, action, env_prefix)
+                running[future] = prec
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                prec = running.pop(future)
+                finished.add(prec)
+                try:
+                    results[prec] = future.result()
+                except CalledProcessError as e:
+                    results[prec] = e
+                    failed.append(prec)
+            if failed and action in ('pre-link', 'post-link'):
+                # no new scripts once one has failed; the transaction is rolled back
+                del pending[:]
+
+    # reported in the given order, so the report is the same on every run
+    for prec in scripted:
+        result = results.get(prec)
+        if isinstance(result, CalledProcessError):
+            _report_script_output(prefix, prec, action, result.output)
+        elif result:
+            _report_script_output(prefix, prec, action, result.stdout, result.stderr)
+    if failed:
+        failed.sort(key=scripted.index)
+        return all([_script_failed(prefix, prec, action) for prec in failed])
+    messages(prefix)
+    return all(result is not False for result in itervalues(results))
+
+
+def _script_path(prefix, prec, action):
+    return join(prefix,
                 'Scripts' if on_win else 'bin',
                 '.%s-%s.%s' % (prec.name, action, 'bat' if on_win else 'sh'))
+
+
+def _run_script(prefix, prec, action, env_prefix=None):
+    """
+    run the script and return its Response, None if the package has no such script, or
+    False if it can't be run; raises CalledProcessError when the script fails
+    """
+    path = _script_path(prefix, prec, action)
     if not isfile(path):
-        return True
+        return None
 
     env = os.environ.copy()
 
@@ -977,33 +1113,55 @@ def run_script(prefix, prec, action='post-link', env_prefix=None):
     env['PKG_BUILDNUM'] = prec.build_number
     env['PATH'] = os.pathsep.join((dirname(path), env.get('PATH', '')))
 
+    log.debug("for %s at %s, executing script: $ %s",
+              prec.dist_str(), env['PREFIX'], ' '.join(command_args))
+    start_time = time()
+    with time_recorder("run_script.%s.%s" % (action, prec.name)):
+        response = subprocess_call(command_args, env=env, path=dirname(path))
+    log.debug("%s script for %s finished in %.3fs\n"
+              "==> stdout <==\n%s\n==> stderr <==\n%s",
+              action, prec.dist_str(), time() - start_time, response.stdout, response.stderr)
+    return response
+
+
+def _report_script_output(prefix, prec, action, stdout, stderr=''):
+    # a script's own output is reported by messages() along with what it left in .messages.txt
+    if not on_win:
+        # the trace of `bash -x` is only for the debug log
+        stderr = '\n'.join(line for line in stderr.splitlines() if not line.startswith('+'))
+    output = '\n'.join(part.rstrip() for part in (stdout, stderr) if part and part.strip())
+    if not output:
+        return
+    path = join(prefix, '.messages.txt')
     try:
-        log.debug("for %s at %s, executing script: $ %s",
-                  prec.dist_str(), env['PREFIX'], ' '.join(command_args))
-        subprocess_call(command_args, env=env, path=dirname(path))
-    except CalledProcessError as e:  # pragma: no cover
-        m = messages(prefix)
-        if action in ('pre-link', 'post-link'):
-            if 'openssl' in prec.dist_str():
-                # this is a hack for conda-build string parsing in the conda_build/build.py
-                #   create_env function
-                message = "%s failed for: %s" % (action, prec)
-            else:
-                message = dals("""
-                %s script failed for package %s
-                running your command again with `-v` will provide additional information
-                location of failed script: %s
-                ==> script messages <==
-                %s
-                """) % (action, prec.dist_str(), path, m or "<None>")
-            raise LinkError(message)
+        with open(path, 'a') as fo:
+            fo.write("==> %s script output for %s <==\n%s\n"
+                     % (action, prec.dist_str(), output))
+    except EnvironmentError as e:
+        log.debug("unable to report %s script output for %s in %s\n%r",
+                  action, prec.dist_str(), path, e)
+
+
+def _script_failed(prefix, prec, action):
+    m = messages(prefix)
+    if action in ('pre-link', 'post-link'):
+        if 'openssl' in prec.dist_str():
+            # this is a hack for conda-build string parsing in the conda_build/build.py
+            #   create_env function
+            message = "%s failed for: %s" % (action, prec)
         else:
-            log.warn("%s script failed for package %s\n"
-                     "consider notifying the package maintainer", action, prec.dist_str())
-            return False
+            message = dals("""
+            %s script failed for package %s
+            running your command again with `-v` will provide additional information
+            location of failed script: %s
+            ==> script messages <==
+            %s
+            """) % (action, prec.dist_str(), _script_path(prefix, prec, action), m or "<None>")
+        raise LinkError(message)
     else:
-        messages(prefix)
-        return True
+        log.warn("%s script failed for package %s\n"
+                 "consider notifying the package maintainer", action, prec.dist_str())
+        return False
 
 
 def messages(prefix):
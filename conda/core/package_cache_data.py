@@ -3,11 +3,14 @@
 # SPDX-License-Identifier: BSD-3-Clause
 from __future__ import absolute_import, division, print_function, unicode_literals
 
-from errno import EACCES, ENOENT, EPERM
+from collections import defaultdict
+from errno import EACCES, EEXIST, ENOENT, EPERM, EXDEV
 from functools import reduce
 from logging import getLogger
+import os
 from os import listdir
 from os.path import basename, dirname, join
+from stat import S_IMODE, S_ISREG
 from tarfile import ReadError
 
 from .path_actions import CacheUrlAction, ExtractPackageAction
@@ -17,19 +20,22 @@ from .._vendor.auxlib.decorators import memoizemethod
 from .._vendor.toolz import concat, concatv, groupby
 from ..base.constants import CONDA_TARBALL_EXTENSION, PACKAGE_CACHE_MAGIC_FILE
 from ..base.context import context
-from ..common.compat import (JSONDecodeError, iteritems, itervalues, odict, string_types,
-                             text_type, with_metaclass)
+from ..common.compat import (JSONDecodeError, iteritems, itervalues, odict, on_win,
+                             string_types, text_type, with_metaclass)
 from ..common.constants import NULL
-from ..common.io import ProgressBar, time_recorder
+from ..common.io import (ProgressBar, ThreadLimitedThreadPoolExecutor, as_completed,
+                         time_recorder)
 from ..common.path import expand, url_to_path
 from ..common.signals import signal_handler
 from ..common.url import path_to_url
 from ..exceptions import NoWritablePkgsDirError, NotWritableError
 from ..gateways.disk.create import (create_package_cache_directory, extract_tarball,
-                                    write_as_json_to_file)
+                                    write_as_json_to_file, write_extract_manifest)
 from ..gateways.disk.delete import rm_rf
-from ..gateways.disk.read import (compute_md5sum, isdir, isfile, islink, read_index_json,
-                                  read_index_json_from_tarball, read_repodata_json)
+from ..gateways.disk.read import (compute_md5sum, compute_sha256sum, get_recorded_digest, isdir,
+                                  isfile, islink, read_extract_manifest, read_index_json,
+                                  read_index_json_from_tarball, read_paths_json,
+                                  read_repodata_json)
 from ..gateways.disk.test import file_path_is_writable
 from ..models.match_spec import MatchSpec
 from ..models.records import PackageCacheRecord, PackageRecord
@@ -61,19 +67,25 @@ class PackageCacheData(object):
     def __init__(self, pkgs_dir):
         self.pkgs_dir = pkgs_dir
         self.__package_cache_records = None
+        self.__fn_index = None
         self.__is_writable = NULL
 
         self._urls_data = UrlsData(pkgs_dir)
 
-    def insert(self, package_cache_record):
-
-        meta = join(package_cache_record.extracted_package_dir, 'info', 'repodata_record.json')
-        write_as_json_to_file(meta, PackageRecord.from_objects(package_cache_record))
+    def insert(self, package_cache_record, write_record=True):
+        if write_record:
+            meta = join(package_cache_record.extracted_package_dir, 'info',
+                        'repodata_record.json')
+            write_as_json_to_file(meta, PackageRecord.from_objects(package_cache_record))
 
         self._package_cache_records[package_cache_record] = package_cache_record
+        fn_records = self._fn_index[package_cache_record.fn]
+        fn_records[:] = [pcrec for pcrec in fn_records if pcrec != package_cache_record]
+        fn_records.append(package_cache_record)
 
     def load(self):
         self.__package_cache_records = _package_cache_records = {}
+        self.__fn_index = _fn_index = defaultdict(list)
         self._check_writable()  # called here to create the cache if it doesn't exist
         if not isdir(self.pkgs_dir):
             # no directory exists, and we didn't have permissions to create it
@@ -88,6 +100,7 @@ class PackageCacheData(object):
                 package_cache_record = self._make_single_record(base_name)
                 if package_cache_record:
                     _package_cache_records[package_cache_record] = package_cache_record
+                    _fn_index[package_cache_record.fn].append(package_cache_record)
 
     def reload(self):
         self.load()
@@ -105,9 +118,13 @@ class PackageCacheData(object):
 
     def remove(self, package_ref, default=NULL):
         if default is NULL:
-            return self._package_cache_records.pop(package_ref)
+            pcrec = self._package_cache_records.pop(package_ref)
         else:
-            return self._package_cache_records.pop(package_ref, default)
+            pcrec = self._package_cache_records.pop(package_ref, default)
+        if isinstance(pcrec, PackageRecord):
+            fn_records = self._fn_index.get(pcrec.fn, [])
+            fn_records[:] = [rec for rec in fn_records if rec != pcrec]
+        return pcrec
 
     def query(self, package_ref_or_match_spec):
         # returns a generator
@@ -115,8 +132,13 @@ class PackageCacheData(object):
         if isinstance(param, string_types):
             param = MatchSpec(param)
         if isinstance(param, MatchSpec):
-            return (pcrec for pcrec in itervalues(self._package_cache_records)
-                    if param.match(pcrec))
+            # url and explicit specs name a single tarball, so look it up by filename
+            fn = param.get_exact_value('fn')
+            if fn:
+                candidates = tuple(self._fn_index.get(fn, ()))
+            else:
+                candidates = itervalues(self._package_cache_records)
+            return (pcrec for pcrec in candidates if param.match(pcrec))
         else:
             assert isinstance(param, PackageRecord)
             return (pcrec for pcrec in itervalues(self._package_cache_records) if pcrec == param)
@@ -237,6 +259,12 @@ class PackageCacheData(object):
             self.load()
         return self.__package_cache_records
 
+    @property
+    def _fn_index(self):
+        if self.__fn_index is None:
+            self.load()
+        return self.__fn_index
+
     @property
     def is_writable(self):
         # returns None if package cache directory does not exist / has not been created
@@ -330,7 +358,11 @@ class PackageCacheData(object):
                             # to do is remove it and try extracting.
                             rm_rf(extracted_package_dir)
                         try:
-                            extract_tarball(package_tarball_full_path, extracted_package_dir)
+                            tarball_md5, member_digests = extract_tarball(
+                                package_tarball_full_path, extracted_package_dir)
+                            write_extract_manifest(extracted_package_dir,
+                                                   package_tarball_full_path, tarball_md5,
+                                                   member_digests)
                         except EnvironmentError as e:
                             if e.errno == ENOENT:
                                 # FileNotFoundError(2, 'No such file or directory')
@@ -361,7 +393,9 @@ class PackageCacheData(object):
 
             # we were able to read info/index.json, so let's continue
             if isfile(package_tarball_full_path):
-                md5 = compute_md5sum(package_tarball_full_path)
+                tarball_entry = read_extract_manifest(extracted_package_dir).get('tarball')
+                md5 = (get_recorded_digest(tarball_entry, package_tarball_full_path, 'md5')
+                       or compute_md5sum(package_tarball_full_path))
             else:
                 md5 = None
 
@@ -443,6 +477,209 @@ class UrlsData(object):
         return first(self, lambda url: basename(url) == package_path)
 
 
+class PackageUsageData(object):
+    # this is a class to manage info/linked_prefixes.txt in an extracted package
+    # it's an append-only log of the prefixes the package has been hard- or soft-linked into by
+    #   UnlinkLinkTransaction, letting `conda clean --packages` decide whether a package is in
+    #   use without walking the package and checking the link count of every file
+    # like UrlsData, this class breaks the rule that all disk access goes through conda.gateways
+
+    def __init__(self, extracted_package_dir):
+        self.extracted_package_dir = extracted_package_dir
+        self.usage_txt_path = join(extracted_package_dir, 'info', 'linked_prefixes.txt')
+
+    def linked_prefixes(self):
+        # returns None if no usage has ever been recorded for this package
+        return self._read()[0]
+
+    def in_use(self):
+        # returns True if a recorded prefix still has the package's record in conda-meta/, and
+        #   None otherwise, in which case link counts have to be checked; the package may still
+        #   be hardlinked by an older conda, or into an environment that was moved or renamed
+        # prefixes that were removed without a transaction (e.g. `conda remove --all`) no longer
+        #   have the record, and are dropped when the log is compacted here
+        prefixes, line_count = self._read()
+        if prefixes is None:
+            return None
+        prefix_record_fn = basename(self.extracted_package_dir) + '.json'
+        current = set(prefix for prefix in prefixes
+                      if isfile(join(prefix, 'conda-meta', prefix_record_fn)))
+        if line_count > len(current):
+            self._compact(current)
+        return True if current else None
+
+    def _read(self):
+        # returns the set of linked prefixes and the number of lines in the log
+        if not isfile(self.usage_txt_path):
+            return None, 0
+        prefixes = set()
+        line_count = 0
+        with open(self.usage_txt_path, 'r') as fh:
+            for line in fh:
+                line_count += 1
+                action, _, prefix = line.rstrip('\n').partition('\t')
+                if action == 'link':
+                    prefixes.add(prefix)
+                elif action == 'unlink':
+                    prefixes.discard(prefix)
+        return prefixes, line_count
+
+    def _compact(self, prefixes):
+        # an entry appended by a transaction in the meantime can be lost; that package then
+        #   only falls back to the link count check
+        temp_path = '%s.%s.tmp' % (self.usage_txt_path, os.getpid())
+        try:
+            with open(temp_path, 'w') as fh:
+                fh.writelines('link\t%s\n' % prefix for prefix in sorted(prefixes))
+            if on_win:
+                os.unlink(self.usage_txt_path)
+            os.rename(temp_path, self.usage_txt_path)
+        except EnvironmentError as e:
+            log.debug("unable to compact package usage in %s\n%r", self.usage_txt_path, e)
+
+    def add_prefix(self, prefix):
+        self._append('link', prefix)
+
+    def remove_prefix(self, prefix):
+        self._append('unlink', prefix)
+
+    def _append(self, action, prefix):
+        # a failure here only means `conda clean` has less information; never fail a transaction
+        try:
+            with open(self.usage_txt_path, 'a') as fh:
+                fh.write('%s\t%s\n' % (action, prefix))
+        except EnvironmentError as e:
+            log.debug("unable to record package usage in %s\n%r", self.usage_txt_path, e)
+
+
+class PackageContentStore(object):
+    # this is a class to manage the optional content-addressed file store at
+    #   context.content_store_dir
+    # files of extracted packages are hardlinked into the store under the sha256 recorded for
+    #   them in info/paths.json, so identical files across builds and across pkgs_dirs on the
+    #   same filesystem share one inode
+    # a store file is named for its digest and mode, as hardlinks share permissions; one with a
+    #   link count of one is used by no package, and is removed by prune()
+    # like PackageUsageData, this class breaks the rule that all disk access goes through
+    #   conda.gateways
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+
+    def store_path(self, sha256, mode):
+        return join(self.store_dir, sha256[:2], '%s-%o' % (sha256, mode))
+
+    def add_package(self, extracted_package_dir, paths_data=None, member_digests=None):
+        # returns the number of bytes no longer taking separate space
+        # files whose content doesn't match paths.json are left alone; so is the whole package
+        #   once the store is found to be on another filesystem or not writable
+        # member_digests, as returned by extract_tarball, spares hashing files a second time
+        member_digests = member_digests or {}
+        if paths_data is None:
+            paths_data = read_paths_json(extracted_package_dir)
+        saved = 0
+        for path_data in paths_data.paths:
+            sha256 = getattr(path_data, 'sha256', None)
+            if not sha256:
+                continue
+            path = join(extracted_package_dir, path_data.path)
+            try:
+                digest = member_digests.get(path_data.path)
+                saved += self._add_file(path, sha256, digest and digest[0] == sha256)
+            except EnvironmentError as e:
+                log.debug("unable to add %s to content store %s\n%r", path, self.store_dir, e)
+                if e.errno in (EXDEV, EPERM, EACCES):
+                    break
+        return saved
+
+    def _add_file(self, path, sha256, verified=False):
+        st = os.lstat(path)
+        if not S_ISREG(st.st_mode):
+            return 0
+        store_path = self.store_path(sha256, S_IMODE(st.st_mode))
+        try:
+            store_st = os.lstat(store_path)
+        except EnvironmentError as e:
+            if e.errno != ENOENT:
+                raise
+            store_st = None
+        if store_st is not None and (store_st.st_dev, store_st.st_ino) == (st.st_dev, st.st_ino):
+            return 0
+        if store_st is not None and not on_win and store_st.st_uid != os.getuid():
+            # in a store shared between users, the owner of a file could change it under
+            #   everyone linked to it; only files added by this user are linked to
+            log.debug("not linking to %s, owned by uid %s", store_path, store_st.st_uid)
+            return 0
+        if not verified and compute_sha256sum(path) != sha256:
+            log.debug("content of %s doesn't match its recorded sha256", path)
+            return 0
+        if store_st is not None and (store_st.st_size != st.st_size
+                                     or compute_sha256sum(store_path) != sha256):
+            # the store copy was modified in place through one of its links; replace it with
+            #   the verified file, rather than link the modification into this package too
+            log.debug("replacing modified content store file %s", store_path)
+            temp_path = '%s.%s.tmp' % (store_path, os.getpid())
+            os.link(path, temp_path)
+            if on_win:
+                os.unlink(store_path)
+            os.rename(temp_path, store_path)
+            return 0
+        if store_st is None:
+            try:
+                os.makedirs(dirname(store_path))
+            except EnvironmentError as e:
+                if e.errno != EEXIST:
+                    raise
+            try:
+                os.link(path, store_path)
+                return 0
+            except EnvironmentError as e:
+                if e.errno != EEXIST:
+                    raise
+                # added by another process in the meantime; link to its copy instead
+        temp_path = '%s.%s.tmp' % (path, os.getpid())
+        os.link(store_path, temp_path)
+        if on_win:
+            os.unlink(path)
+        os.rename(temp_path, path)
+        return st.st_size
+
+    def stored_inodes(self, extracted_package_dir):
+        # the (st_dev, st_ino) of every file in the package that is linked into the store
+        inodes = set()
+        try:
+            paths_data = read_paths_json(extracted_package_dir)
+        except (CondaError, EnvironmentError, ValueError):
+            return inodes
+        for path_data in paths_data.paths:
+            sha256 = getattr(path_data, 'sha256', None)
+            if not sha256:
+                continue
+            try:
+                st = os.lstat(join(extracted_package_dir, path_data.path))
+                store_st = os.lstat(self.store_path(sha256, S_IMODE(st.st_mode)))
+            except EnvironmentError:
+                continue
+            if st.st_ino and (store_st.st_dev, store_st.st_ino) == (st.st_dev, st.st_ino):
+                inodes.add((st.st_dev, st.st_ino))
+        return inodes
+
+    def prune(self):
+        # removes the files no package links to anymore; returns their total size
+        freed = 0
+        for root, _, filenames in os.walk(self.store_dir):
+            for fn in filenames:
+                path = join(root, fn)
+                try:
+                    st = os.lstat(path)
+                    if st.st_nlink == 1:
+                        os.unlink(path)
+                        freed += st.st_size
+                except EnvironmentError as e:
+                    log.debug("unable to prune %s\n%r", path, e)
+        return freed
+
+
 # ##############################
 # downloading
 # ##############################
@@ -582,7 +819,12 @@ class ProgressiveFetchExtract(object):
     def extract_actions(self):
         return tuple(axns[1] for axns in itervalues(self.paired_actions) if axns[1])
 
-    def execute(self):
+    def execute(self, max_workers=1):
+        """Fetch and extract the packages, running up to max_workers packages at a time.
+
+        When packages are processed concurrently, the terminal shows a single progress bar
+        for all of them, while json output still reports the progress of each package.
+        """
         if self._executed:
             return
         if not self._prepared:
@@ -607,8 +849,25 @@ class ProgressiveFetchExtract(object):
 
         exceptions = []
         with signal_handler(conda_signal_handler), time_recorder("fetch_extract_execute"):
-            for prec_or_spec, prec_actions in iteritems(self.paired_actions):
-                exc = self._execute_actions(prec_or_spec, prec_actions)
+            if max_workers > 1:
+                progress_bar = ProgressBar("Total: %d packages | " % len(self.paired_actions),
+                                           not context.verbosity and not context.quiet
+                                           and not context.json)
+                try:
+                    with ThreadLimitedThreadPoolExecutor(max_workers) as executor:
+                        futures = tuple(executor.submit(self._execute_actions, prec_or_spec,
+                                                        prec_actions, False)
+                                        for prec_or_spec, prec_actions
+                                        in iteritems(self.paired_actions))
+                        for completed, _ in enumerate(as_completed(futures), 1):
+                            progress_bar.update_to(completed / len(futures))
+                        results = tuple(future.result() for future in futures)
+                finally:
+                    progress_bar.close()
+            else:
+                results = (self._execute_actions(prec_or_spec, prec_actions)
+                           for prec_or_spec, prec_actions in iteritems(self.paired_actions))
+            for exc in results:
                 if exc:
                     log.debug('%r', exc, exc_info=True)
                     exceptions.append(exc)
@@ -618,7 +877,7 @@ class ProgressiveFetchExtract(object):
         self._executed = True
 
     @staticmethod
-    def _execute_actions(prec_or_spec, actions):
+    def _execute_actions(prec_or_spec, actions, show_progress=True):
         cache_axn, extract_axn = actions
         if cache_axn is None and extract_axn is None:
             return
@@ -633,7 +892,10 @@ class ProgressiveFetchExtract(object):
         if len(size_str) > 0:
             desc += "%-9s | " % size_str
 
-        progress_bar = ProgressBar(desc, not context.verbosity and not context.quiet, context.json)
+        # json progress records are written even when the terminal bar isn't shown
+        progress_bar = ProgressBar(desc, (show_progress or context.json)
+                                   and not context.verbosity and not context.quiet,
+                                   context.json)
 
         download_total = 0.75  # fraction of progress for download; the rest goes to extract
         try:
@@ -11,7 +11,8 @@ import re
 from uuid import uuid4
 
 from .envs_manager import USER_ENVIRONMENTS_TXT_FILE, register_env, unregister_env
-from .portability import _PaddingError, update_prefix
+from .portability import (_PaddingError, get_recorded_placeholder_offsets,
+                          record_placeholder_offsets, update_prefix)
 from .prefix_data import PrefixData
 from .._vendor.auxlib.compat import with_metaclass
 from .._vendor.auxlib.ish import dals
@@ -24,14 +25,17 @@ from ..common.path import (get_bin_directory_short_path, get_leaf_directories,
                            pyc_path, url_to_path, win_path_ok)
 from ..common.url import has_platform, path_to_url, unquote
 from ..exceptions import CondaUpgradeError, CondaVerificationError, PaddingError, SafetyError
-from ..gateways.connection.download import download
 from ..gateways.disk.create import (compile_pyc, copy, create_hard_link_or_copy,
                                     create_link, create_python_entry_point, extract_tarball,
-                                    make_menu, write_as_json_to_file)
+                                    make_menu, write_as_json_to_file, write_extract_manifest)
 from ..gateways.disk.delete import rm_rf, try_rmdir_all_empty
 from ..gateways.disk.permissions import make_writable
-from ..gateways.disk.read import (compute_md5sum, compute_sha256sum, islink, lexists,
-                                  read_index_json)
+from ..gateways.disk.lock import advisory_lock
+from ..gateways.disk.read import (compute_md5sum, compute_sha256sum, get_recorded_digest, isdir,
+                                  isfile, islink, lexists, read_extract_manifest,
+                                  read_index_json, read_paths_json, read_prefix_offsets,
+                                  read_repodata_json)
+from ..gateways.disk.test import reflink_supported
 from ..gateways.disk.update import backoff_rename, touch
 from ..history import History
 from ..models.channel import Channel
@@ -42,6 +46,8 @@ from ..models.records import (Link, PackageCacheRecord, PackageRecord, PathDataV
 
 log = getLogger(__name__)
 
+PACKAGE_LOCKS_DIRNAME = '.locks'
+
 REPR_IGNORE_KWARGS = (
     'transaction_context',
     'package_info',
@@ -156,6 +162,14 @@ class LinkPathAction(CreateInPrefixPathAction):
 
             return link_type, prefix_placehoder, file_mode
 
+        if any(spi.prefix_placeholder for spi in package_info.paths_data.paths):
+            prefix_offsets = read_prefix_offsets(package_info.extracted_package_dir)
+        else:
+            prefix_offsets = {}
+        # digests taken at extract time, sparing verify() from hashing each file again
+        extract_manifest = read_extract_manifest(package_info.extracted_package_dir)
+        extract_manifest_paths = extract_manifest.get('paths') or {}
+
         def make_file_link_action(source_path_data):
             # TODO: this inner function is still kind of a mess
             noarch = package_info.repodata_record.noarch
@@ -177,12 +191,15 @@ class LinkPathAction(CreateInPrefixPathAction):
                                                source_path_data.path,
                                                target_prefix, target_short_path,
                                                requested_link_type,
-                                               placeholder, fmode, source_path_data)
+                                               placeholder, fmode, source_path_data,
+                                               prefix_offsets.get(source_path_data.path),
+                                               extract_manifest_paths.get(source_path_data.path))
             else:
                 return LinkPathAction(transaction_context, package_info,
                                       package_info.extracted_package_dir, source_path_data.path,
                                       target_prefix, target_short_path,
-                                      link_type, source_path_data)
+                                      link_type, source_path_data,
+                                      extract_manifest_paths.get(source_path_data.path))
         return tuple(make_file_link_action(spi) for spi in package_info.paths_data.paths)
 
     @classmethod
@@ -213,13 +230,15 @@ class LinkPathAction(CreateInPrefixPathAction):
 
     def __init__(self, transaction_context, package_info,
                  extracted_package_dir, source_short_path,
-                 target_prefix, target_short_path, link_type, source_path_data):
+                 target_prefix, target_short_path, link_type, source_path_data,
+                 extract_manifest_entry=None):
         super(LinkPathAction, self).__init__(transaction_context, package_info,
                                              extracted_package_dir, source_short_path,
                                              target_prefix, target_short_path)
         self.link_type = link_type
         self._execute_successful = False
         self.source_path_data = source_path_data
+        self.extract_manifest_entry = extract_manifest_entry
         self.prefix_path_data = None
 
     def verify(self):
@@ -259,7 +278,9 @@ class LinkPathAction(CreateInPrefixPathAction):
                 reported_sha256 = source_path_data.sha256
             except AttributeError:
                 reported_sha256 = None
-            source_sha256 = compute_sha256sum(self.source_full_path)
+            source_sha256 = (get_recorded_digest(self.extract_manifest_entry,
+                                                 self.source_full_path)
+                             or compute_sha256sum(self.source_full_path))
             if reported_sha256 and reported_sha256 != source_sha256:
                 return SafetyError(dals("""
                 The package for %s located at %s
@@ -328,15 +349,19 @@ class PrefixReplaceLinkAction(LinkPathAction):
                  extracted_package_dir, source_short_path,
                  target_prefix, target_short_path,
                  link_type,
-                 prefix_placeholder, file_mode, source_path_data):
+                 prefix_placeholder, file_mode, source_path_data,
+                 prefix_offsets_entry=None, extract_manifest_entry=None):
         # This link_type used in execute(). Make sure we always respect LinkType.copy request.
-        link_type = LinkType.copy if link_type == LinkType.copy else LinkType.hardlink
+        if link_type not in (LinkType.copy, LinkType.reflink):
+            link_type = LinkType.hardlink
         super(PrefixReplaceLinkAction, self).__init__(transaction_context, package_info,
                                                       extracted_package_dir, source_short_path,
                                                       target_prefix, target_short_path,
-                                                      link_type, source_path_data)
+                                                      link_type, source_path_data,
+                                                      extract_manifest_entry)
         self.prefix_placeholder = prefix_placeholder
         self.file_mode = file_mode
+        self.prefix_offsets_entry = prefix_offsets_entry
         self.intermediate_path = None
 
     def verify(self):
@@ -350,10 +375,22 @@ class PrefixReplaceLinkAction(LinkPathAction):
             # return
             assert False, "I don't think this is the right place to ignore this"
 
+        # placeholder offsets recorded at extract time; None falls back to a full scan
+        placeholder_offsets = get_recorded_placeholder_offsets(
+            self.prefix_offsets_entry, self.source_full_path, self.prefix_placeholder,
+        )
+
         self.intermediate_path = join(self.transaction_context['temp_dir'], text_type(uuid4()))
 
+        # the intermediate file is rewritten in place, so it must never share an inode with the
+        #   package cache; a copy-on-write clone is safe and avoids copying the data up front
+        source_test_file = join(self.package_info.extracted_package_dir, 'info', 'index.json')
+        if reflink_supported(source_test_file, self.transaction_context['temp_dir']):
+            intermediate_link_type = LinkType.reflink
+        else:
+            intermediate_link_type = LinkType.copy
         log.trace("copying %s => %s", self.source_full_path, self.intermediate_path)
-        create_link(self.source_full_path, self.intermediate_path, LinkType.copy)
+        create_link(self.source_full_path, self.intermediate_path, intermediate_link_type)
         make_writable(self.intermediate_path)
 
         try:
@@ -361,7 +398,8 @@ class PrefixReplaceLinkAction(LinkPathAction):
             update_prefix(self.intermediate_path,
                           context.target_prefix_override or self.target_prefix,
                           self.prefix_placeholder,
-                          self.file_mode)
+                          self.file_mode,
+                          placeholder_offsets)
         except _PaddingError:
             raise PaddingError(self.target_full_path, self.prefix_placeholder,
                                len(self.prefix_placeholder))
@@ -769,13 +807,25 @@ class CreatePrefixRecordAction(CreateInPrefixPathAction):
         )
 
         log.trace("creating linked package record %s", self.target_full_path)
-        PrefixData(self.target_prefix).insert(self.prefix_record)
+        # written with the rest of the transaction's records; see UnlinkLinkTransaction._execute
+        PrefixData(self.target_prefix).insert(self.prefix_record, defer_write=True)
+
+        if self.requested_link_type in (LinkType.hardlink, LinkType.softlink):
+            # copies don't depend on the package cache, so only links are recorded
+            from .package_cache_data import PackageUsageData
+            PackageUsageData(extracted_package_dir).add_prefix(self.target_prefix)
 
     def reverse(self):
         log.trace("reversing linked package record creation %s", self.target_full_path)
         # TODO: be careful about failure here, and being too strict
         PrefixData(self.target_prefix).remove(self.package_info.repodata_record.name)
 
+        if self.requested_link_type in (LinkType.hardlink, LinkType.softlink):
+            from .package_cache_data import PackageUsageData
+            PackageUsageData(self.package_info.extracted_package_dir).remove_prefix(
+                self.target_prefix
+            )
+
 
 class UpdateHistoryAction(CreateInPrefixPathAction):
 
@@ -925,10 +975,23 @@ class RemoveLinkedPackageRecordAction(UnlinkPathAction):
     def execute(self):
         super(RemoveLinkedPackageRecordAction, self).execute()
         PrefixData(self.target_prefix).remove(self.linked_package_data.name)
+        package_usage_data = self._package_usage_data()
+        if package_usage_data:
+            package_usage_data.remove_prefix(self.target_prefix)
 
     def reverse(self):
         super(RemoveLinkedPackageRecordAction, self).reverse()
         PrefixData(self.target_prefix)._load_single_record(self.target_full_path)
+        package_usage_data = self._package_usage_data()
+        if package_usage_data:
+            package_usage_data.add_prefix(self.target_prefix)
+
+    def _package_usage_data(self):
+        extracted_package_dir = getattr(self.linked_package_data, 'extracted_package_dir', None)
+        if extracted_package_dir and isdir(extracted_package_dir):
+            from .package_cache_data import PackageUsageData
+            return PackageUsageData(extracted_package_dir)
+        return None
 
 
 class UnregisterEnvironmentLocationAction(PathAction):
@@ -979,9 +1042,22 @@ class CacheUrlAction(PathAction):
         self._verified = True
 
     def execute(self, progress_update_callback=None):
+        # Concurrent conda processes sharing a package cache fetch a given package one at a
+        #   time; whoever waited on the lock reuses the tarball if it checks out.
+        lock_path = _package_lock_path(self.target_pkgs_dir, self.target_package_basename)
+        with advisory_lock(lock_path) as waited:
+            if (waited and self.md5sum and isfile(self.target_full_path)
+                    and compute_md5sum(self.target_full_path) == self.md5sum):
+                log.debug("reusing %s fetched by another process", self.target_full_path)
+                return
+            self._execute(progress_update_callback)
+
+    def _execute(self, progress_update_callback=None):
         # I hate inline imports, but I guess it's ok since we're importing from the conda.core
         # The alternative is passing the PackageCache class to CacheUrlAction __init__
         from .package_cache_data import PackageCacheData
+        # download pulls in requests, which only a fetch needs
+        from ..gateways.connection.download import download
         target_package_cache = PackageCacheData(self.target_pkgs_dir)
 
         log.trace("caching url %s => %s", self.url, self.target_full_path)
@@ -1073,11 +1149,41 @@ class ExtractPackageAction(PathAction):
         self.hold_path = self.target_full_path + '.c~'
         self.record_or_spec = record_or_spec
         self.md5sum = md5sum
+        self._reused = False
 
     def verify(self):
         self._verified = True
 
     def execute(self, progress_update_callback=None):
+        # see CacheUrlAction.execute; the fetch and extract of a package share one lock
+        lock_path = _package_lock_path(self.target_pkgs_dir, self.target_extracted_dirname)
+        with advisory_lock(lock_path) as waited:
+            self._reused = waited and self._reuse_extracted_package()
+            if not self._reused:
+                self._execute(progress_update_callback)
+
+    def _reuse_extracted_package(self):
+        from .package_cache_data import PackageCacheData
+        # the completeness check of PackageCacheRecord.is_extracted, plus info/paths.json
+        if not self.md5sum or not all(isfile(join(self.target_full_path, 'info', fn))
+                                      for fn in ('index.json', 'paths.json')):
+            return False
+        try:
+            repodata_record = read_repodata_json(self.target_full_path)
+        except (EnvironmentError, ValueError):
+            return False
+        if repodata_record.get('md5') != self.md5sum:
+            return False
+        log.debug("reusing %s extracted by another process", self.target_full_path)
+        package_cache_record = PackageCacheRecord.from_objects(
+            repodata_record,
+            package_tarball_full_path=self.source_full_path,
+            extracted_package_dir=self.target_full_path,
+        )
+        PackageCacheData(self.target_pkgs_dir).insert(package_cache_record, write_record=False)
+        return True
+
+    def _execute(self, progress_update_callback=None):
         # I hate inline imports, but I guess it's ok since we're importing from the conda.core
         # The alternative is passing the the classes to ExtractPackageAction __init__
         from .package_cache_data import PackageCacheData
@@ -1099,17 +1205,47 @@ class ExtractPackageAction(PathAction):
                 else:
                     raise
 
-        extract_tarball(self.source_full_path, self.target_full_path,
-                        progress_update_callback=progress_update_callback)
+        tarball_md5, member_digests = extract_tarball(
+            self.source_full_path, self.target_full_path,
+            progress_update_callback=progress_update_callback,
+        )
 
         raw_index_json = read_index_json(self.target_full_path)
 
+        paths_data = None
+        try:
+            paths_data = read_paths_json(self.target_full_path)
+        except (CondaUpgradeError, EnvironmentError, ValueError) as e:
+            log.debug("unable to read paths of %s: %r", self.target_full_path, e)
+
+        if context.content_store_dir and paths_data is not None:
+            from .package_cache_data import PackageContentStore
+            PackageContentStore(context.content_store_dir).add_package(self.target_full_path,
+                                                                       paths_data,
+                                                                       member_digests)
+
+        # the sidecars below record mtimes, so they're written after the content store, which
+        #   may swap files for links with another mtime; the extract manifest leaves those out
+        # scan for prefix placeholders once here, rather than every time the package is linked
+        if paths_data is not None:
+            try:
+                prefix_offsets = record_placeholder_offsets(self.target_full_path, paths_data)
+            except (EnvironmentError, ValueError) as e:
+                log.debug("unable to record prefix offsets for %s: %r", self.target_full_path, e)
+            else:
+                if prefix_offsets['paths']:
+                    prefix_offsets_path = join(self.target_full_path, 'info',
+                                               'prefix_offsets.json')
+                    write_as_json_to_file(prefix_offsets_path, prefix_offsets)
+        write_extract_manifest(self.target_full_path, self.source_full_path, tarball_md5,
+                               member_digests)
+
         if isinstance(self.record_or_spec, MatchSpec):
             url = self.record_or_spec.get_raw_value('url')
             assert url
             channel = Channel(url) if has_platform(url, context.known_subdirs) else Channel(None)
             fn = basename(url)
-            md5 = self.md5sum or compute_md5sum(self.source_full_path)
+            md5 = self.md5sum or tarball_md5
             repodata_record = PackageRecord.from_objects(raw_index_json, url=url,
                                                          channel=channel, fn=fn, md5=md5)
         else:
@@ -1131,6 +1267,9 @@ class ExtractPackageAction(PathAction):
         # target_package_cache[package_cache_entry.dist] = package_cache_entry
 
     def reverse(self):
+        if self._reused:
+            # the extracted package belongs to whoever extracted it
+            return
         rm_rf(self.target_full_path)
         if lexists(self.hold_path):
             log.trace("moving %s => %s", self.hold_path, self.target_full_path)
@@ -1147,3 +1286,10 @@ class ExtractPackageAction(PathAction):
     def __str__(self):
         return ('ExtractPackageAction<source_full_path=%r, target_full_path=%r>'
                 % (self.source_full_path, self.target_full_path))
+
+
+def _package_lock_path(pkgs_dir, package_basename):
+    # one lock file per package, shared by its tarball and its extracted directory
+    if package_basename.endswith(CONDA_TARBALL_EXTENSION):
+        package_basename = package_basename[:-len(CONDA_TARBALL_EXTENSION)]
+    return join(pkgs_dir, PACKAGE_LOCKS_DIRNAME, package_basename + '.lock')
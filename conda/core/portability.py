@@ -4,15 +4,20 @@
 from __future__ import absolute_import, division, print_function, unicode_literals
 
 from logging import getLogger
-from os.path import realpath
+import mmap
+import os
+from os.path import isfile, join, realpath
 import re
 import struct
 
 from ..base.constants import PREFIX_PLACEHOLDER
 from ..common.compat import on_win
+from ..common.path import win_path_ok
 from ..exceptions import CondaIOError, BinaryPrefixReplacementError
-from ..gateways.disk.update import CancelOperation, update_file_in_place_as_binary
-from ..models.enums import FileMode
+from ..gateways.disk.update import (CancelOperation, update_file_in_place_as_binary,
+                                    update_file_in_place_as_mmap)
+from ..gateways.disk.link import islink
+from ..models.enums import FileMode, PathType
 
 log = getLogger(__name__)
 
@@ -29,16 +34,30 @@ class _PaddingError(Exception):
     pass
 
 
-def update_prefix(path, new_prefix, placeholder=PREFIX_PLACEHOLDER, mode=FileMode.text):
+def update_prefix(path, new_prefix, placeholder=PREFIX_PLACEHOLDER, mode=FileMode.text,
+                  placeholder_offsets=None):
+    # placeholder_offsets: optional byte offsets of every placeholder occurrence in the file,
+    #   as recorded by record_placeholder_offsets() at extract time; when given and still
+    #   accurate, the file isn't rescanned for the placeholder
     if on_win and mode == FileMode.text:
         # force all prefix replacements to forward slashes to simplify need to escape backslashes
         # replace with unix-style path separators
         new_prefix = new_prefix.replace('\\', '/')
 
+    if mode == FileMode.binary and not on_win:
+        # binary files can be hundreds of MB; patch only the affected null-terminated strings
+        #   directly in a memory map rather than reading and rewriting the whole file
+        update_binary_prefix_in_place(realpath(path), placeholder, new_prefix,
+                                      placeholder_offsets)
+        return
+
     def _update_prefix(original_data):
 
         # Step 1. do all prefix replacement
-        data = replace_prefix(mode, original_data, placeholder, new_prefix)
+        offsets = placeholder_offsets
+        if offsets is not None and not _offsets_valid(original_data, placeholder, offsets):
+            offsets = None
+        data = replace_prefix(mode, original_data, placeholder, new_prefix, offsets)
 
         # Step 2. if the shebang is too long, shorten it using /usr/bin/env trick
         if not on_win:
@@ -59,21 +78,160 @@ def update_prefix(path, new_prefix, placeholder=PREFIX_PLACEHOLDER, mode=FileMod
     update_file_in_place_as_binary(realpath(path), _update_prefix)
 
 
-def replace_prefix(mode, data, placeholder, new_prefix):
+def replace_prefix(mode, data, placeholder, new_prefix, placeholder_offsets=None):
     if mode == FileMode.text:
-        data = data.replace(placeholder.encode('utf-8'), new_prefix.encode('utf-8'))
+        if placeholder_offsets is None:
+            data = data.replace(placeholder.encode('utf-8'), new_prefix.encode('utf-8'))
+        else:
+            data = _text_replace_at_offsets(data, placeholder.encode('utf-8'),
+                                            new_prefix.encode('utf-8'), placeholder_offsets)
     elif mode == FileMode.binary:
-        data = binary_replace(data, placeholder.encode('utf-8'), new_prefix.encode('utf-8'))
+        data = binary_replace(data, placeholder.encode('utf-8'), new_prefix.encode('utf-8'),
+                              placeholder_offsets)
     else:
         raise CondaIOError("Invalid mode: %r" % mode)
     return data
 
 
-def binary_replace(data, a, b):
+def find_placeholder_offsets(buf, placeholder):
+    """
+    Return the byte offsets of every non-overlapping occurrence of `placeholder` in `buf`.
+    These are exactly the occurrences rewritten by both text and binary prefix replacement.
+    """
+    a = placeholder.encode('utf-8') if hasattr(placeholder, 'encode') else placeholder
+    return list(_iter_find(buf, a))
+
+
+def record_placeholder_offsets(extracted_package_dir, paths_data):
+    """
+    Scan every file carrying a prefix placeholder in an extracted package once, and return
+    the content of the package's info/prefix_offsets.json sidecar.  The recorded offsets
+    serve both text and binary mode replacement.  Size and mtime are kept so that a file
+    modified after extraction is detected and rescanned at link time.
+    """
+    paths = {}
+    for path_data in paths_data.paths:
+        placeholder = path_data.prefix_placeholder
+        if not placeholder or path_data.path_type == PathType.softlink:
+            continue
+        full_path = join(extracted_package_dir, win_path_ok(path_data.path))
+        if islink(full_path) or not isfile(full_path):
+            continue
+        st = os.stat(full_path)
+        offsets = []
+        if st.st_size:
+            with open(full_path, 'rb') as fh:
+                mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+                try:
+                    offsets = find_placeholder_offsets(mm, placeholder)
+                finally:
+                    mm.close()
+        paths[path_data.path] = {
+            'prefix_placeholder': placeholder,
+            'size': st.st_size,
+            'mtime': st.st_mtime,
+            'offsets': offsets,
+        }
+    return {
+        'prefix_offsets_version': 1,
+        'paths': paths,
+    }
+
+
+def get_recorded_placeholder_offsets(entry, full_path, placeholder):
+    # entry is a single file's record from the prefix_offsets.json sidecar
+    # returns None, signaling a full rescan, if the entry is missing or no longer current
+    if not entry or entry.get('prefix_placeholder') != placeholder:
+        return None
+    try:
+        st = os.stat(full_path)
+    except EnvironmentError:
+        return None
+    if st.st_size != entry.get('size') or st.st_mtime != entry.get('mtime'):
+        log.debug("prefix offsets for %s are stale; rescanning", full_path)
+        return None
+    return entry.get('offsets')
+
+
+def _iter_find(buf, a):
+    pos = buf.find(a)
+    while pos >= 0:
+        yield pos
+        pos = buf.find(a, pos + len(a))
+
+
+def _offsets_valid(buf, placeholder, offsets):
+    a = placeholder.encode('utf-8') if hasattr(placeholder, 'encode') else placeholder
+    for pos in offsets:
+        if buf[pos:pos + len(a)] != a:
+            log.debug("recorded placeholder offset %s is stale; rescanning", pos)
+            return False
+    return True
+
+
+def _text_replace_at_offsets(data, a, b, offsets):
+    parts = []
+    last = 0
+    for pos in offsets:
+        parts.append(data[last:pos])
+        last = pos + len(a)
+    parts.append(data[last:])
+    return b.join(parts)
+
+
+def update_binary_prefix_in_place(path, placeholder, new_prefix, placeholder_offsets=None):
+    a = placeholder.encode('utf-8')
+    b = new_prefix.encode('utf-8')
+
+    def _update_prefix(mm):
+        offsets = placeholder_offsets
+        if offsets is not None and not _offsets_valid(mm, a, offsets):
+            offsets = None
+        if not _binary_replace_in_buffer(mm, a, b, offsets):
+            raise CancelOperation()
+
+    update_file_in_place_as_mmap(path, _update_prefix)
+
+
+def _binary_replace_in_buffer(buf, a, b, offsets=None):
+    """
+    Perform the replacement described in `binary_replace` directly on the mutable buffer `buf`
+    (a bytearray or mmap), locating placeholders with `find` rather than a regex callback, or
+    using the already-known placeholder `offsets` when given.
+    All edits are computed before any are applied, so `buf` is left untouched if a
+    _PaddingError is raised.  Returns the number of null-terminated strings changed.
+    """
+    if offsets is None:
+        offsets = _iter_find(buf, a)
+    edits = []
+    end = -1
+    for pos in offsets:
+        if pos <= end:
+            # already handled as part of the previous null-terminated string
+            continue
+        end = buf.find(b'\0', pos + len(a))
+        if end < 0:
+            # the placeholder must be part of a null-terminated string
+            break
+        original = buf[pos:end]
+        replaced = original.replace(a, b)
+        padding = len(original) - len(replaced)
+        if padding < 0:
+            raise _PaddingError
+        if replaced != original:
+            edits.append((pos, end, replaced + b'\0' * padding))
+
+    for start, end, replacement in edits:
+        buf[start:end] = replacement
+    return len(edits)
+
+
+def binary_replace(data, a, b, offsets=None):
     """
     Perform a binary replacement of `data`, where the placeholder `a` is
     replaced with `b` and the remaining string is padded with null characters.
-    All input arguments are expected to be bytes objects.
+    All input arguments are expected to be bytes objects.  `offsets`, if given, are the
+    known positions of `a` in `data`.
     """
     if on_win:
         # on Windows for binary files, we currently only replace a pyzzer-type entry point
@@ -83,19 +241,10 @@ def binary_replace(data, a, b):
         else:
             return data
 
-    def replace(match):
-        occurances = match.group().count(a)
-        padding = (len(a) - len(b)) * occurances
-        if padding < 0:
-            raise _PaddingError
-        return match.group().replace(a, b) + b'\0' * padding
-
-    original_data_len = len(data)
-    pat = re.compile(re.escape(a) + b'([^\0]*?)\0')
-    data = pat.sub(replace, data)
-    assert len(data) == original_data_len
-
-    return data
+    buf = bytearray(data)
+    if not _binary_replace_in_buffer(buf, a, b, offsets):
+        return data
+    return bytes(buf)
 
 
 def has_pyzzer_entry_point(data):
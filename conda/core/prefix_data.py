@@ -3,20 +3,25 @@
 # SPDX-License-Identifier: BSD-3-Clause
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+from copy import copy
+from enum import Enum
 from fnmatch import filter as fnmatch_filter
+import json
 from logging import getLogger
+import os
 from os import listdir
-from os.path import basename, dirname, isdir, isfile, join, lexists
+from os.path import basename, dirname, isdir, isfile, join, lexists, normcase, normpath, relpath
 
 from ..base.constants import CONDA_TARBALL_EXTENSION, PREFIX_MAGIC_FILE
 from ..base.context import context
-from ..common.compat import JSONDecodeError, itervalues, string_types, with_metaclass
+from ..common.compat import (JSONDecodeError, ensure_binary, ensure_text_type, iteritems,
+                             itervalues, odict, on_win, open, string_types, with_metaclass)
 from ..common.constants import NULL
 from ..common.path import get_python_site_packages_short_path, win_path_ok
 from ..common.serialize import json_load
+from .._vendor.auxlib.entity import EntityEncoder
 from ..exceptions import (BasicClobberError, CondaDependencyError, CorruptedEnvironmentError,
                           maybe_raise)
-from ..gateways.disk.create import write_as_json_to_file
 from ..gateways.disk.delete import rm_rf
 from ..gateways.disk.test import file_path_is_writable
 from ..models.channel import Channel
@@ -27,6 +32,10 @@ from ..models.records import (PackageRecord, PathData, PathDataV1, PathsData, Pr
 
 log = getLogger(__name__)
 
+# Kept in conda-meta without a .json extension, so it is never loaded as a prefix record.
+PATH_INDEX_FILENAME = '.paths_index'
+PATH_INDEX_VERSION = 1
+
 
 class PrefixDataType(type):
     """Basic caching of PrefixData instance objects."""
@@ -52,6 +61,8 @@ class PrefixData(object):
         # TODO: when removing pip_interop_enabled, also remove from meta class
         self.prefix_path = prefix_path
         self.__prefix_records = None
+        self.__path_index = None
+        self.__deferred_records = odict()
         self.__is_writable = NULL
         self._pip_interop_enabled = (context.pip_interop_enabled
                                      if pip_interop_enabled is None
@@ -59,6 +70,7 @@ class PrefixData(object):
 
     def load(self):
         self.__prefix_records = {}
+        self.__path_index = None
         _conda_meta_dir = join(self.prefix_path, 'conda-meta')
         if lexists(_conda_meta_dir):
             for meta_file in fnmatch_filter(listdir(_conda_meta_dir), '*.json'):
@@ -70,25 +82,58 @@ class PrefixData(object):
         self.load()
         return self
 
-    def insert(self, prefix_record):
+    def insert(self, prefix_record, defer_write=False):
+        """Add prefix_record, writing its record file to conda-meta.
+
+        With defer_write, the file is written by the next call to flush() instead, so a
+        transaction writes all of its records in one pass once its packages are linked.
+        """
         assert prefix_record.name not in self._prefix_records
 
         assert prefix_record.fn.endswith(CONDA_TARBALL_EXTENSION)
         filename = prefix_record.fn[:-len(CONDA_TARBALL_EXTENSION)] + '.json'
 
-        prefix_record_json_path = join(self.prefix_path, 'conda-meta', filename)
-        if lexists(prefix_record_json_path):
-            maybe_raise(BasicClobberError(
-                source_path=None,
-                target_path=prefix_record_json_path,
-                context=context,
-            ), context)
-            rm_rf(prefix_record_json_path)
-
-        write_as_json_to_file(prefix_record_json_path, prefix_record)
+        if defer_write:
+            self.__deferred_records[filename] = prefix_record
+        else:
+            prefix_record_json_path = join(self.prefix_path, 'conda-meta', filename)
+            if lexists(prefix_record_json_path):
+                self._clobber_record(prefix_record_json_path)
+            _write_prefix_record(prefix_record_json_path, prefix_record)
 
         self._prefix_records[prefix_record.name] = prefix_record
 
+        if self.__path_index is not None:
+            for short_path in prefix_record.files or ():
+                self.__path_index.setdefault(_path_index_key(short_path), []).append(
+                    prefix_record.name)
+            if not self.__deferred_records:
+                self._write_path_index()
+
+    def flush(self):
+        """Write the record files of records inserted with defer_write."""
+        deferred_records, self.__deferred_records = self.__deferred_records, odict()
+        if not deferred_records:
+            return
+        conda_meta_dir = join(self.prefix_path, 'conda-meta')
+        existing_filenames = set(listdir(conda_meta_dir))
+        for filename, prefix_record in iteritems(deferred_records):
+            prefix_record_json_path = join(conda_meta_dir, filename)
+            if filename in existing_filenames:
+                self._clobber_record(prefix_record_json_path)
+            _write_prefix_record(prefix_record_json_path, prefix_record)
+        if self.__path_index is not None:
+            self._write_path_index()
+
+    @staticmethod
+    def _clobber_record(prefix_record_json_path):
+        maybe_raise(BasicClobberError(
+            source_path=None,
+            target_path=prefix_record_json_path,
+            context=context,
+        ), context)
+        rm_rf(prefix_record_json_path)
+
     def remove(self, package_name):
         assert package_name in self._prefix_records
 
@@ -96,11 +141,27 @@ class PrefixData(object):
 
         filename = prefix_record.fn[:-len(CONDA_TARBALL_EXTENSION)] + '.json'
         conda_meta_full_path = join(self.prefix_path, 'conda-meta', filename)
-        if self.is_writable:
+        if self.__deferred_records.pop(filename, None) is None and self.is_writable:
             rm_rf(conda_meta_full_path)
 
         del self._prefix_records[package_name]
 
+        path_index_path = join(self.prefix_path, 'conda-meta', PATH_INDEX_FILENAME)
+        if not self._prefix_records:
+            self.__path_index = None
+            if self.is_writable and lexists(path_index_path):
+                rm_rf(path_index_path)
+        elif self.__path_index is not None:
+            for short_path in prefix_record.files or ():
+                key = _path_index_key(short_path)
+                owners = self.__path_index.get(key, ())
+                if package_name in owners:
+                    owners.remove(package_name)
+                    if not owners:
+                        del self.__path_index[key]
+            if not self.__deferred_records:
+                self._write_path_index()
+
     def get(self, package_name, default=NULL):
         try:
             return self._prefix_records[package_name]
@@ -138,10 +199,87 @@ class PrefixData(object):
             assert isinstance(param, PackageRecord)
             return (prefix_rec for prefix_rec in self.iter_records() if prefix_rec == param)
 
+    def iter_path_owners(self, path):
+        """Iterate over the records of the packages that installed path.
+
+        path is either absolute or relative to the prefix.  Usually the iteration yields at
+        most one record.
+        """
+        path_index = self._path_index
+        names = path_index.get(_path_index_key(relpath(join(self.prefix_path, path),
+                                                       self.prefix_path)), ())
+        return (self._prefix_records[name] for name in names if name in self._prefix_records)
+
+    def is_tracked(self, short_path):
+        """Whether any package in the prefix installed short_path."""
+        return _path_index_key(short_path) in self._path_index
+
     @property
     def _prefix_records(self):
         return self.__prefix_records or self.load() or self.__prefix_records
 
+    @property
+    def _path_index(self):
+        """Map of normalized short path to the names of the packages that installed it.
+
+        The map is persisted in conda-meta, together with the record files it was built from.
+        A stored map is only used while that list matches the records on disk, so changes to
+        conda-meta made by anything other than this class are picked up.
+        """
+        if self.__path_index is None:
+            path_index = self._read_path_index()
+            if path_index is None:
+                path_index = {}
+                for prefix_record in self.iter_records():
+                    for short_path in prefix_record.files or ():
+                        path_index.setdefault(_path_index_key(short_path), []).append(
+                            prefix_record.name)
+                self.__path_index = path_index
+                self._write_path_index()
+            else:
+                self.__path_index = path_index
+        return self.__path_index
+
+    def _record_filenames(self):
+        conda_meta_dir = join(self.prefix_path, 'conda-meta')
+        if not isdir(conda_meta_dir):
+            return []
+        return sorted(fnmatch_filter(listdir(conda_meta_dir), '*.json'))
+
+    def _read_path_index(self):
+        if self._pip_interop_enabled:
+            # site-packages records aren't tracked by the stored record list
+            return None
+        path_index_path = join(self.prefix_path, 'conda-meta', PATH_INDEX_FILENAME)
+        try:
+            with open(path_index_path) as fh:
+                data = json.load(fh)
+            if (data['version'] == PATH_INDEX_VERSION
+                    and data['records'] == self._record_filenames()):
+                return data['paths']
+        except (EnvironmentError, ValueError, KeyError, TypeError):
+            pass
+        return None
+
+    def _write_path_index(self):
+        if self._pip_interop_enabled or not self.is_writable:
+            return
+        path_index_path = join(self.prefix_path, 'conda-meta', PATH_INDEX_FILENAME)
+        temp_path = "%s.%s.tmp" % (path_index_path, os.getpid())
+        try:
+            with open(temp_path, 'w') as fh:
+                fh.write(ensure_text_type(json.dumps({
+                    'version': PATH_INDEX_VERSION,
+                    'records': self._record_filenames(),
+                    'paths': self.__path_index,
+                })))
+            if on_win and lexists(path_index_path):
+                os.unlink(path_index_path)
+            os.rename(temp_path, path_index_path)
+        except EnvironmentError as e:
+            # the index is only an optimization
+            log.debug("unable to write path index %s: %r", path_index_path, e)
+
     def _load_single_record(self, prefix_record_json_path):
         log.trace("loading prefix record %s", prefix_record_json_path)
         with open(prefix_record_json_path) as fh:
@@ -360,6 +498,60 @@ class PrefixData(object):
             self.__prefix_records[python_rec.name] = python_rec
 
 
+def _write_prefix_record(prefix_record_json_path, prefix_record):
+    # Compact, and with paths_data dumped directly, as these files are written for every
+    # package linked and can hold tens of thousands of path entries.  The content is the
+    # same as json_dump(prefix_record) gives, so any reader of conda-meta still loads it.
+    log.trace("writing prefix record %s", prefix_record_json_path)
+    paths_data = getattr(prefix_record, 'paths_data', None)
+    if paths_data is None:
+        data = prefix_record.dump()
+    else:
+        # a shallow copy shares every other value, so Entity.dump omits the same defaults
+        record_without_paths = copy(prefix_record)
+        del record_without_paths.__dict__['paths_data']
+        data = record_without_paths.dump()
+        data['paths_data'] = odict((
+            ('paths_version', paths_data.paths_version),
+            ('paths', [_dump_path_data(path_data) for path_data in paths_data.paths]),
+        ))
+    with open(prefix_record_json_path, 'wb') as fh:
+        fh.write(ensure_binary(json.dumps(data, sort_keys=True, separators=(',', ':'),
+                                          cls=EntityEncoder)))
+
+
+_path_data_dump_fields = {}
+
+
+def _dump_path_data(path_data):
+    # Entity.dump(), reading straight from the instance dict rather than going through
+    # each field descriptor; PathData fields are plain values or enums.
+    cls = path_data.__class__
+    fields = _path_data_dump_fields.get(cls)
+    if fields is None:
+        fields = _path_data_dump_fields[cls] = tuple(
+            (field.name, field.default, field.default_in_dump, field.nullable)
+            for field in itervalues(cls.__fields__) if field.in_dump
+        )
+    instance_dict = path_data.__dict__
+    dumped = {}
+    for name, default, default_in_dump, nullable in fields:
+        value = instance_dict.get(name, default)
+        if value is NULL or (value is None and not nullable):
+            continue
+        if value is default and not default_in_dump:
+            continue
+        dumped[name] = value.value if isinstance(value, Enum) else value
+    return dumped
+
+
+def _path_index_key(short_path):
+    key = normpath(short_path)
+    if on_win:
+        key = normcase(key).replace('\\', '/')
+    return key
+
+
 def get_python_version_for_prefix(prefix):
     # returns a string e.g. "2.7", "3.4", "3.5" or None
     py_record_iter = (rcrd for rcrd in PrefixData(prefix).iter_records() if rcrd.name == 'python')
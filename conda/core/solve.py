@@ -4,15 +4,18 @@
 from __future__ import absolute_import, division, print_function, unicode_literals
 
 from genericpath import exists
+from hashlib import md5
+import json
 from logging import DEBUG, getLogger
-from os.path import join
+import os
+from os.path import getmtime, isdir, isfile, join
 import sys
 from textwrap import dedent
 
-from .index import get_reduced_index
+from .index import _supplement_index_with_prefix, check_whitelist, get_reduced_index
 from .link import PrefixSetup, UnlinkLinkTransaction
 from .prefix_data import PrefixData
-from .subdir_data import SubdirData
+from .subdir_data import SubdirData, make_feature_record
 from .. import CondaError, __version__ as CONDA_VERSION
 from .._vendor.auxlib.decorators import memoizedproperty
 from .._vendor.auxlib.ish import dals
@@ -20,14 +23,15 @@ from .._vendor.boltons.setutils import IndexedSet
 from .._vendor.toolz import concat, concatv, groupby
 from ..base.constants import DepsModifier, UNKNOWN_CHANNEL, UpdateModifier
 from ..base.context import context
-from ..common.compat import iteritems, itervalues, odict, text_type
+from ..common.compat import (ensure_binary, ensure_text_type, iteritems, itervalues, odict,
+                             on_win, open, text_type)
 from ..common.constants import NULL
 from ..common.io import Spinner, time_recorder
-from ..common.path import get_major_minor_version, paths_equal
+from ..common.path import expand, get_major_minor_version, paths_equal
 from ..exceptions import PackagesNotFoundError, SpecsConfigurationConflictError
 from ..gateways.logging import TRACE
 from ..history import History
-from ..models.channel import Channel
+from ..models.channel import Channel, all_channel_urls
 from ..models.enums import NoarchType
 from ..models.match_spec import MatchSpec
 from ..models.prefix_graph import PrefixGraph
@@ -36,6 +40,10 @@ from ..resolve import Resolve, dashlist
 
 log = getLogger(__name__)
 
+SOLVE_CACHE_DIR = expand(join('~', '.conda', 'solve_cache'))
+SOLVE_CACHE_VERSION = 1
+SOLVE_CACHE_MAX_ENTRIES = 64
+
 
 class Solver(object):
     """
@@ -223,6 +231,18 @@ class Solver(object):
                 # Return early, with a solution that should just be PrefixData().iter_records()
                 return IndexedSet(PrefixGraph(ssc.solution_precs).graph)
 
+        # a preset index (conda-build back-compat) isn't described by the cache key
+        # the solver's inputs are captured here, since solving with UPDATE_DEPS changes
+        #   self.specs_to_add and ssc.prune
+        solve_cache_key_data = None if self._index else self._solve_cache_key_data(ssc)
+        if solve_cache_key_data:
+            solve_cache_key = self._solve_cache_key(solve_cache_key_data)
+            if solve_cache_key:
+                cached_precs = self._load_cached_solution(ssc, solve_cache_key)
+                if cached_precs is not None:
+                    log.debug("using cached solution for prefix %s", self.prefix)
+                    return cached_precs
+
         with Spinner("Collecting package metadata", not context.verbosity and not context.quiet,
                      context.json):
             ssc = self._collect_all_metadata(ssc)
@@ -244,8 +264,98 @@ class Solver(object):
                   "    %s\n",
                   self.prefix, "\n    ".join(prec.dist_str() for prec in ssc.solution_precs))
 
+        if solve_cache_key_data:
+            # the repodata stamps are taken again, since collecting metadata may have
+            #   refreshed repodata
+            solve_cache_key = self._solve_cache_key(solve_cache_key_data)
+            if solve_cache_key:
+                _write_solve_cache(solve_cache_key, ssc.solution_precs)
+
         return ssc.solution_precs
 
+    def _solve_cache_key_data(self, ssc):
+        """Return every input of the solve but repodata, or None if it can't be cached."""
+        if not context.solve_cache_enabled:
+            return None
+        if context.offline or ('unknown' in context._argparse_args
+                               and context._argparse_args.unknown):
+            # the index is supplemented with the package cache
+            return None
+        return {
+            'version': SOLVE_CACHE_VERSION,
+            'conda_version': CONDA_VERSION,
+            'prefix': self.prefix,
+            'specs_to_add': sorted(text_type(spec) for spec in self.specs_to_add),
+            'specs_to_remove': sorted(text_type(spec) for spec in self.specs_to_remove),
+            'update_modifier': text_type(ssc.update_modifier),
+            'deps_modifier': text_type(ssc.deps_modifier),
+            'prune': ssc.prune,
+            'ignore_pinned': ssc.ignore_pinned,
+            'force_remove': ssc.force_remove,
+            'pinned_specs': sorted(text_type(spec) for spec in ssc.pinned_specs),
+            'history_specs': sorted(text_type(spec)
+                                    for spec in itervalues(ssc.specs_from_history_map)),
+            'prefix_records': sorted(prec.dist_str() for prec in ssc.prefix_data.iter_records()),
+            'context': [
+                text_type(context.channel_priority),
+                context.strict_channel_priority,
+                sorted(context.track_features),
+                context.add_pip_as_python_dependency,
+                sorted(text_type(spec) for spec in context.aggressive_update_packages),
+                context.auto_update_conda,
+                context.featureless_minimization_disabled_feature_flag,
+                context.root_prefix,
+                context.conda_prefix,
+                sorted(context.whitelist_channels),
+            ],
+        }
+
+    def _solve_cache_key(self, key_data):
+        """Return a key over key_data and the repodata, or None if it can't be cached.
+
+        Repodata is represented by the ``_etag`` and ``_mod`` of each subdir, so a solve is
+        only cacheable while every subdir would be served from an unexpired local cache.
+        """
+        subdir_stamps = []
+        for sd in self._solve_cache_subdir_datas():
+            mod_etag = sd.cached_mod_etag()
+            if mod_etag is None:
+                return None
+            subdir_stamps.append((sd.url_w_subdir, mod_etag))
+        key_data = dict(key_data, subdirs=subdir_stamps)
+        return md5(ensure_binary(json.dumps(key_data, sort_keys=True))).hexdigest()
+
+    def _load_cached_solution(self, ssc, solve_cache_key):
+        # Every stored record is looked up again in the current repodata or prefix, so a
+        # hit returns the same objects the index would have, and anything gone is a miss.
+        entries = _read_solve_cache(solve_cache_key)
+        if entries is None:
+            return None
+        subdir_datas = {sd.url_w_subdir: sd for sd in self._solve_cache_subdir_datas()}
+        # get_reduced_index() isn't reached on a hit, so its whitelist check is done here
+        check_whitelist(subdir_datas)
+        index = {}
+        wanted = []
+        for entry in entries:
+            name = entry['name']
+            if name.endswith('@'):
+                prec = make_feature_record(name[:-1])
+                index[prec] = prec
+                wanted.append(prec)
+                continue
+            sd = subdir_datas.get(entry['channel'])
+            prec = sd and next((prec for prec in sd.query(name)
+                                if _solve_cache_entry(prec) == entry), None)
+            if prec is None:
+                prec = ssc.prefix_data.get(name, None)
+                if prec is None or _solve_cache_entry(prec, entry['channel']) != entry:
+                    return None
+            else:
+                index[prec] = prec
+            wanted.append(prec)
+        _supplement_index_with_prefix(index, self.prefix)
+        return IndexedSet(index[prec] for prec in wanted)
+
     def _collect_all_metadata(self, ssc):
         if ssc.prune:  # or update_modifier == UpdateModifier.UPDATE_ALL  # pending conda/constructor#138  # NOQA
             # Users are struggling with the prune functionality in --update-all, due to
@@ -648,14 +758,7 @@ class Solver(object):
             #  is given by PrefixData(self.prefix).all_subdir_urls().  However that causes
             #  usability problems with bad / expired tokens.
 
-            additional_channels = set()
-            for spec in self.specs_to_add:
-                # TODO: correct handling for subdir isn't yet done
-                channel = spec.get_exact_value('channel')
-                if channel:
-                    additional_channels.add(Channel(channel))
-
-            self.channels.update(additional_channels)
+            self.channels.update(self._additional_channels())
             reduced_index = get_reduced_index(self.prefix, self.channels,
                                               self.subdirs, prepared_specs)
             self._prepared_specs = prepared_specs
@@ -665,6 +768,20 @@ class Solver(object):
         self._prepared = True
         return self._index, self._r
 
+    def _solve_cache_subdir_datas(self):
+        channels = IndexedSet(concatv(self.channels, self._additional_channels()))
+        return tuple(SubdirData(Channel(url))
+                     for url in all_channel_urls(channels, subdirs=self.subdirs))
+
+    def _additional_channels(self):
+        additional_channels = set()
+        for spec in self.specs_to_add:
+            # TODO: correct handling for subdir isn't yet done
+            channel = spec.get_exact_value('channel')
+            if channel:
+                additional_channels.add(Channel(channel))
+        return additional_channels
+
     def _check_solution(self, ssc):
         # Ensure that solution is consistent with pinned specs.
         for spec in ssc.pinned_specs:
@@ -749,6 +866,60 @@ class SolverStateContainer(object):
         self.final_environment_specs = None
 
 
+def _solve_cache_path(solve_cache_key):
+    return join(SOLVE_CACHE_DIR, solve_cache_key + '.json')
+
+
+def _solve_cache_entry(prec, channel_url=None):
+    if channel_url is None and prec.channel.subdir:
+        channel_url = prec.channel.url(with_credentials=False)
+    return {
+        'channel': channel_url,
+        'name': prec.name,
+        'version': prec.version,
+        'build': prec.build,
+        'build_number': prec.build_number,
+    }
+
+
+def _read_solve_cache(solve_cache_key):
+    try:
+        with open(_solve_cache_path(solve_cache_key)) as fh:
+            data = json.load(fh)
+        if data['version'] == SOLVE_CACHE_VERSION and data['key'] == solve_cache_key:
+            return data['records']
+    except (EnvironmentError, ValueError, KeyError, TypeError):
+        pass
+    return None
+
+
+def _write_solve_cache(solve_cache_key, solution_precs):
+    cache_path = _solve_cache_path(solve_cache_key)
+    temp_path = "%s.%s.tmp" % (cache_path, os.getpid())
+    try:
+        if not isdir(SOLVE_CACHE_DIR):
+            os.makedirs(SOLVE_CACHE_DIR)
+        with open(temp_path, 'w') as fh:
+            fh.write(ensure_text_type(json.dumps({
+                'version': SOLVE_CACHE_VERSION,
+                'key': solve_cache_key,
+                'records': [_solve_cache_entry(prec) for prec in solution_precs],
+            })))
+        if on_win and isfile(cache_path):
+            os.unlink(cache_path)
+        os.rename(temp_path, cache_path)
+
+        cache_files = [join(SOLVE_CACHE_DIR, fn) for fn in os.listdir(SOLVE_CACHE_DIR)
+                       if fn.endswith('.json')]
+        if len(cache_files) > SOLVE_CACHE_MAX_ENTRIES:
+            cache_files.sort(key=getmtime, reverse=True)
+            for path in cache_files[SOLVE_CACHE_MAX_ENTRIES:]:
+                os.unlink(path)
+    except EnvironmentError as e:
+        # the cache is only an optimization
+        log.debug("unable to write solve cache %s: %r", cache_path, e)
+
+
 def get_pinned_specs(prefix):
     """Find pinned specs from file and return a tuple of MatchSpec."""
     pinfile = join(prefix, 'conda-meta', 'pinned')
@@ -166,6 +166,31 @@ class SubdirData(object):
             self.load()
         return iter(self._package_records)
 
+    def cached_mod_etag(self):
+        """Return the ``(_etag, _mod)`` of the repodata :meth:`load` would use, or None.
+
+        None means the state can't be known without loading: the local cache is missing or
+        expired, the channel is a file:// channel (always re-read), or the repodata carries
+        neither header.
+        """
+        if self.url_w_subdir.startswith('file://'):
+            return None
+        if self._loaded:
+            mod_etag_headers = self._internal_state
+        else:
+            try:
+                mtime = getmtime(self.cache_path_json)
+            except (IOError, OSError):
+                return None
+            mod_etag_headers = read_mod_and_etag(self.cache_path_json)
+            if not (context.use_index_cache or context.offline
+                    or mtime + _repodata_max_age(mod_etag_headers) - time() > 0):
+                return None
+        etag, mod = mod_etag_headers.get('_etag'), mod_etag_headers.get('_mod')
+        if not (etag or mod):
+            return None
+        return etag, mod
+
     def _load(self):
         try:
             mtime = getmtime(self.cache_path_json)
@@ -193,14 +218,7 @@ class SubdirData(object):
                                                            mod_etag_headers.get('_mod'))
                 return _internal_state
 
-            if context.local_repodata_ttl > 1:
-                max_age = context.local_repodata_ttl
-            elif context.local_repodata_ttl == 1:
-                max_age = get_cache_control_max_age(mod_etag_headers.get('_cache_control', ''))
-            else:
-                max_age = 0
-
-            timeout = mtime + max_age - time()
+            timeout = mtime + _repodata_max_age(mod_etag_headers) - time()
             if (timeout > 0 or context.offline) and not self.url_w_subdir.startswith('file://'):
                 log.debug("Using cached repodata for %s at %s. Timeout in %d sec",
                           self.url_w_subdir, self.cache_path_json, timeout)
@@ -393,6 +411,15 @@ def read_mod_and_etag(path):
             raise
 
 
+def _repodata_max_age(mod_etag_headers):
+    if context.local_repodata_ttl > 1:
+        return context.local_repodata_ttl
+    elif context.local_repodata_ttl == 1:
+        return get_cache_control_max_age(mod_etag_headers.get('_cache_control') or '')
+    else:
+        return 0
+
+
 def get_cache_control_max_age(cache_control_value):
     max_age = re.search(r"max-age=(\d+)", cache_control_value)
     return int(max_age.groups()[0]) if max_age else 0
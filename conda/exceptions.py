@@ -14,7 +14,6 @@ from textwrap import dedent
 from traceback import format_exception, format_exception_only
 
 from . import CondaError, CondaExitZero, CondaMultiError, text_type
-from ._vendor.auxlib.entity import EntityEncoder
 from ._vendor.auxlib.ish import dals
 from ._vendor.auxlib.type_coercion import boolify
 from ._vendor.toolz import groupby
@@ -929,6 +928,7 @@ def print_conda_exception(exc_val, exc_tb=None):
             or (not isinstance(exc_val, DryRunExit) and context.verbosity > 0)):
         print(_format_exc(exc_val, exc_tb), file=sys.stderr)
     elif context.json:
+        from ._vendor.auxlib.entity import EntityEncoder
         logger = getLogger('conda.stdout' if exc_val.return_code else 'conda.stderr')
         exc_json = json.dumps(exc_val.dump_map(), indent=2, sort_keys=True, cls=EntityEncoder)
         logger.info("%s\n" % exc_json)
@@ -1179,6 +1179,7 @@ class ExceptionHandler(object):
         return do_upload, ask_response
 
     def _execute_upload(self, error_report):
+        from ._vendor.auxlib.entity import EntityEncoder
         headers = {
             'User-Agent': self.user_agent,
         }
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2012 Anaconda, Inc
+# SPDX-License-Identifier: BSD-3-Clause
+"""
+Disk cache for the output of ``conda shell.<shell> activate``.
+
+Looking an activation up must stay cheap enough to run before ``conda.base.context`` is
+imported, so this module only depends on the standard library, ``conda.base.constants`` and
+``conda.common.compat``.
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+from hashlib import md5
+import json
+import os
+from os.path import abspath, expanduser, expandvars, isdir, join
+import re
+import sys
+from tempfile import NamedTemporaryFile
+
+from ..base.constants import SEARCH_PATH
+from ..common.compat import ensure_binary, iteritems
+
+ACTIVATE_CACHE_DIR = abspath(expanduser(join('~', '.conda', 'activate_cache')))
+ACTIVATE_CACHE_VERSION = 1
+ACTIVATE_CACHE_MAX_ENTRIES = 8
+
+# environment variables the activators read, beyond the CONDA_* namespace
+_KEY_ENV_VARS = ('PATH', 'PS1', 'prompt', 'HOME')
+
+
+class ActivationCache(object):
+    """Generated activate scripts, one file per (shell, arguments) pair.
+
+    An entry is found by a key over everything the activator reads from the process
+    environment (PATH, CONDA_SHLVL, CONDA_PREFIX_N, prompt variables, ...) and is only
+    served while the stat of every file it depends on is unchanged: the condarc search
+    path, the target env's conda-meta and activate.d, and the deactivate.d of the env
+    being replaced.
+    """
+
+    def __init__(self, shell, arguments, environ=None):
+        self.shell = shell
+        self.arguments = tuple(arguments)
+        self.environ = os.environ if environ is None else environ
+        self.cache_path = join(ACTIVATE_CACHE_DIR, md5(ensure_binary(
+            '\0'.join((shell,) + self.arguments)
+        )).hexdigest()[:16] + '.json')
+
+    def load(self):
+        """Return the activate output, or None on a cache miss.
+
+        For shells that source a temp file, the script is written to a new temp file and
+        its path is returned, matching ``_Activator._finalize``.
+        """
+        key = self._key()
+        for entry in self._read_entries():
+            if entry['key'] != key:
+                continue
+            if not all(_stamp(path) == stamp for path, stamp in entry['stamps']):
+                return None
+            script, ext = entry['script'], entry['tempfile_extension']
+            if ext is None:
+                return script
+            with NamedTemporaryFile('w+b', suffix=ext, delete=False) as tf:
+                tf.write(ensure_binary(script))
+            return tf.name
+        return None
+
+    def save(self, script, tempfile_extension, dependency_paths):
+        key = self._key()
+        stamps = dependency_stamps(condarc_search_path() + list(dependency_paths))
+        entries = [entry for entry in self._read_entries() if entry['key'] != key]
+        entries.insert(0, {
+            'key': key,
+            'stamps': stamps,
+            'script': script,
+            'tempfile_extension': tempfile_extension,
+        })
+        try:
+            if not isdir(ACTIVATE_CACHE_DIR):
+                os.makedirs(ACTIVATE_CACHE_DIR)
+            with open(self.cache_path, 'w') as fh:
+                json.dump({
+                    'version': ACTIVATE_CACHE_VERSION,
+                    'entries': entries[:ACTIVATE_CACHE_MAX_ENTRIES],
+                }, fh)
+        except EnvironmentError:
+            # the cache is only an optimization
+            pass
+
+    def _read_entries(self):
+        try:
+            with open(self.cache_path) as fh:
+                data = json.load(fh)
+            if data['version'] == ACTIVATE_CACHE_VERSION:
+                return data['entries']
+        except (EnvironmentError, ValueError, KeyError, TypeError):
+            pass
+        return []
+
+    def _key(self):
+        key_data = {
+            'shell': self.shell,
+            'arguments': self.arguments,
+            'sys_executable': sys.executable,
+            'environ': sorted((k, v) for k, v in iteritems(self.environ)
+                              if k.startswith('CONDA_') or k in _KEY_ENV_VARS),
+            # e.g. $CONDARC; stamps are only checked for the files of the matching entry
+            'search_path': condarc_search_path(),
+        }
+        if any(re.search(r'\\|/', arg) for arg in self.arguments):
+            # relative prefixes are resolved against the working directory
+            key_data['cwd'] = os.getcwd()
+        return key_digest(key_data)
+
+
+def condarc_search_path():
+    # the condarc files and directories conda reads, with environment variables expanded
+    return [abspath(expanduser(expandvars(path))) for path in SEARCH_PATH]
+
+
+def dependency_stamps(paths):
+    # [path, stamp] for each of paths, and for each file in those that are directories
+    stamps = []
+    for path in paths:
+        stamps.append([path, _stamp(path)])
+        if isdir(path):
+            stamps.extend([join(path, fn), _stamp(join(path, fn))]
+                          for fn in sorted(os.listdir(path)))
+    return stamps
+
+
+def key_digest(key_data):
+    return md5(ensure_binary(json.dumps(key_data, sort_keys=True))).hexdigest()
+
+
+def _stamp(path):
+    try:
+        st = os.stat(path)
+    except EnvironmentError:
+        return None
+    return [st.st_size, st.st_mtime]
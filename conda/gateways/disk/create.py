@@ -3,8 +3,12 @@
 # SPDX-License-Identifier: BSD-3-Clause
 from __future__ import absolute_import, division, print_function, unicode_literals
 
-from errno import EACCES, ELOOP, EPERM
+import bz2
+from errno import EACCES, ELOOP, EOPNOTSUPP, EPERM
+from functools import partial
+import hashlib
 from io import open
+import json
 from logging import getLogger
 import os
 from os.path import basename, dirname, isdir, isfile, join, splitext
@@ -22,7 +26,7 @@ from ... import CondaError
 from ..._vendor.auxlib.ish import dals
 from ...base.constants import PACKAGE_CACHE_MAGIC_FILE
 from ...base.context import context
-from ...common.compat import ensure_binary, on_win
+from ...common.compat import PY3, ensure_binary, iteritems, on_win
 from ...common.path import ensure_pad, expand, win_path_double_escape, win_path_ok
 from ...common.serialize import json_dump
 from ...exceptions import (BasicClobberError, CaseInsensitiveFileSystemError, CondaOSError,
@@ -32,6 +36,9 @@ from ...models.enums import FileMode, LinkType
 log = getLogger(__name__)
 stdoutlog = getLogger('conda.stdoutlog')
 
+# _IOW(0x94, 9, int) from linux/fs.h; clones all extents of one file into another
+FICLONE = 0x40049409
+
 # in __init__.py to help with circular imports
 mkdir_p = mkdir_p
 
@@ -157,7 +164,116 @@ class ProgressFileWrapper(object):
         self.progress_update_callback(rel_pos)
 
 
+class Md5FileWrapper(object):
+    # md5s a file through the reads made of it; tarfile seeks back and reads the head again
+    #   while detecting the compression, so only bytes past what's been hashed are added
+    def __init__(self, fileobj):
+        self.md5_file = fileobj
+        self.md5_hash = hashlib.md5()
+        self.md5_pos = 0
+
+    def __getattr__(self, name):
+        return getattr(self.md5_file, name)
+
+    def __setattr__(self, name, value):
+        if name.startswith("md5_"):
+            super(Md5FileWrapper, self).__setattr__(name, value)
+        else:
+            setattr(self.md5_file, name, value)
+
+    def read(self, size=-1):
+        pos = self.md5_file.tell()
+        data = self.md5_file.read(size)
+        end = pos + len(data)
+        if pos <= self.md5_pos < end:
+            self.md5_hash.update(data[self.md5_pos - pos:])
+            self.md5_pos = end
+        return data
+
+    def hexdigest(self):
+        # hashes whatever hasn't been read yet, e.g. the padding after the end-of-archive marker
+        self.md5_file.seek(self.md5_pos)
+        for chunk in iter(partial(self.md5_file.read, 1 << 18), b''):
+            self.md5_hash.update(chunk)
+            self.md5_pos += len(chunk)
+        return self.md5_hash.hexdigest()
+
+
+class _DigestingTarFile(tarfile.TarFile):
+    # records the sha256, size and (st_dev, st_ino) of every regular file member as it's
+    #   written out, keyed by its path within the package
+    member_digests = None
+
+    def makefile(self, tarinfo, targetpath):
+        if tarinfo.issparse():
+            return super(_DigestingTarFile, self).makefile(tarinfo, targetpath)
+        source = self.fileobj
+        source.seek(tarinfo.offset_data)
+        sha256 = hashlib.sha256()
+        remaining = tarinfo.size
+        with open(targetpath, 'wb') as target:
+            while remaining:
+                chunk = source.read(min(remaining, 1 << 18))
+                if not chunk:
+                    raise tarfile.ReadError("unexpected end of data")
+                sha256.update(chunk)
+                target.write(chunk)
+                remaining -= len(chunk)
+            st = os.fstat(target.fileno())
+        name = tarinfo.name[2:] if tarinfo.name.startswith('./') else tarinfo.name
+        self.member_digests[name] = (sha256.hexdigest(), tarinfo.size, (st.st_dev, st.st_ino))
+
+
+class _MultiStreamBZ2Reader(object):
+    # Python 2's bz2 module stops decompressing at the end of the first stream, so a
+    #   multi-stream bzip2 file (as written by pbzip2 or `conda package --compress-threads`)
+    #   is decompressed through this instead, one stream after the other
+    def __init__(self, fileobj):
+        self._fileobj = fileobj
+        self._decompressor = bz2.BZ2Decompressor()
+        self._buffer = b''
+        self._offset = 0
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) - self._offset < size:
+            data = self._fileobj.read(1 << 18)
+            if not data:
+                break
+            chunks = [self._buffer[self._offset:]]
+            while data:
+                try:
+                    chunks.append(self._decompressor.decompress(data))
+                except EOFError:
+                    # the last stream ended exactly at the end of the previous read
+                    self._decompressor = bz2.BZ2Decompressor()
+                    continue
+                data = self._decompressor.unused_data
+                if data:
+                    self._decompressor = bz2.BZ2Decompressor()
+            self._buffer = b''.join(chunks)
+            self._offset = 0
+        end = len(self._buffer) if size < 0 else min(self._offset + size, len(self._buffer))
+        data = self._buffer[self._offset:end]
+        self._offset = end
+        return data
+
+
+def _open_tarball(fileobj):
+    if not PY3:
+        magic = fileobj.read(3)
+        fileobj.seek(0)
+        if magic == b'BZh':
+            # read as a stream; the members of a package are extracted in order
+            return _DigestingTarFile.open(fileobj=_MultiStreamBZ2Reader(fileobj), mode='r|')
+    return _DigestingTarFile.open(fileobj=fileobj)
+
+
 def extract_tarball(tarball_full_path, destination_directory=None, progress_update_callback=None):
+    """Extract a package tarball, reading it only once.
+
+    Returns a tuple of the tarball's md5 and a dict mapping the short path of each extracted
+    regular file to its (sha256, size, (st_dev, st_ino)).
+    """
     if destination_directory is None:
         destination_directory = tarball_full_path[:-8]
     log.debug("extracting %s\n  to %s", tarball_full_path, destination_directory)
@@ -165,9 +281,11 @@ def extract_tarball(tarball_full_path, destination_directory=None, progress_upda
     assert not lexists(destination_directory), destination_directory
 
     with open(tarball_full_path, 'rb') as fileobj:
+        fileobj = md5_fileobj = Md5FileWrapper(fileobj)
         if progress_update_callback:
             fileobj = ProgressFileWrapper(fileobj, progress_update_callback)
-        with tarfile.open(fileobj=fileobj) as tar_file:
+        with _open_tarball(fileobj) as tar_file:
+            tar_file.member_digests = member_digests = {}
             try:
                 tar_file.extractall(path=destination_directory)
             except EnvironmentError as e:
@@ -179,6 +297,7 @@ def extract_tarball(tarball_full_path, destination_directory=None, progress_upda
                     )
                 else:
                     raise
+        tarball_md5 = md5_fileobj.hexdigest()
 
     if sys.platform.startswith('linux') and os.getuid() == 0:
         # When extracting as root, tarfile will by restore ownership
@@ -189,6 +308,38 @@ def extract_tarball(tarball_full_path, destination_directory=None, progress_upda
                 p = join(root, fn)
                 os.lchown(p, 0, 0)
 
+    return tarball_md5, member_digests
+
+
+def write_extract_manifest(extracted_package_directory, tarball_full_path, tarball_md5,
+                           member_digests):
+    """Write info/extract_manifest.json, recording the digests taken while extracting.
+
+    Size and mtime are kept for the tarball and each file, so that anything modified after
+    extraction is detected and hashed again.  Files that already changed since extraction, or
+    were replaced by another inode (e.g. a link into the content store), are left out.
+    """
+    paths = {}
+    for short_path, (sha256, size, inode) in iteritems(member_digests):
+        try:
+            st = os.lstat(join(extracted_package_directory, win_path_ok(short_path)))
+        except EnvironmentError:
+            continue
+        if st.st_size == size and (st.st_dev, st.st_ino) == inode:
+            paths[short_path] = {'sha256': sha256, 'size': size, 'mtime': st.st_mtime}
+    manifest_path = join(extracted_package_directory, 'info', 'extract_manifest.json')
+    try:
+        st = os.stat(tarball_full_path)
+        with open(manifest_path, 'wb') as fo:
+            fo.write(ensure_binary(json.dumps({
+                'extract_manifest_version': 1,
+                'tarball': {'md5': tarball_md5, 'size': st.st_size, 'mtime': st.st_mtime},
+                'paths': paths,
+            }, separators=(',', ':'))))
+    except EnvironmentError as e:
+        # the manifest is only an optimization
+        log.debug("unable to write %s\n%r", manifest_path, e)
+
 
 def make_menu(prefix, file_path, remove=False):
     """
@@ -293,6 +444,41 @@ def _do_copy(src, dst):
         log.debug('%r', e)
 
 
+def reflink(src, dst):
+    # on unix, make sure relative symlinks stay symlinks, same as copy()
+    if not on_win and islink(src):
+        copy(src, dst)
+        return
+    try:
+        _do_reflink(src, dst)
+    except (IOError, OSError) as e:
+        log.trace("reflink failed. falling back to copy\n"
+                  "  error: %r\n"
+                  "  src: %s\n"
+                  "  dst: %s", e, src, dst)
+        if lexists(dst):
+            rm_rf(dst)
+        _do_copy(src, dst)
+
+
+def _do_reflink(src, dst):
+    # Shares the data extents of src with dst on filesystems supporting copy-on-write clones
+    #   (btrfs, XFS with reflink=1, ...). The ioctl fails with EOPNOTSUPP, EXDEV or EINVAL
+    #   otherwise.
+    if not sys.platform.startswith('linux'):
+        raise OSError(EOPNOTSUPP, "reflink not supported on %s" % sys.platform)
+    import fcntl
+    log.trace("reflinking %s => %s", src, dst)
+    with open(src, 'rb') as fsrc:
+        with open(dst, 'wb') as fdst:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+
+    try:
+        copystat(src, dst)
+    except (IOError, OSError) as e:  # pragma: no cover
+        log.debug('%r', e)
+
+
 def create_link(src, dst, link_type=LinkType.hardlink, force=False):
     if link_type == LinkType.directory:
         # A directory is technically not a link.  So link_type is a misnomer.
@@ -332,6 +518,8 @@ def create_link(src, dst, link_type=LinkType.hardlink, force=False):
         _do_softlink(src, dst)
     elif link_type == LinkType.copy:
         copy(src, dst)
+    elif link_type == LinkType.reflink:
+        reflink(src, dst)
     else:
         raise CondaError("Did not expect linktype=%r" % link_type)
 
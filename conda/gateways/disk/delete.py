@@ -5,19 +5,26 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 
 from errno import ENOENT
 from logging import getLogger
-from os import listdir, removedirs, rename, unlink, walk
-from os.path import abspath, dirname, isdir, join
+from os import listdir, removedirs, rename, rmdir, unlink, walk
+from os.path import abspath, basename, dirname, isdir, join
 from shutil import rmtree as shutil_rmtree
 from uuid import uuid4
 
 from . import MAX_TRIES, exp_backoff_fn
 from .link import islink, lexists
 from .permissions import make_writable, recursive_make_writable
+from ... import CondaError
 from ...base.context import context
 from ...common.compat import PY2, on_win, text_type, ensure_binary
+from ...common.io import ThreadLimitedThreadPoolExecutor
 
 log = getLogger(__name__)
 
+# the number of threads used to unlink files in bulk deletion
+RM_RF_MAX_WORKERS = 8
+# the number of files handed to a bulk deletion thread at a time
+RM_RF_CHUNK_SIZE = 256
+
 
 def rm_rf(path, max_retries=5, trash=True):
     """
@@ -56,6 +63,103 @@ def rm_rf(path, max_retries=5, trash=True):
             return False
 
 
+def bulk_rm_rf(paths, defer=False):
+    """
+    Completely delete many paths, each possibly a large directory tree, as fast as possible.
+
+    Each path is first renamed into the trash directory, so it disappears from its original
+    location immediately and atomically. The trash entries are then deleted together, with
+    files unlinked on a bounded thread pool.  If defer is True, the trash entries are left in
+    place to be cleaned up by `delete_trash()` on the next conda invocation.
+
+    Returns True if all paths were removed from their original location.
+    """
+    paths = tuple(abspath(path) for path in paths)
+    to_remove = []
+    for path in paths:
+        if not lexists(path):
+            continue
+        if not isdir(path) or islink(path):
+            rm_rf(path)
+            continue
+        trash_path, in_trash_dir = _rename_to_trash(path)
+        if defer and in_trash_dir:
+            continue
+        # if the rename failed, still delete in bulk from the original location
+        to_remove.append(trash_path or path)
+
+    if to_remove:
+        _rmtree_parallel(to_remove)
+        for path in to_remove:
+            if lexists(path):
+                rm_rf(path, trash=False)
+    return not any(lexists(path) for path in paths)
+
+
+def _rename_to_trash(path):
+    # The trash directory lives in the first writable package cache, which may be on another
+    # filesystem. In that case, fall back to a hidden sibling of path, which is still removed
+    # atomically from the original location, but which delete_trash() won't find.
+    # Returns a tuple of the new path (or None) and whether it's in the trash directory.
+    try:
+        trash_dir = context.trash_dir
+    except CondaError as e:
+        log.trace("No trash directory available.\n%r", e)
+        trash_dir = None
+    trash_paths = (
+        (join(trash_dir, text_type(uuid4())), True) if trash_dir else None,
+        (join(dirname(path), '.%s.%s.c~' % (basename(path), text_type(uuid4())[:8])), False),
+    )
+    for trash_path, in_trash_dir in filter(None, trash_paths):
+        try:
+            rename(path, trash_path)
+        except (IOError, OSError) as e:
+            log.trace("Could not move %s to %s.\n%r", path, trash_path, e)
+        else:
+            log.trace("Moved to trash: %s => %s", path, trash_path)
+            return trash_path, in_trash_dir
+    return None, False
+
+
+def _rmtree_parallel(dirpaths, max_workers=RM_RF_MAX_WORKERS):
+    # Unlinking is bound by syscall latency rather than CPU, so files are removed from
+    #   several threads at once. Directories are then removed deepest-first on the calling
+    #   thread. Anything that can't be removed here is left for rm_rf() and its retry logic.
+    files = []
+    dirs = []
+    for dirpath in dirpaths:
+        dirs.append(dirpath)
+        for root, dirnames, filenames in walk(dirpath):
+            files.extend(join(root, fn) for fn in filenames)
+            for dn in dirnames:
+                path = join(root, dn)
+                # symlinks to directories are listed, but not followed, by walk()
+                (files if islink(path) else dirs).append(path)
+
+    def _unlink_all(chunk):
+        for path in chunk:
+            try:
+                unlink(path)
+            except (IOError, OSError):
+                try:
+                    backoff_unlink(path, max_tries=1)
+                except (IOError, OSError) as e:
+                    log.trace("Could not unlink %s\n%r", path, e)
+
+    log.trace("bulk removing %d files in %d directories", len(files), len(dirs))
+    with ThreadLimitedThreadPoolExecutor(max_workers) as executor:
+        futures = tuple(executor.submit(_unlink_all, files[q:q + RM_RF_CHUNK_SIZE])
+                        for q in range(0, len(files), RM_RF_CHUNK_SIZE))
+        for future in futures:
+            future.result()
+
+    for path in reversed(dirs):
+        try:
+            rmdir(path)
+        except (IOError, OSError) as e:
+            log.trace("Could not remove directory %s\n%r", path, e)
+
+
 def delete_trash(prefix=None):
     for pkg_dir in context.pkgs_dirs:
         trash_dir = join(pkg_dir, '.trash')
@@ -63,10 +167,15 @@ def delete_trash(prefix=None):
             log.trace("Trash directory %s doesn't exist. Moving on.", trash_dir)
             continue
         log.trace("removing trash for %s", trash_dir)
-        for p in listdir(trash_dir):
-            path = join(trash_dir, p)
+        paths = [join(trash_dir, p) for p in listdir(trash_dir)]
+        trash_dirs = [path for path in paths if isdir(path) and not islink(path)]
+        if trash_dirs:
+            _rmtree_parallel(trash_dirs)
+        for path in paths:
+            if not lexists(path):
+                continue
             try:
-                if isdir(path):
+                if isdir(path) and not islink(path):
                     backoff_rmdir(path, max_tries=1)
                 else:
                     backoff_unlink(path, max_tries=1)
@@ -173,7 +282,6 @@ else:  # pragma: no cover
     from ctypes import (Structure, byref, WinDLL, c_int, c_ubyte, c_ssize_t, _SimpleCData,
                         cast, sizeof, WinError, POINTER as _POINTER)
     from ctypes.wintypes import DWORD, INT, LPWSTR, LONG, WORD, BYTE
-    from os import rmdir
     import sys
 
     if PY2:
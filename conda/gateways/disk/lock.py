@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2012 Anaconda, Inc
+# SPDX-License-Identifier: BSD-3-Clause
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+from contextlib import contextmanager
+from errno import EACCES, EAGAIN, EWOULDBLOCK
+from logging import getLogger
+from os.path import dirname
+
+from . import mkdir_p
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+log = getLogger(__name__)
+
+
+@contextmanager
+def advisory_lock(lock_path):
+    """Hold an exclusive fcntl advisory lock on lock_path, waiting while another holds it.
+
+    Locks are taken per open file, so they exclude other threads of this process as well
+    as other processes. Where fcntl is unavailable, or the lock file can't be created or
+    locked (read-only or network filesystems), the block runs unlocked.
+
+    Yields True if the lock was held by someone else and had to be waited on.
+    """
+    fh = None
+    waited = False
+    if fcntl is not None:
+        try:
+            mkdir_p(dirname(lock_path))
+            fh = open(lock_path, 'a')
+            try:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except (IOError, OSError) as e:
+                if e.errno not in (EACCES, EAGAIN, EWOULDBLOCK):
+                    raise
+                log.info("waiting for another conda process to release %s", lock_path)
+                fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+                waited = True
+        except (IOError, OSError) as e:
+            log.debug("proceeding without lock %s: %r", lock_path, e)
+            if fh is not None:
+                fh.close()
+                fh = None
+    try:
+        yield waited
+    finally:
+        if fh is not None:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+            fh.close()
@@ -12,6 +12,7 @@ import hashlib
 from itertools import chain
 import json
 from logging import getLogger
+import os
 from os import listdir
 from os.path import isdir, isfile, join
 import shlex
@@ -123,6 +124,52 @@ def read_repodata_json(extracted_package_directory):
         return json.load(fi)
 
 
+def read_prefix_offsets(extracted_package_directory):
+    # sidecar written at extract time by conda.core.portability.record_placeholder_offsets
+    # returns an empty dict if the file is missing, unreadable, or of an unknown version
+    prefix_offsets_path = join(extracted_package_directory, 'info', 'prefix_offsets.json')
+    try:
+        with open(prefix_offsets_path) as fi:
+            data = json.load(fi)
+    except (IOError, OSError, ValueError) as e:
+        log.trace("no usable prefix offsets at %s: %r", prefix_offsets_path, e)
+        return {}
+    if data.get('prefix_offsets_version') != 1:
+        return {}
+    return data.get('paths') or {}
+
+
+def read_extract_manifest(extracted_package_directory):
+    # sidecar written at extract time by conda.gateways.disk.create.write_extract_manifest
+    # returns an empty dict if the file is missing, unreadable, or of an unknown version
+    manifest_path = join(extracted_package_directory, 'info', 'extract_manifest.json')
+    try:
+        with open(manifest_path) as fi:
+            data = json.load(fi)
+    except (IOError, OSError, ValueError) as e:
+        log.trace("no usable extract manifest at %s: %r", manifest_path, e)
+        return {}
+    if data.get('extract_manifest_version') != 1:
+        return {}
+    return data
+
+
+def get_recorded_digest(entry, full_path, digest_key='sha256'):
+    # entry is a record from the extract_manifest.json sidecar, of the file at full_path
+    # returns None, signaling the file must be hashed again, if the entry is missing or no
+    #   longer current
+    if not entry:
+        return None
+    try:
+        st = os.stat(full_path)
+    except EnvironmentError:
+        return None
+    if st.st_size != entry.get('size') or st.st_mtime != entry.get('mtime'):
+        log.debug("recorded %s for %s is stale", digest_key, full_path)
+        return None
+    return entry.get(digest_key)
+
+
 def read_icondata(extracted_package_directory):
     icon_file_path = join(extracted_package_directory, 'info', 'icon.png')
     if isfile(icon_file_path):
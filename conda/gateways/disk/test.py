@@ -8,7 +8,7 @@ from os import W_OK, access
 from os.path import basename, dirname, isdir, isfile, join
 from uuid import uuid4
 
-from .create import create_link
+from .create import _do_reflink, create_link
 from .delete import rm_rf
 from .link import islink, lexists
 from ..._vendor.auxlib.decorators import memoize
@@ -83,5 +83,25 @@ def softlink_supported(source_file, dest_dir):
         rm_rf(test_path)
 
 
+@memoize
+def reflink_supported(source_file, dest_dir):
+    # Copy-on-write clones need both paths on the same filesystem, and that filesystem has to
+    # support them. Unlike hardlink_supported, a failed attempt falls back to a full copy in
+    # create_link, so the test file is cloned directly here.
+    log.trace("checking reflink capability for %s => %s", source_file, dest_dir)
+    test_file = join(dest_dir, '.tmp.%s.%s' % (basename(source_file), text_type(uuid4())[:8]))
+    assert isfile(source_file), source_file
+    assert isdir(dest_dir), dest_dir
+    try:
+        _do_reflink(source_file, test_file)
+        log.trace("reflink supported for %s => %s", source_file, dest_dir)
+        return True
+    except (IOError, OSError) as e:
+        log.trace("reflink IS NOT supported for %s => %s: %r", source_file, dest_dir, e)
+        return False
+    finally:
+        rm_rf(test_file)
+
+
 def is_conda_environment(prefix):
     return isfile(join(prefix, PREFIX_MAGIC_FILE))
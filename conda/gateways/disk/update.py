@@ -5,6 +5,7 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 
 from errno import EINVAL, EXDEV
 from logging import getLogger
+import mmap
 import os
 from os.path import dirname, isdir
 import re
@@ -46,6 +47,32 @@ def update_file_in_place_as_binary(file_full_path, callback):
             fh.close()
 
 
+def update_file_in_place_as_mmap(file_full_path, callback):
+    # callback should be a callable that takes one positional argument, which is a writable
+    #   mmap of the file's content; changes made through the mmap are written back in place
+    # unlike update_file_in_place_as_binary, the file is never read fully into memory, and
+    #   pages that aren't touched by the callback aren't rewritten
+    # empty files can't be memory-mapped, and are skipped
+    fh = mm = None
+    try:
+        fh = exp_backoff_fn(open, file_full_path, 'rb+')
+        log.trace("in-place mmap update path locked for %s", file_full_path)
+        if os.fstat(fh.fileno()).st_size == 0:
+            return
+        mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_WRITE)
+        try:
+            callback(mm)
+        except CancelOperation:
+            pass  # NOQA
+        else:
+            mm.flush()
+    finally:
+        if mm is not None:
+            mm.close()
+        if fh:
+            fh.close()
+
+
 def rename(source_path, destination_path, force=False):
     if lexists(destination_path) and force:
         rm_rf(destination_path)
@@ -5,6 +5,8 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 
 from ast import literal_eval
 from errno import EACCES, EPERM
+from hashlib import md5
+import json
 import logging
 from operator import itemgetter
 import os
@@ -20,7 +22,7 @@ from ._vendor.auxlib.ish import dals
 from ._vendor.toolz import groupby, take
 from .base.constants import DEFAULTS_CHANNEL_NAME
 from .base.context import context
-from .common.compat import ensure_text_type, iteritems, open, text_type
+from .common.compat import ensure_text_type, iteritems, on_win, open, text_type
 from .common.path import paths_equal
 from .core.prefix_data import PrefixData
 from .exceptions import CondaHistoryError, CondaUpgradeError, NotWritableError
@@ -32,6 +34,17 @@ from .resolve import MatchSpec
 log = logging.getLogger(__name__)
 
 
+# The sidecar index summarizes all but the last revision of conda-meta/history, which is
+#   the only one still appended to (by write_specs).  It's only written for history files
+#   large enough that reading it beats a full parse.
+HISTORY_INDEX_FILENAME = '.history_index'
+HISTORY_INDEX_VERSION = 1
+HISTORY_INDEX_MIN_SIZE = 65536
+HISTORY_CHECKPOINT_INTERVAL = 50
+
+_revision_start_pat = re.compile(br'^[ \t]*==>', re.M)
+
+
 class CondaHistoryWarning(Warning):
     pass
 
@@ -123,12 +136,15 @@ class History(object):
         parse the history file and return a list of
         tuples(datetime strings, set of distributions/diffs, comments)
         """
-        res = []
         if not isfile(self.path):
-            return res
-        sep_pat = re.compile(r'==>\s*(.+?)\s*<==')
+            return []
         with open(self.path) as f:
-            lines = f.read().splitlines()
+            return self._parse_lines(f.read().splitlines())
+
+    @staticmethod
+    def _parse_lines(lines):
+        res = []
+        sep_pat = re.compile(r'==>\s*(.+?)\s*<==')
         for line in lines:
             line = line.strip()
             if not line:
@@ -215,11 +231,17 @@ class History(object):
         'action': install/remove/update
         'specs': the specs being used
         """
+        res = self._user_requests(self.parse())
+        self._check_conda_versions(x['conda_version'] for x in res if 'conda_version' in x)
+        return res
+
+    @classmethod
+    def _user_requests(cls, parsed):
         res = []
-        for dt, unused_cont, comments in self.parse():
+        for dt, unused_cont, comments in parsed:
             item = {'date': dt}
             for line in comments:
-                comment_items = self._parse_comment_line(line)
+                comment_items = cls._parse_comment_line(line)
                 item.update(comment_items)
 
             if 'cmd' in item:
@@ -228,9 +250,10 @@ class History(object):
             dists = groupby(itemgetter(0), unused_cont)
             item['unlink_dists'] = dists.get('-', ())
             item['link_dists'] = dists.get('+', ())
+        return res
 
-        conda_versions_from_history = tuple(x['conda_version'] for x in res
-                                            if 'conda_version' in x)
+    def _check_conda_versions(self, conda_versions_from_history):
+        conda_versions_from_history = tuple(conda_versions_from_history)
         if conda_versions_from_history:
             minimum_conda_version = sorted(conda_versions_from_history, key=VersionOrder)[-1]
             minimum_major_minor = '.'.join(take(2, minimum_conda_version.split('.')))
@@ -257,17 +280,19 @@ class History(object):
                     }
                 raise CondaUpgradeError(message)
 
-        return res
-
     def get_requested_specs_map(self):
         # keys are package names and values are specs
-        spec_map = {}
-        for request in self.get_user_requests():
-            remove_specs = (MatchSpec(spec) for spec in request.get('remove_specs', ()))
-            for spec in remove_specs:
-                spec_map.pop(spec.name, None)
-            update_specs = (MatchSpec(spec) for spec in request.get('update_specs', ()))
-            spec_map.update(((s.name, s) for s in update_specs))
+        index, tail = self._load_indexed()
+        requests = self._user_requests(tail)
+        conda_versions = [x['conda_version'] for x in requests if 'conda_version' in x]
+        if index['conda_version']:
+            conda_versions.append(index['conda_version'])
+        self._check_conda_versions(conda_versions)
+
+        spec_map = dict(index['specs'])
+        for request in requests:
+            _apply_request(spec_map, request)
+        spec_map = dict((name, MatchSpec(spec)) for name, spec in iteritems(spec_map))
 
         # Conda hasn't always been good about recording when specs have been removed from
         # environments.  If the package isn't installed in the current environment, then we
@@ -283,16 +308,7 @@ class History(object):
         res = []
         cur = set([])
         for dt, cont, unused_com in self.parse():
-            if not is_diff(cont):
-                cur = cont
-            else:
-                for s in cont:
-                    if s.startswith('-'):
-                        cur.discard(s[1:])
-                    elif s.startswith('+'):
-                        cur.add(s[1:])
-                    else:
-                        raise CondaHistoryError('Did not expect: %s' % s)
+            cur = _apply_revision(cur, cont)
             res.append((dt, cur.copy()))
         return res
 
@@ -304,11 +320,107 @@ class History(object):
 
         Returns a list of dist_strs
         """
-        states = self.construct_states()
-        if not states:
+        index, tail = self._load_indexed()
+        revisions = index['revisions'] + len(tail)
+        if not revisions:
             return set([])
-        times, pkgs = zip(*states)
-        return pkgs[rev]
+        rev = range(revisions)[rev]
+
+        if rev >= index['revisions'] - 1:
+            cur = set(index['state'])
+            for unused_dt, cont, unused_com in tail[:rev - index['revisions'] + 1]:
+                cur = _apply_revision(cur, cont)
+            return cur
+
+        # replay from the closest checkpoint at or before rev
+        checkpoint = next((cp for cp in reversed(index['checkpoints']) if cp['rev'] <= rev),
+                          {'rev': -1, 'offset': 0, 'state': ()})
+        with open(self.path, 'rb') as fh:
+            fh.seek(checkpoint['offset'])
+            parsed = self._parse_lines(ensure_text_type(fh.read()).splitlines())
+        cur = set(checkpoint['state'])
+        for unused_dt, cont, unused_com in parsed[:rev - checkpoint['rev']]:
+            cur = _apply_revision(cur, cont)
+        return cur
+
+    @property
+    def index_path(self):
+        return join(self.meta_dir, HISTORY_INDEX_FILENAME)
+
+    def _load_indexed(self):
+        """
+        return (index, tail), where index summarizes the history file up to its last
+        revision, and tail is parse() output for the rest of the file
+
+        The index holds the state and the requested specs after its last revision,
+        plus checkpoints of the state every HISTORY_CHECKPOINT_INTERVAL revisions with
+        the byte offset to resume replaying from.  Complete revisions found beyond the
+        index are added to it, and it's written back.
+        """
+        index = _new_history_index()
+        if not isfile(self.path):
+            return index, []
+        with open(self.path, 'rb') as fh:
+            size = os.fstat(fh.fileno()).st_size
+            if size >= HISTORY_INDEX_MIN_SIZE:
+                index = self._read_index(fh, size) or index
+            fh.seek(index['offset'])
+            data = fh.read()
+
+        starts = [m.start() for m in _revision_start_pat.finditer(data)]
+        if size < HISTORY_INDEX_MIN_SIZE or len(starts) < 2:
+            return index, self._parse_lines(ensure_text_type(data).splitlines())
+
+        # each block holds one revision; the first may also hold lines before any header
+        ends = starts[1:]
+        starts = [0] + ends[:-1]
+        state = set(index['state'])
+        for start, end in zip(starts, ends):
+            for dt, cont, comments in self._parse_lines(
+                    ensure_text_type(data[start:end]).splitlines()):
+                state = _apply_revision(state, cont)
+                index['revisions'] += 1
+                if index['revisions'] % HISTORY_CHECKPOINT_INTERVAL == 0:
+                    index['checkpoints'].append({
+                        'rev': index['revisions'] - 1,
+                        'offset': index['offset'] + end,
+                        'state': sorted(state),
+                    })
+                for request in self._user_requests([(dt, cont, comments)]):
+                    _apply_request(index['specs'], request)
+                    conda_version = request.get('conda_version')
+                    if conda_version and (not index['conda_version'] or VersionOrder(
+                            conda_version) > VersionOrder(index['conda_version'])):
+                        index['conda_version'] = conda_version
+        index['state'] = sorted(state)
+        index['offset'] += ends[-1]
+        with open(self.path, 'rb') as fh:
+            index['fingerprint'] = _history_fingerprint(fh, index['offset'])
+        self._write_index(index)
+        return index, self._parse_lines(ensure_text_type(data[ends[-1]:]).splitlines())
+
+    def _read_index(self, fh, size):
+        try:
+            with open(self.index_path) as f:
+                index = json.load(f)
+            if (index['version'] != HISTORY_INDEX_VERSION or index['offset'] > size
+                    or index['fingerprint'] != _history_fingerprint(fh, index['offset'])):
+                return None
+        except (EnvironmentError, ValueError, KeyError, TypeError):
+            return None
+        return index
+
+    def _write_index(self, index):
+        temp_path = "%s.%s.tmp" % (self.index_path, os.getpid())
+        try:
+            with open(temp_path, 'w') as f:
+                f.write(ensure_text_type(json.dumps(index)))
+            if on_win and isfile(self.index_path):
+                os.unlink(self.index_path)
+            os.rename(temp_path, self.index_path)
+        except EnvironmentError as e:
+            # the index is only an optimization
+            log.debug("unable to write history index %s: %r", self.index_path, e)
 
     def print_log(self):
         for i, (date, content, unused_com) in enumerate(self.parse()):
@@ -386,6 +498,50 @@ class History(object):
                     fh.write("# update specs: %s\n" % update_specs)
 
 
+def _apply_revision(cur, cont):
+    if not is_diff(cont):
+        return set(cont)
+    cur = set(cur)
+    for s in cont:
+        if s.startswith('-'):
+            cur.discard(s[1:])
+        elif s.startswith('+'):
+            cur.add(s[1:])
+        else:
+            raise CondaHistoryError('Did not expect: %s' % s)
+    return cur
+
+
+def _apply_request(spec_map, request):
+    # spec_map maps package names to spec strings
+    for spec in request.get('remove_specs', ()):
+        spec_map.pop(MatchSpec(spec).name, None)
+    for spec in request.get('update_specs', ()):
+        spec_map[MatchSpec(spec).name] = spec
+
+
+def _new_history_index():
+    return {
+        'version': HISTORY_INDEX_VERSION,
+        'offset': 0,
+        'fingerprint': None,
+        'revisions': 0,
+        'state': [],
+        'checkpoints': [],
+        'specs': {},
+        'conda_version': None,
+    }
+
+
+def _history_fingerprint(fh, offset):
+    # the history file is only ever appended to; this catches it being replaced
+    fh.seek(0)
+    head = fh.read(min(offset, 4096))
+    fh.seek(max(offset - 4096, 0))
+    tail = fh.read(offset - max(offset - 4096, 0))
+    return md5(head + tail).hexdigest()
+
+
 if __name__ == '__main__':
     from pprint import pprint
     # Don't use in context manager mode---it augments the history every time
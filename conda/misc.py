@@ -9,13 +9,19 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 
 from collections import defaultdict
 import os
-from os.path import abspath, dirname, exists, isdir, isfile, join, relpath
+from os.path import abspath, dirname, exists, isdir, isfile, join
 import re
 import shutil
 import sys
 
+try:
+    from os import scandir
+except ImportError:  # pragma: no cover
+    scandir = None
+
 from .base.context import context
-from .common.compat import itervalues, on_win, open
+from .common.compat import ensure_binary, itervalues, on_win, open
+from .common.io import ThreadLimitedThreadPoolExecutor
 from .common.path import expand
 from .common.url import is_url, join_url, path_to_url, unquote
 from .core.index import get_index
@@ -23,8 +29,11 @@ from .core.link import PrefixSetup, UnlinkLinkTransaction
 from .core.package_cache_data import PackageCacheData, ProgressiveFetchExtract
 from .core.prefix_data import PrefixData
 from .exceptions import DisallowedPackageError, DryRunExit, PackagesNotFoundError, ParseError
+from .gateways.disk.create import create_link
 from .gateways.disk.delete import rm_rf
 from .gateways.disk.link import islink, readlink, symlink
+from .gateways.disk.test import hardlink_supported, reflink_supported
+from .models.enums import LinkType
 from .models.match_spec import MatchSpec
 from .models.prefix_graph import PrefixGraph
 from .plan import _get_best_prec_match
@@ -72,7 +81,7 @@ def explicit(specs, prefix, verbose=False, force_extract=True, index_args=None,
         raise DryRunExit()
 
     pfe = ProgressiveFetchExtract(fetch_specs)
-    pfe.execute()
+    pfe.execute(max_workers=context.fetch_threads)
 
     # now make an UnlinkLinkTransaction with the PackageCacheRecords as inputs
     # need to add package name to fetch_specs so that history parsing keeps track of them correctly
@@ -116,40 +125,75 @@ def walk_prefix(prefix, ignore_predefined_files=True, windows_forward_slashes=Tr
     binignore = {'conda', 'activate', 'deactivate'}
     if sys.platform == 'darwin':
         ignore.update({'python.app', 'Launcher.app'})
+    top_dirs = []
     for fn in os.listdir(prefix):
         if ignore_predefined_files and fn in ignore:
             continue
         if isfile(join(prefix, fn)):
             res.add(fn)
-            continue
-        for root, dirs, files in os.walk(join(prefix, fn)):
-            should_ignore = ignore_predefined_files and root == join(prefix, 'bin')
-            for fn2 in files:
-                if should_ignore and fn2 in binignore:
-                    continue
-                res.add(relpath(join(root, fn2), prefix))
-            for dn in dirs:
-                path = join(root, dn)
-                if islink(path):
-                    res.add(relpath(path, prefix))
+        else:
+            top_dirs.append(join(prefix, fn))
+
+    # each top-level directory is walked on its own thread; walking is bound by
+    #   directory-read latency, not CPU
+    with ThreadLimitedThreadPoolExecutor() as executor:
+        for paths in executor.map(_walk_files, top_dirs):
+            res.update(rel_path(prefix, path, windows_forward_slashes=False) for path in paths)
 
+    if ignore_predefined_files:
+        res.difference_update(join('bin', fn) for fn in binignore)
     if on_win and windows_forward_slashes:
         return {path.replace('\\', '/') for path in res}
     else:
         return res
 
 
+def _walk_files(top):
+    """
+    Return the paths of all non-directories below top, where, as with os.walk, symlinks to
+    directories are listed but not followed.
+    """
+    if scandir is None:
+        paths = []
+        for root, dirs, files in os.walk(top):
+            paths.extend(join(root, fn) for fn in files)
+            paths.extend(join(root, dn) for dn in dirs if islink(join(root, dn)))
+        return paths
+
+    paths = []
+    dirs = [top]
+    while dirs:
+        try:
+            entries = tuple(scandir(dirs.pop()))
+        except OSError:
+            continue
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if is_dir and not entry.is_symlink():
+                dirs.append(entry.path)
+            else:
+                paths.append(entry.path)
+    return paths
+
+
 def untracked(prefix, exclude_self_build=False):
     """
     Return (the set) of all untracked files for a given prefix.
     """
-    conda_files = conda_installed_files(prefix, exclude_self_build)
+    if exclude_self_build:
+        is_tracked = conda_installed_files(prefix, exclude_self_build).__contains__
+    else:
+        is_tracked = PrefixData(prefix).is_tracked
     return {
-        path for path in walk_prefix(prefix) - conda_files
+        path for path in walk_prefix(prefix)
         if not (
-            path.endswith('~')
+            is_tracked(path)
+            or path.endswith('~')
             or sys.platform == 'darwin' and path.endswith('.DS_Store')
-            or path.endswith('.pyc') and path[:-1] in conda_files
+            or path.endswith('.pyc') and is_tracked(path[:-1])
         )}
 
 
@@ -244,6 +288,8 @@ def clone_env(prefix1, prefix2, verbose=True, quiet=False, index_args=None):
     if context.dry_run:
         raise DryRunExit()
 
+    link_type = None
+    prefix1_bytes = ensure_binary(prefix1)
     for f in untracked_files:
         src = join(prefix1, f)
         dst = join(prefix2, f)
@@ -256,6 +302,18 @@ def clone_env(prefix1, prefix2, verbose=True, quiet=False, index_args=None):
             symlink(readlink(src), dst)
             continue
 
+        try:
+            has_prefix = _file_contains(src, prefix1_bytes)
+        except IOError:
+            continue
+
+        if not has_prefix:
+            # nothing to rewrite, so the file doesn't need to be read and written again
+            if link_type is None:
+                link_type = _clone_link_type(src, dst_dir)
+            create_link(src, dst, link_type, force=True)
+            continue
+
         try:
             with open(src, 'rb') as fi:
                 data = fi.read()
@@ -276,3 +334,28 @@ def clone_env(prefix1, prefix2, verbose=True, quiet=False, index_args=None):
     actions = explicit(urls, prefix2, verbose=not quiet, index=index,
                        force_extract=False, index_args=index_args)
     return actions, untracked_files
+
+
+def _file_contains(path, data, chunk_size=1048576):
+    # reads in chunks, so large files are never held in memory in full
+    overlap = len(data) - 1
+    tail = b''
+    with open(path, 'rb') as fh:
+        while True:
+            chunk = fh.read(chunk_size)
+            if not chunk:
+                return False
+            window = tail + chunk
+            if data in window:
+                return True
+            tail = window[-overlap:] if overlap else b''
+
+
+def _clone_link_type(source_test_file, dst_dir):
+    # Unlike package files, untracked files may be edited in place, so a copy-on-write clone
+    #   is preferred over a hard link whenever the filesystem supports one.
+    if reflink_supported(source_test_file, dst_dir):
+        return LinkType.reflink
+    if not context.always_copy and hardlink_supported(source_test_file, dst_dir):
+        return LinkType.hardlink
+    return LinkType.copy
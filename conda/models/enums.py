@@ -71,6 +71,7 @@ class LinkType(Enum):
     softlink = 2
     copy = 3
     directory = 4
+    reflink = 5  # copy-on-write clone; falls back to copy where unsupported
 
     def __int__(self):
         return self.value
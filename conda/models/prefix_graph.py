@@ -32,18 +32,31 @@ class PrefixGraph(object):
     def __init__(self, records, specs=()):
         records = tuple(records)
         specs = set(specs)
+        records_by_name = {}  # Dict[str, List[PrefixRecord]]
+        for rec in records:
+            records_by_name.setdefault(rec.name, []).append(rec)
+        match_specs = {}  # Dict[str, MatchSpec]; the same depends strings recur across records
         graph = {}  # Dict[PrefixRecord, Set[PrefixRecord]]
         self.spec_matches = spec_matches = {}  # Dict[PrefixRecord, Set[MatchSpec]]
         for node in records:
-            parent_match_specs = tuple(MatchSpec(d) for d in node.depends)
-            parent_nodes = set(
-                rec for rec in records if any(m.match(rec) for m in parent_match_specs)
-            )
+            parent_nodes = set()
+            for dep in node.depends:
+                ms = match_specs.get(dep)
+                if ms is None:
+                    ms = match_specs[dep] = MatchSpec(dep)
+                name = ms.get_exact_value('name')
+                candidates = records if name is None else records_by_name.get(name, ())
+                parent_nodes.update(rec for rec in candidates if ms.match(rec))
             graph[node] = parent_nodes
             matching_specs = IndexedSet(s for s in specs if s.match(node))
             if matching_specs:
                 spec_matches[node] = matching_specs
         self.graph = graph
+        # the inverse of graph, kept up to date by _remove_node
+        self._children = children = {node: set() for node in graph}  # Dict[PrefixRecord, Set]
+        for node, parents in iteritems(graph):
+            for parent in parents:
+                children[parent].add(node)
         self._toposort()
 
     def remove_spec(self, spec):
@@ -86,18 +99,10 @@ class PrefixGraph(object):
             Tuple[PrefixRecord]: The removed nodes.
 
         """
-        graph = self.graph
+        children = self._children
         spec_matches = self.spec_matches
-        inverted_graph = {
-            node: set(key for key in graph if node in graph[key])
-            for node in graph
-        }
-        youngest_nodes_with_specs = tuple(node for node, children in iteritems(inverted_graph)
-                                          if not children and node in spec_matches)
-        removed_nodes = tuple(filter(
-            lambda node: node in youngest_nodes_with_specs,
-            self.graph
-        ))
+        removed_nodes = tuple(node for node in self.graph
+                              if not children[node] and node in spec_matches)
         for node in removed_nodes:
             self._remove_node(node)
         self._toposort()
@@ -114,23 +119,23 @@ class PrefixGraph(object):
             Tuple[PrefixRecord]: The pruned nodes.
 
         """
-        graph = self.graph
+        children = self._children
         spec_matches = self.spec_matches
         original_order = tuple(self.graph)
 
         removed_nodes = set()
-        while True:
-            inverted_graph = {
-                node: set(key for key in graph if node in graph[key])
-                for node in graph
-            }
-            prunable_nodes = tuple(node for node, children in iteritems(inverted_graph)
-                                   if not children and node not in spec_matches)
-            if not prunable_nodes:
-                break
-            for node in prunable_nodes:
-                removed_nodes.add(node)
-                self._remove_node(node)
+        prunable_nodes = [node for node in original_order
+                          if not children[node] and node not in spec_matches]
+        while prunable_nodes:
+            node = prunable_nodes.pop()
+            if node in removed_nodes:
+                continue
+            parents = self.graph[node]
+            removed_nodes.add(node)
+            self._remove_node(node)
+            # removing a node can only leave its own parents without children
+            prunable_nodes.extend(parent for parent in parents
+                                  if not children[parent] and parent not in spec_matches)
 
         removed_nodes = tuple(filter(
             lambda node: node in removed_nodes,
@@ -144,16 +149,12 @@ class PrefixGraph(object):
 
     def all_descendants(self, node):
         graph = self.graph
-        inverted_graph = {
-            node: set(key for key in graph if node in graph[key])
-            for node in graph
-        }
-
+        children = self._children
         nodes = [node]
         nodes_seen = set()
         q = 0
         while q < len(nodes):
-            for child_node in inverted_graph[nodes[q]]:
+            for child_node in children[nodes[q]]:
                 if child_node not in nodes_seen:
                     nodes_seen.add(child_node)
                     nodes.append(child_node)
@@ -188,13 +189,15 @@ class PrefixGraph(object):
         graph = self.graph
         if node not in graph:
             raise KeyError('node %s does not exist' % node)
-        graph.pop(node)
+        children = self._children
+        for parent in graph.pop(node):
+            if parent != node:
+                children[parent].discard(node)
+        for child in children.pop(node):
+            if child != node:
+                graph[child].discard(node)
         self.spec_matches.pop(node, None)
 
-        for node, edges in iteritems(graph):
-            if node in edges:
-                edges.remove(node)
-
     def _toposort(self):
         graph_copy = odict((node, IndexedSet(parents)) for node, parents in iteritems(self.graph))
         self._toposort_prepare_graph(graph_copy)
@@ -211,20 +214,31 @@ class PrefixGraph(object):
         if not graph:
             return
 
-        while True:
-            no_parent_nodes = IndexedSet(sorted(
-                (node for node, parents in iteritems(graph) if len(parents) == 0),
-                key=lambda x: x.name
-            ))
-            if not no_parent_nodes:
-                break
+        children = {}
+        for node, parents in iteritems(graph):
+            for parent in parents:
+                children.setdefault(parent, []).append(node)
 
+        # Nodes are yielded in rounds, each sorted by name. A node joins the next round once
+        # the last of its parents has been yielded.
+        no_parent_nodes = sorted(
+            (node for node, parents in iteritems(graph) if len(parents) == 0),
+            key=lambda x: x.name
+        )
+        while no_parent_nodes:
             for node in no_parent_nodes:
                 yield node
                 graph.pop(node, None)
 
-            for parents in itervalues(graph):
-                parents -= no_parent_nodes
+            next_nodes = set()
+            for node in no_parent_nodes:
+                for child in children.get(node, ()):
+                    parents = graph.get(child)
+                    if parents is not None:
+                        parents.discard(node)
+                        if not parents:
+                            next_nodes.add(child)
+            no_parent_nodes = sorted(next_nodes, key=lambda x: x.name)
 
         if len(graph) != 0:
             raise CyclicalDependencyError(tuple(graph))
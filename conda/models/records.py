@@ -383,8 +383,12 @@ class PackageCacheRecord(PackageRecord):
 
         from os.path import isfile
         if isfile(self.package_tarball_full_path):
-            from ..gateways.disk.read import compute_md5sum
-            md5sum = compute_md5sum(self.package_tarball_full_path)
+            from ..gateways.disk.read import (compute_md5sum, get_recorded_digest,
+                                              read_extract_manifest)
+            # the md5 taken at extract time, if the tarball hasn't changed since
+            tarball_entry = read_extract_manifest(self.extracted_package_dir).get('tarball')
+            md5sum = (get_recorded_digest(tarball_entry, self.package_tarball_full_path, 'md5')
+                      or compute_md5sum(self.package_tarball_full_path))
             setattr(self, '_memoized_md5', md5sum)
             return md5sum
 
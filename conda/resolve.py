@@ -3,6 +3,7 @@
 # SPDX-License-Identifier: BSD-3-Clause
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+from bisect import bisect_left
 from collections import defaultdict
 from itertools import chain
 from logging import DEBUG, getLogger
@@ -54,6 +55,8 @@ class Resolve(object):
         self.find_matches_ = {}  # Dict[MatchSpec, List[PackageRecord]]
         self.ms_depends_ = {}  # Dict[PackageRecord, List[MatchSpec]]
         self._reduced_index_cache = {}
+        self._record_keys = {}  # Dict[PackageRecord, Tuple], see _make_record_key
+        self._version_orders = {}  # Dict[package_name, List[VersionOrder]], sorted
 
         if sort:
             for name, group in iteritems(groups):
@@ -390,17 +393,54 @@ class Resolve(object):
         return deps
 
     def version_key(self, prec, vtype=None):
-        channel = prec.channel
-        channel_priority = self._channel_priorities_map.get(channel.name, 1)  # TODO: ask @mcg1969 why the default value is 1 here  # NOQA
-        valid = 1 if channel_priority < MAX_CHANNEL_PRIORITY else 0
-        version_comparator = VersionOrder(prec.get('version', ''))
-        build_number = prec.get('build_number', 0)
-        build_string = prec.get('build')
-        ts = prec.get('timestamp', 0)
+        record_key = self._record_keys.get(prec)
+        if record_key is None:
+            if prec.name not in self._version_orders:
+                self._make_record_keys(prec.name)
+                record_key = self._record_keys.get(prec)
+            if record_key is None:
+                # not in the index; rank its version among the group's versions
+                version_orders = self._version_orders[prec.name]
+                vo = VersionOrder(prec.get('version', ''))
+                q = bisect_left(version_orders, vo)
+                if q < len(version_orders) and version_orders[q] == vo:
+                    record_key = self._make_record_key(prec, 2 * q)
+                else:
+                    record_key = self._make_record_key(prec, 2 * q - 1)
+        valid, channel_priority, version_rank, build_number, ts, build_string = record_key
         if context.channel_priority:
-            return valid, -channel_priority, version_comparator, build_number, ts, build_string
+            return valid, channel_priority, version_rank, build_number, ts, build_string
         else:
-            return valid, version_comparator, -channel_priority, build_number, ts, build_string
+            return valid, version_rank, channel_priority, build_number, ts, build_string
+
+    def _make_record_keys(self, name):
+        # Everything version_key needs, computed once for a whole group.  Each distinct
+        #   version string is parsed once and replaced by its rank among the group's sorted
+        #   VersionOrders, so sorting and metric generation compare ints.  Ranks are even,
+        #   leaving odd ranks for versions of records outside the index.
+        group = self.groups.get(name, ())
+        version_orders = {}
+        for prec in group:
+            version = prec.get('version', '')
+            if version not in version_orders:
+                version_orders[version] = VersionOrder(version)
+        unique_version_orders = []
+        version_ranks = {}
+        for version, vo in sorted(iteritems(version_orders), key=lambda x: x[1]):
+            if not unique_version_orders or vo != unique_version_orders[-1]:
+                unique_version_orders.append(vo)
+            version_ranks[version] = 2 * (len(unique_version_orders) - 1)
+        self._version_orders[name] = unique_version_orders
+        for prec in group:
+            self._record_keys[prec] = self._make_record_key(
+                prec, version_ranks[prec.get('version', '')]
+            )
+
+    def _make_record_key(self, prec, version_rank):
+        channel_priority = self._channel_priorities_map.get(prec.channel.name, 1)  # TODO: ask @mcg1969 why the default value is 1 here  # NOQA
+        valid = 1 if channel_priority < MAX_CHANNEL_PRIORITY else 0
+        return (valid, -channel_priority, version_rank, prec.get('build_number', 0),
+                prec.get('timestamp', 0), prec.get('build'))
 
     @staticmethod
     def _make_channel_priorities(channels):
@@ -13,6 +13,7 @@ from conda._vendor.auxlib.collection import AttrDict
 from conda._vendor.auxlib.ish import dals
 from conda._vendor.toolz.itertoolz import concat
 from conda.base.constants import PathConflict
+from conda.base import context as context_module
 from conda.base.context import context, reset_context
 from conda.common.compat import odict, iteritems
 from conda.common.configuration import ValidationError, YamlRawParameter
@@ -29,7 +30,7 @@ from conda.models.channel import Channel
 from conda.models.match_spec import MatchSpec
 from conda.utils import on_win
 
-from ..helpers import tempdir
+from ..helpers import mock, tempdir
 
 
 class ContextCustomRcTests(TestCase):
@@ -270,3 +271,19 @@ class ContextDefaultRcTests(TestCase):
             assert context.local_build_root == join(context.root_prefix, 'conda-bld')
         else:
             assert context.local_build_root == expand('~/conda-bld')
+
+
+def test_cpu_info_disk_cache():
+    with tempdir() as td:
+        cache_path = join(td, 'cpu_info.json')
+        with mock.patch.object(context_module, 'CPU_INFO_CACHE_PATH', cache_path):
+            fingerprint = context_module._cpu_info_fingerprint()
+            assert context_module._read_cpu_info_cache(fingerprint) is None
+
+            info = {'flags': ['avx', 'sse2'], 'brand': 'Some CPU'}
+            context_module._write_cpu_info_cache(fingerprint, info)
+            assert context_module._read_cpu_info_cache(fingerprint) == info
+
+            # a different host, kernel or boot misses
+            assert context_module._read_cpu_info_cache(fingerprint + ['other']) is None
+            assert os.listdir(td) == ['cpu_info.json']
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+from logging import getLogger
+import os
+from os.path import join
+
+from conda.base.context import reset_context
+from conda.cli.main_clean import find_pkgs
+from conda.common.compat import on_win
+from conda.common.io import env_var
+from conda.compat import TemporaryDirectory
+from conda.core.package_cache_data import PackageUsageData
+from conda.gateways.disk.create import mkdir_p
+
+log = getLogger(__name__)
+
+
+def _make_pkg(pkgs_dir, dist_name):
+    extracted_package_dir = join(pkgs_dir, dist_name)
+    mkdir_p(join(extracted_package_dir, 'info'))
+    mkdir_p(join(extracted_package_dir, 'lib'))
+    with open(join(extracted_package_dir, 'info', 'index.json'), 'w') as fh:
+        fh.write('{}')
+    with open(join(extracted_package_dir, 'lib', 'libfoo.so'), 'w') as fh:
+        fh.write('x' * 100)
+    return extracted_package_dir
+
+
+def _make_prefix(root, dist_name):
+    prefix = join(root, 'envs', dist_name)
+    mkdir_p(join(prefix, 'conda-meta'))
+    with open(join(prefix, 'conda-meta', dist_name + '.json'), 'w') as fh:
+        fh.write('{}')
+    return prefix
+
+
+def test_package_usage_data():
+    with TemporaryDirectory() as tmp:
+        extracted_package_dir = _make_pkg(tmp, 'foo-1.0-0')
+        usage = PackageUsageData(extracted_package_dir)
+        assert usage.linked_prefixes() is None
+        assert usage.in_use() is None
+
+        prefix = _make_prefix(tmp, 'foo-1.0-0')
+        usage.add_prefix(prefix)
+        usage.add_prefix(join(tmp, 'removed-without-transaction'))
+        assert usage.linked_prefixes() == {prefix, join(tmp, 'removed-without-transaction')}
+        assert usage.in_use() is True
+
+        # the log is compacted to the prefixes still using the package
+        assert usage.in_use() is True
+        with open(usage.usage_txt_path) as fh:
+            assert fh.read() == 'link\t%s\n' % prefix
+
+        # without a recorded prefix, it's up to the link counts
+        usage.remove_prefix(prefix)
+        assert usage.linked_prefixes() == set()
+        assert usage.in_use() is None
+
+
+def test_find_pkgs():
+    with TemporaryDirectory() as tmp:
+        pkgs_dir = join(tmp, 'pkgs')
+        used = _make_pkg(pkgs_dir, 'used-1.0-0')
+        PackageUsageData(used).add_prefix(_make_prefix(tmp, 'used-1.0-0'))
+        unused = _make_pkg(pkgs_dir, 'unused-1.0-0')
+        PackageUsageData(unused).add_prefix(join(tmp, 'gone'))
+
+        # packages without a usage record fall back to checking link counts
+        _make_pkg(pkgs_dir, 'unrecorded-1.0-0')
+        hardlinked = _make_pkg(pkgs_dir, 'hardlinked-1.0-0')
+        # and so do packages whose recorded prefixes are gone, e.g. an environment was moved
+        moved = _make_pkg(pkgs_dir, 'moved-1.0-0')
+        PackageUsageData(moved).add_prefix(join(tmp, 'moved-from'))
+        if not on_win:
+            os.link(join(hardlinked, 'lib', 'libfoo.so'), join(tmp, 'libfoo.so'))
+            os.link(join(moved, 'lib', 'libfoo.so'), join(tmp, 'moved-libfoo.so'))
+
+        with env_var('CONDA_PKGS_DIRS', pkgs_dir, reset_context):
+            pkgs_dirs, warnings, totalsize, pkgsizes = find_pkgs()
+
+        expected = {'unused-1.0-0', 'unrecorded-1.0-0'}
+        if on_win:
+            expected.update(('hardlinked-1.0-0', 'moved-1.0-0'))
+        assert set(pkgs_dirs[pkgs_dir]) == expected
+        assert not warnings
+        sizes = dict(zip(pkgs_dirs[pkgs_dir], pkgsizes[pkgs_dir]))
+        assert sizes['unrecorded-1.0-0'] == 102
+        # with its log compacted to nothing
+        assert sizes['unused-1.0-0'] == 102
+        assert totalsize == sum(sizes.values())
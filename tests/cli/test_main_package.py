@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import bz2
+import hashlib
+from logging import getLogger
+import os
+from os.path import isfile, join, lexists
+import tarfile
+
+import pytest
+
+from conda.base.constants import PREFIX_MAGIC_FILE
+from conda.cli.main_package import (ParallelBZ2Writer, create_conda_pkg, which_package,
+                                     which_packages)
+from conda.common.compat import on_win
+from conda.compat import TemporaryDirectory
+from conda.core.prefix_data import PATH_INDEX_FILENAME, PrefixData, delete_prefix_from_linked_data
+from conda.gateways.disk.create import write_as_json_to_file
+from conda.gateways.disk.update import touch
+from conda.models.records import PrefixRecord
+
+log = getLogger(__name__)
+
+
+def _prefix_record(name, files):
+    return PrefixRecord(name=name, version='1.0', build='0', build_number=0,
+                        channel='conda-forge', subdir='linux-64',
+                        fn='%s-1.0-0.tar.bz2' % name, files=files)
+
+
+def test_which_packages():
+    with TemporaryDirectory() as prefix:
+        touch(join(prefix, PREFIX_MAGIC_FILE), mkdir=True)
+        prefix_data = PrefixData(prefix)
+        try:
+            prefix_data.insert(_prefix_record('foo', ('lib/foo.so', 'share/common.txt')))
+            prefix_data.insert(_prefix_record('bar', ('bin/bar', 'share/common.txt')))
+
+            foo_path = join(prefix, 'lib', 'foo.so')
+            assert [prec.name for prec in which_package(foo_path)] == ['foo']
+            index_path = join(prefix, 'conda-meta', PATH_INDEX_FILENAME)
+            assert isfile(index_path)
+
+            paths = (foo_path, join(prefix, 'bin', '..', 'share', 'common.txt'),
+                     join(prefix, 'not-installed'))
+            assert [(path, sorted(prec.name for prec in precs))
+                    for path, precs in which_packages(paths)] == [
+                (paths[0], ['foo']),
+                (paths[1], ['bar', 'foo']),
+                (paths[2], []),
+            ]
+
+            # insert and remove keep a loaded index up to date
+            prefix_data.remove('foo')
+            prefix_data.insert(_prefix_record('baz', ('lib/foo.so',)))
+            assert [prec.name for prec in which_package(foo_path)] == ['baz']
+
+            # a record written outside of PrefixData invalidates the stored index
+            delete_prefix_from_linked_data(prefix)
+            os.unlink(join(prefix, 'conda-meta', 'baz-1.0-0.json'))
+            write_as_json_to_file(join(prefix, 'conda-meta', 'qux-1.0-0.json'),
+                                  _prefix_record('qux', ('lib/foo.so',)))
+            assert [prec.name for prec in which_package(foo_path)] == ['qux']
+        finally:
+            delete_prefix_from_linked_data(prefix)
+
+
+def test_parallel_bz2_writer():
+    with TemporaryDirectory() as tmp:
+        path = join(tmp, 'data.bz2')
+        data = os.urandom(1000) * 5000
+        with open(path, 'wb') as fh:
+            writer = ParallelBZ2Writer(fh, 4)
+            writer.block_size = 65536
+            for q in range(0, len(data), 10000):
+                writer.write(data[q:q + 10000])
+            writer.close()
+        with open(path, 'rb') as fh:
+            compressed = fh.read()
+        assert compressed.count(b'BZh9') >= len(data) // 65536
+        assert bz2.decompress(compressed) == data
+
+        with open(path, 'wb') as fh:
+            writer = ParallelBZ2Writer(fh, 4)
+            writer.close()
+        with open(path, 'rb') as fh:
+            assert bz2.decompress(fh.read()) == b''
+
+
+@pytest.mark.parametrize('compress_threads', (1, 3))
+def test_create_conda_pkg(compress_threads):
+    with TemporaryDirectory() as tmp:
+        prefix = join(tmp, 'prefix')
+        files = ['lib/big.dat', 'lib/small.txt']
+        contents = [os.urandom(100) * 20000, b'small']
+        for f, content in zip(files, contents):
+            touch(join(prefix, f), mkdir=True)
+            with open(join(prefix, f), 'wb') as fh:
+                fh.write(content)
+        if not on_win:
+            os.link(join(prefix, 'lib', 'big.dat'), join(prefix, 'lib', 'hardlink.dat'))
+            files.append('lib/hardlink.dat')
+            contents.append(contents[0])
+
+        tar_path = join(tmp, 'pkg-1.0-0.tar.bz2')
+        info = {'name': 'pkg', 'version': '1.0', 'build': '0'}
+        assert create_conda_pkg(prefix, files, info, tar_path,
+                                compress_threads=compress_threads) == []
+
+        h = hashlib.new('sha1')
+        for f, content in sorted(zip(files, contents)):
+            h.update(f.encode('utf-8') + b'\x00' + content)
+        assert info['file_hash'] == h.hexdigest()
+
+        with tarfile.open(tar_path) as t:
+            assert set(t.getnames()) == set(files) | {'info/files', 'info/index.json'}
+            assert t.extractfile('lib/big.dat').read() == contents[0]
+
+
+@pytest.mark.parametrize('compress_threads', (1, 3))
+def test_create_conda_pkg_removes_partial_package(compress_threads):
+    with TemporaryDirectory() as tmp:
+        prefix = join(tmp, 'prefix')
+        touch(join(prefix, 'lib', 'big.dat'), mkdir=True)
+        with open(join(prefix, 'lib', 'big.dat'), 'wb') as fh:
+            fh.write(os.urandom(100) * 50000)
+
+        def update_info(info):
+            raise KeyboardInterrupt()
+
+        tar_path = join(tmp, 'pkg-1.0-0.tar.bz2')
+        info = {'name': 'pkg', 'version': '1.0', 'build': '0'}
+        with pytest.raises(KeyboardInterrupt):
+            create_conda_pkg(prefix, ['lib/big.dat'], info, tar_path, update_info=update_info,
+                             compress_threads=compress_threads)
+        assert not lexists(tar_path)
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import json
+from logging import getLogger
+import os
+from os.path import join
+
+import pytest
+
+from conda.cli import main_run
+from conda.cli.main_run import _get_activated_env_vars
+from conda.common.compat import on_win
+from conda.common.io import env_var
+from conda.compat import TemporaryDirectory
+from conda.gateways.disk.create import mkdir_p
+
+from ..helpers import mock
+
+log = getLogger(__name__)
+
+
+def _make_env(root):
+    prefix = join(root, 'envs', 'runenv')
+    mkdir_p(join(prefix, 'conda-meta'))
+    with open(join(prefix, 'conda-meta', 'history'), 'w') as fh:
+        fh.write('')
+    return prefix
+
+
+def test_activated_env_vars_in_process():
+    with TemporaryDirectory() as tmp:
+        prefix = _make_env(tmp)
+        with mock.patch.object(main_run, '_check_output') as check_output:
+            env_vars = _get_activated_env_vars(prefix)
+        assert not check_output.called
+        assert env_vars['CONDA_PREFIX'] == prefix
+        assert env_vars['CONDA_DEFAULT_ENV'] == 'runenv'
+        assert env_vars['PATH'].split(os.pathsep)[0].startswith(prefix)
+
+
+@pytest.mark.skipif(on_win, reason="activate.d script is posix shell")
+def test_activated_env_vars_activate_scripts_cached():
+    with TemporaryDirectory() as tmp:
+        prefix = _make_env(tmp)
+        activate_d = join(prefix, 'etc', 'conda', 'activate.d')
+        mkdir_p(activate_d)
+        script = join(activate_d, 'set-var.sh')
+        with open(script, 'w') as fh:
+            fh.write('export RUN_TEST_VAR="$CONDA_PREFIX/one"\n')
+
+        check_output = mock.Mock(side_effect=main_run._check_output)
+        with mock.patch.object(main_run, 'ACTIVATED_ENV_CACHE_DIR', join(tmp, 'cache')), \
+                mock.patch.object(main_run, '_check_output', check_output):
+            env_vars = _get_activated_env_vars(prefix)
+            assert env_vars['RUN_TEST_VAR'] == join(prefix, 'one')
+            assert check_output.call_count == 1
+
+            assert _get_activated_env_vars(prefix) == env_vars
+            assert check_output.call_count == 1
+
+            # only the change made by activation is kept, and only for the user
+            cache_dir = join(tmp, 'cache')
+            cache_path = join(cache_dir, os.listdir(cache_dir)[0])
+            with open(cache_path) as fh:
+                entry = json.load(fh)
+            assert entry['export_vars']['RUN_TEST_VAR'] == join(prefix, 'one')
+            assert 'HOME' not in entry['export_vars']
+            assert os.stat(cache_path).st_mode & 0o777 == 0o600
+            assert os.stat(cache_dir).st_mode & 0o777 == 0o700
+
+            # editing an activate.d script invalidates the cached environment
+            with open(script, 'w') as fh:
+                fh.write('export RUN_TEST_VAR="$CONDA_PREFIX/two-two"\n')
+            env_vars = _get_activated_env_vars(prefix)
+            assert env_vars['RUN_TEST_VAR'] == join(prefix, 'two-two')
+            assert check_output.call_count == 2
+
+            # and so does editing a condarc file
+            condarc = join(tmp, 'condarc')
+            with open(condarc, 'w') as fh:
+                fh.write('changeps1: false\n')
+            with env_var('CONDARC', condarc):
+                _get_activated_env_vars(prefix)
+                assert check_output.call_count == 3
+                with open(condarc, 'w') as fh:
+                    fh.write('changeps1: true\nenv_prompt: ({name})\n')
+                _get_activated_env_vars(prefix)
+                assert check_output.call_count == 4
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+from os.path import join
+import sys
+
+import pytest
+
+from conda.common.os.linux import linux_get_cpu_flags
+from conda.compat import TemporaryDirectory
+
+on_linux = sys.platform.startswith('linux')
+
+
+@pytest.mark.skipif(not on_linux, reason="reads /proc/cpuinfo")
+def test_linux_get_cpu_flags():
+    with TemporaryDirectory() as tmp:
+        cpuinfo_path = join(tmp, 'cpuinfo')
+        with open(cpuinfo_path, 'w') as fh:
+            fh.write("processor\t: 0\n"
+                     "model name\t: Some CPU\n"
+                     "flags\t\t: sse2 fpu avx\n"
+                     "\n"
+                     "processor\t: 1\n"
+                     "flags\t\t: sse2 fpu avx\n")
+        assert linux_get_cpu_flags(cpuinfo_path) == ['avx', 'fpu', 'sse2']
+
+        with open(cpuinfo_path, 'w') as fh:
+            fh.write("processor\t: 0\n"
+                     "Features\t: fp asimd evtstrm\n")
+        assert linux_get_cpu_flags(cpuinfo_path) == ['asimd', 'evtstrm', 'fp']
+
+        with open(cpuinfo_path, 'w') as fh:
+            fh.write("processor\t: 0\n")
+        assert linux_get_cpu_flags(cpuinfo_path) is None
+        assert linux_get_cpu_flags(join(tmp, 'missing')) is None
+
+    # the same flags the vendored cpuinfo module reports
+    from conda._vendor.cpuinfo import _get_cpu_info_from_proc_cpuinfo
+    info = _get_cpu_info_from_proc_cpuinfo()
+    if info.get('flags'):
+        assert linux_get_cpu_flags() == info['flags']
@@ -18,6 +18,11 @@ from shutil import rmtree
 from tempfile import mkdtemp
 from unittest import TestCase
 
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
 
 test_yaml_raw = {
     'file1': dals("""
@@ -297,6 +302,46 @@ class ConfigurationTests(TestCase):
         finally:
             rmtree(tempdir, ignore_errors=True)
 
+    def test_load_raw_configs_cached(self):
+        try:
+            tempdir = mkdtemp()
+            cache_dir = join(tempdir, 'cache')
+            condarcd = join(tempdir, 'condarc.d')
+            mkdir(condarcd)
+            files = ('file3', 'file4', 'file8', 'file9', 'good_boolean_map', 'commented_map')
+            for f in files:
+                with open(join(condarcd, f + '.yml'), 'wb') as fh:
+                    fh.write(test_yaml_raw[f].encode('utf-8'))
+            search_path = [condarcd]
+
+            def _flatten(raw_data):
+                return dict(((source, key), (p.value(None), p.keyflag(), p.valueflags(None)))
+                            for source, params in raw_data.items()
+                            for key, p in params.items())
+
+            parsed = _flatten(load_file_configs(search_path))
+            assert _flatten(load_file_configs(search_path, cache_dir)) == parsed
+            channels = SampleConfiguration(search_path).channels
+
+            class CachedConfiguration(SampleConfiguration):
+                _raw_data_cache_dir = cache_dir
+
+            # the second load comes from the cache without touching the yaml parser
+            with patch('conda.common.configuration.yaml_load', side_effect=AssertionError):
+                assert _flatten(load_file_configs(search_path, cache_dir)) == parsed
+                assert CachedConfiguration(search_path).channels == channels
+
+            # a changed file is parsed again
+            with open(join(condarcd, 'file9.yml'), 'wb') as fh:
+                fh.write(test_yaml_raw['file5'].encode('utf-8'))
+            raw_data = load_file_configs(search_path, cache_dir)
+            channels = raw_data[join(condarcd, 'file9.yml')]['channels']
+            assert channels.keyflag() is None
+            assert channels.value(None) == ('pepé', 'marv', 'sam')
+            assert channels.valueflags(None) == (None, ParameterFlag.top, None)
+        finally:
+            rmtree(tempdir, ignore_errors=True)
+
     def test_important_primitive_map_merges(self):
         raw_data = load_from_string_data('file1', 'file3', 'file2')
         config = SampleConfiguration()._set_raw_data(raw_data)
@@ -4,11 +4,19 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 from logging import getLogger
 
 from conda._vendor.auxlib.ish import dals
-from conda.common.serialize import yaml_dump, yaml_load
+from conda.common.serialize import get_yaml, yaml_dump, yaml_load
 
 log = getLogger(__name__)
 
 
+def test_module_attributes():
+    # imported lazily, but still available from the module
+    from conda.common.serialize import EntityEncoder, yaml
+    from conda._vendor.auxlib.entity import EntityEncoder as auxlib_EntityEncoder
+    assert yaml is get_yaml()
+    assert EntityEncoder is auxlib_EntityEncoder
+
+
 def test_dump():
     obj = dict([
         ('a_seq', [1, 2, 3]),
@@ -15,11 +15,13 @@ from conda.common.io import env_var
 from conda.common.path import paths_equal
 from conda.core.envs_manager import list_all_known_prefixes, register_env, \
     USER_ENVIRONMENTS_TXT_FILE, \
-    unregister_env, _clean_environments_txt
+    unregister_env, _clean_environments_txt, EnvironmentsIndex, query_all_prefixes
+from conda.core.prefix_data import PrefixData
 from conda.gateways.disk import mkdir_p
 from conda.gateways.disk.delete import rm_rf
 from conda.gateways.disk.read import yield_lines
 from conda.gateways.disk.update import touch
+from conda.models.records import PrefixRecord
 
 try:
     from unittest.mock import patch
@@ -89,3 +91,51 @@ class EnvsManagerUnitTests(TestCase):
             cleaned_2 = _clean_environments_txt(environments_txt_path)
             assert cleaned_2 == (self.prefix,)
             assert _rewrite_patch.call_count == 0
+
+    def test_environments_index(self):
+        prefix = join(self.prefix, 'indexed')
+        touch(join(prefix, PREFIX_MAGIC_FILE), mkdir=True)
+        PrefixData(prefix).insert(PrefixRecord(
+            name='foo', version='1.0', build='py_0', build_number=0, channel='conda-forge',
+            subdir='noarch', fn='foo-1.0-py_0.tar.bz2', files=('lib/foo.py',),
+        ))
+        index_file = join(self.prefix, 'environments_index.json')
+
+        environments_index = EnvironmentsIndex(index_file)
+        records = environments_index.package_records(prefix)
+        assert [prec.name for prec in records] == ['foo']
+        environments_index.save([prefix])
+
+        # a fresh index serves the summary without loading conda-meta
+        with patch('conda.core.envs_manager.PrefixData') as prefix_data_patch:
+            assert EnvironmentsIndex(index_file).package_records(prefix) == records
+            assert prefix_data_patch.call_count == 0
+
+        # a transaction in the prefix invalidates the entry
+        with open(join(prefix, PREFIX_MAGIC_FILE), 'a') as fh:
+            fh.write('==> 2018-01-01 00:00:00 <==\n')
+        with patch('conda.core.envs_manager.PrefixData') as prefix_data_patch:
+            prefix_data_patch.return_value.iter_records.return_value = ()
+            assert EnvironmentsIndex(index_file).package_records(prefix) == ()
+            assert prefix_data_patch.call_count == 1
+
+        # prefixes no longer known are dropped
+        environments_index.save([])
+        assert EnvironmentsIndex(index_file)._entries == {}
+
+    def test_query_all_prefixes(self):
+        prefix = join(self.prefix, 'queried')
+        touch(join(prefix, PREFIX_MAGIC_FILE), mkdir=True)
+        PrefixData(prefix).insert(PrefixRecord(
+            name='foo', version='1.0', build='py_0', build_number=0, channel='conda-forge',
+            subdir='noarch', fn='foo-1.0-py_0.tar.bz2', files=('lib/foo.py',),
+        ))
+        index_file = join(self.prefix, 'environments_index.json')
+        with patch('conda.core.envs_manager.USER_ENVIRONMENTS_INDEX_FILE', index_file), \
+                patch('conda.core.envs_manager.list_all_known_prefixes',
+                      return_value=[prefix, self.prefix]):
+            matches = tuple(query_all_prefixes('foo>=1'))
+            assert [(p, [prec.name for prec in precs]) for p, precs in matches] == [
+                (prefix, ['foo'])
+            ]
+            assert not tuple(query_all_prefixes('foo>=2'))
@@ -11,10 +11,12 @@ from conda.base.context import context, reset_context
 from conda.common.compat import iteritems
 from conda.common.io import env_var
 from conda.core.index import check_whitelist, get_index, get_reduced_index
+from conda.core.subdir_data import SubdirData
 from conda.exceptions import ChannelNotAllowed
 from conda.models.channel import Channel
 from conda.models.match_spec import MatchSpec
 from tests.core.test_repodata import platform_in_record
+from tests.helpers import get_index_r_1, get_index_r_4
 
 try:
     from unittest.mock import patch
@@ -46,6 +48,78 @@ def test_check_whitelist():
 
 
 
+def test_get_reduced_index_strict_channel_priority():
+    get_index_r_1(context.subdir)
+    get_index_r_4(context.subdir)
+    channels = (Channel('channel-1'), Channel('channel-4'))
+    specs = (MatchSpec('flask'), MatchSpec('scikit-learn'))
+
+    flexible = get_reduced_index(None, channels, (context.subdir,), specs)
+    with env_var('CONDA_STRICT_CHANNEL_PRIORITY', 'true', reset_context):
+        strict = get_reduced_index(None, channels, (context.subdir,), specs)
+
+    def channels_by_name(reduced_index):
+        result = {}
+        for prec in reduced_index:
+            if not prec.name.endswith('@'):
+                result.setdefault(prec.name, set()).add(prec.channel.canonical_name)
+        return result
+
+    flexible_channels = channels_by_name(flexible)
+    strict_channels = channels_by_name(strict)
+    assert flexible_channels['python'] == {'channel-1', 'channel-4'}
+    for name, channel_names in iteritems(strict_channels):
+        assert len(channel_names) == 1
+        if 'channel-1' in flexible_channels.get(name, ()):
+            assert channel_names == {'channel-1'}
+    assert set(strict) < set(flexible)
+
+
+def test_get_reduced_index_strict_channel_priority_channel_specs():
+    get_index_r_1(context.subdir)
+    get_index_r_4(context.subdir)
+    channels = (Channel('channel-4'), Channel('channel-1'))
+    specs = (MatchSpec('channel-1::python'), MatchSpec('flask'))
+
+    with env_var('CONDA_STRICT_CHANNEL_PRIORITY', 'true', reset_context):
+        strict = get_reduced_index(None, channels, (context.subdir,), specs)
+
+    python_channels = set(prec.channel.canonical_name for prec in strict
+                          if prec.name == 'python')
+    assert python_channels == {'channel-1', 'channel-4'}
+    assert all(prec.channel.canonical_name == 'channel-4' for prec in strict
+               if prec.name == 'flask')
+
+
+def test_get_reduced_index_strict_channel_priority_track_features():
+    get_index_r_1(context.subdir)
+    get_index_r_4(context.subdir)
+    channels = (Channel('channel-4'), Channel('channel-1'))
+    specs = (MatchSpec(track_features='mkl'),)
+    query = SubdirData.query
+
+    def query_track_features(self, spec):
+        # SubdirData.query() only matches track_features specs by name
+        if spec.get_exact_value('name') or not spec.get_exact_value('track_features'):
+            return query(self, spec)
+        if not self._loaded:
+            self.load()
+        return tuple(prec for feature_name in spec.get_exact_value('track_features')
+                     for prec in self._track_features_index[feature_name])
+
+    with env_var('CONDA_STRICT_CHANNEL_PRIORITY', 'true', reset_context), \
+            patch.object(SubdirData, 'query', query_track_features):
+        strict = get_reduced_index(None, channels, (context.subdir,), specs)
+
+    names = set(prec.name for prec in strict)
+    assert 'accelerate' in names
+    # channel-1 mkl carries the mkl feature, but mkl comes from channel-4, so the
+    #   dependencies of channel-1 mkl (mkl-service) aren't collected
+    assert all(prec.channel.canonical_name == 'channel-4' for prec in strict
+               if prec.name == 'mkl')
+    assert 'mkl-service' not in names
+
+
 @pytest.mark.integration
 class GetIndexIntegrationTests(TestCase):
 
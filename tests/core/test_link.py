@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+from logging import getLogger
+from os.path import join
+
+import pytest
+
+from conda.common.compat import on_win, text_type
+from conda.common.io import captured
+from conda.compat import TemporaryDirectory
+from conda.core.link import run_scripts
+from conda.exceptions import LinkError
+from conda.gateways.disk.create import mkdir_p
+from conda.models.records import PackageRecord
+
+log = getLogger(__name__)
+
+
+def _record(name, depends=()):
+    return PackageRecord(name=name, version='1.0', build='0', build_number=0,
+                         channel='conda-forge', subdir='linux-64',
+                         fn='%s-1.0-0.tar.bz2' % name, depends=depends)
+
+
+def _write_script(prefix, name, body):
+    with open(join(prefix, 'bin', '.%s-post-link.sh' % name), 'w') as fh:
+        fh.write(body)
+
+
+@pytest.mark.skipif(on_win, reason="post-link scripts here are posix shell")
+def test_run_scripts_concurrently_in_dependency_order():
+    with TemporaryDirectory() as prefix:
+        mkdir_p(join(prefix, 'bin'))
+        log_path = join(prefix, 'order.log')
+        for name, delay in (('base', '0.5'), ('other', '0.5'), ('child', '0')):
+            _write_script(prefix, name,
+                          'echo "start %s" >> "%s"\n'
+                          'sleep %s\n'
+                          'echo "end %s" >> "%s"\n'
+                          'echo "%s done" >> "$PREFIX/.messages.txt"\n'
+                          % (name, log_path, delay, name, log_path, name))
+        precs = (_record('base'), _record('other'), _record('child', ('base',)),
+                 _record('noscript'))
+
+        assert run_scripts(prefix, precs, 'post-link', max_workers=2) is True
+        with open(log_path) as fh:
+            events = fh.read().split('\n')
+        # independent packages run side by side; child waits for base
+        assert set(events[:2]) == {'start base', 'start other'}
+        assert events.index('start child') > events.index('end base')
+
+        _write_script(prefix, 'other', 'echo "other broke" >> "$PREFIX/.messages.txt"\nexit 1\n')
+        with pytest.raises(LinkError) as exc:
+            run_scripts(prefix, precs, 'post-link', max_workers=2)
+        assert 'other broke' in text_type(exc.value)
+
+
+@pytest.mark.skipif(on_win, reason="post-link scripts here are posix shell")
+def test_run_scripts_reports_script_output():
+    with TemporaryDirectory() as prefix:
+        mkdir_p(join(prefix, 'bin'))
+        _write_script(prefix, 'base', 'echo "hello from base"\necho "warning from base" >&2\n')
+        _write_script(prefix, 'quiet', 'true\n')
+        precs = (_record('base'), _record('quiet'))
+
+        with captured() as c:
+            assert run_scripts(prefix, precs, 'post-link', max_workers=2) is True
+        assert 'post-link script output for conda-forge::base-1.0-0' in c.stdout
+        assert 'hello from base\nwarning from base' in c.stdout
+        # neither the trace of bash -x, nor scripts without output
+        assert '+ echo' not in c.stdout
+        assert 'quiet' not in c.stdout
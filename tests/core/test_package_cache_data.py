@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import hashlib
+import json
+from logging import getLogger
+import os
+from os.path import isdir, join
+import tarfile
+
+import pytest
+
+from conda.base.context import context, reset_context
+from conda.cli.main_clean import _check_pkg_unused
+from conda.common.compat import ensure_binary, on_win
+from conda.common.io import captured, env_var, env_vars
+from conda.common.url import path_to_url
+from conda.compat import TemporaryDirectory
+from conda.core.package_cache_data import (PackageCacheData, PackageContentStore,
+                                           ProgressiveFetchExtract)
+from conda.gateways.disk.create import mkdir_p
+from conda.gateways.disk.delete import rm_rf
+from conda.gateways.disk.read import get_recorded_digest, read_extract_manifest
+from conda.models.match_spec import MatchSpec
+
+from ..helpers import mock
+
+log = getLogger(__name__)
+
+
+def basename_without_ext(url):
+    return url.rsplit('/', 1)[-1][:-len('.tar.bz2')]
+
+
+def _make_tarball(channel_dir, name, files=None):
+    # files maps short paths to their content, and is recorded in info/paths.json
+    fn = '%s-1.0-0.tar.bz2' % name
+    pkg_dir = join(channel_dir, name)
+    info_dir = join(pkg_dir, 'info')
+    mkdir_p(info_dir)
+    with open(join(info_dir, 'index.json'), 'wb') as fh:
+        fh.write(ensure_binary(json.dumps({
+            'name': name, 'version': '1.0', 'build': '0', 'build_number': 0,
+            'depends': [], 'subdir': context.subdir,
+        })))
+    with open(join(info_dir, 'files'), 'w') as fh:
+        fh.write('\n'.join(sorted(files or ())))
+    if files:
+        paths = []
+        for short_path, content in sorted(files.items()):
+            mkdir_p(join(pkg_dir, os.path.dirname(short_path)))
+            with open(join(pkg_dir, short_path), 'wb') as fh:
+                fh.write(content)
+            paths.append({'_path': short_path, 'path_type': 'hardlink',
+                          'sha256': hashlib.sha256(content).hexdigest(),
+                          'size_in_bytes': len(content)})
+        with open(join(info_dir, 'paths.json'), 'w') as fh:
+            json.dump({'paths_version': 1, 'paths': paths}, fh)
+    with tarfile.open(join(channel_dir, fn), 'w:bz2') as t:
+        for entry in sorted(os.listdir(pkg_dir)):
+            t.add(join(pkg_dir, entry), entry)
+    return path_to_url(join(channel_dir, fn))
+
+
+def test_fetch_extract_concurrently():
+    with TemporaryDirectory() as tmp:
+        channel_dir = join(tmp, 'channel', context.subdir)
+        pkgs_dir = join(tmp, 'pkgs')
+        urls = [_make_tarball(channel_dir, 'pkg%d' % q) for q in range(6)]
+        specs = [MatchSpec(url) for url in urls]
+
+        with env_var('CONDA_PKGS_DIRS', pkgs_dir, reset_context):
+            PackageCacheData.clear()
+            try:
+                pfe = ProgressiveFetchExtract(specs)
+                pfe.execute(max_workers=3)
+                for q, spec in enumerate(specs):
+                    assert isdir(join(pkgs_dir, 'pkg%d-1.0-0' % q, 'info'))
+                    pcrecs = list(PackageCacheData.query_all(spec))
+                    assert [pcrec.name for pcrec in pcrecs] == ['pkg%d' % q]
+                    assert pcrecs[0].is_extracted
+
+                # the filename index tracks removals and re-inserts
+                pcache = PackageCacheData(pkgs_dir)
+                pcrec = pcache.remove(pcrecs[0])
+                assert not list(pcache.query(specs[-1]))
+                pcache.insert(pcrec)
+                assert list(pcache.query(specs[-1])) == [pcrec]
+                assert len(list(pcache.query(MatchSpec('pkg*')))) == len(specs)
+
+                # a fresh scan of the package cache finds the same records
+                PackageCacheData.clear()
+                assert len(list(PackageCacheData(pkgs_dir).query(specs[0]))) == 1
+            finally:
+                PackageCacheData.clear()
+
+
+def test_fetch_extract_concurrently_json_progress():
+    with TemporaryDirectory() as tmp:
+        channel_dir = join(tmp, 'channel', context.subdir)
+        pkgs_dir = join(tmp, 'pkgs')
+        specs = [MatchSpec(_make_tarball(channel_dir, 'pkg%d' % q)) for q in range(3)]
+
+        with env_vars({'CONDA_PKGS_DIRS': pkgs_dir, 'CONDA_JSON': 'true'}, reset_context):
+            PackageCacheData.clear()
+            try:
+                with captured() as c:
+                    ProgressiveFetchExtract(specs).execute(max_workers=3)
+            finally:
+                PackageCacheData.clear()
+
+        # each package still reports its own progress records
+        records = [json.loads(line) for line in c.stdout.split('\0') if line.strip()]
+        finished = [record['fetch'].split()[0] for record in records if record['finished']]
+        assert sorted(finished) == ['pkg%d-1.0' % q for q in range(3)]
+
+
+@pytest.mark.skipif(on_win, reason="compares inode numbers")
+def test_content_store_dedups_across_pkgs_dirs():
+    with TemporaryDirectory() as tmp:
+        channel_dir = join(tmp, 'channel', context.subdir)
+        store_dir = join(tmp, 'store')
+        shared, unique = b'shared content\n' * 100, b'unique'
+        url_1 = _make_tarball(channel_dir, 'one', {'lib/shared.txt': shared, 'lib/one.txt': unique})
+        url_2 = _make_tarball(channel_dir, 'two', {'share/shared.txt': shared})
+
+        extracted = []
+        for url, pkgs_dir in ((url_1, join(tmp, 'pkgs1')), (url_2, join(tmp, 'pkgs2'))):
+            with env_var('CONDA_PKGS_DIRS', pkgs_dir, reset_context):
+                with env_var('CONDA_CONTENT_STORE_DIR', store_dir, reset_context):
+                    PackageCacheData.clear()
+                    try:
+                        ProgressiveFetchExtract([MatchSpec(url)]).execute()
+                    finally:
+                        PackageCacheData.clear()
+            extracted.append(join(pkgs_dir, basename_without_ext(url)))
+
+        st_1 = os.lstat(join(extracted[0], 'lib', 'shared.txt'))
+        st_2 = os.lstat(join(extracted[1], 'share', 'shared.txt'))
+        assert st_1.st_ino == st_2.st_ino
+        assert st_1.st_nlink == 3
+        with open(join(extracted[1], 'share', 'shared.txt'), 'rb') as fh:
+            assert fh.read() == shared
+        # files swapped for links into the store are left out of the extract manifest
+        assert 'share/shared.txt' not in read_extract_manifest(extracted[1])['paths']
+        entry = read_extract_manifest(extracted[0])['paths']['lib/shared.txt']
+        assert get_recorded_digest(entry, join(extracted[0], 'lib', 'shared.txt')) == \
+            hashlib.sha256(shared).hexdigest()
+
+        store = PackageContentStore(store_dir)
+        assert os.lstat(join(extracted[0], 'lib', 'one.txt')).st_nlink == 2
+        assert len(store.stored_inodes(extracted[0])) == 2
+
+        # links from the store and from other cached packages don't keep a package, but a link
+        #   from an environment keeps every package sharing the file
+        shared_path = join(extracted[1], 'share', 'shared.txt')
+        pkgs_dirs = ','.join((join(tmp, 'pkgs1'), join(tmp, 'pkgs2')))
+        with env_var('CONDA_PKGS_DIRS', pkgs_dirs, reset_context):
+            with env_var('CONDA_CONTENT_STORE_DIR', store_dir, reset_context):
+                assert _check_pkg_unused(extracted[0])[0] is True
+                assert _check_pkg_unused(extracted[1])[0] is True
+                os.link(shared_path, join(tmp, 'linked-into-env.txt'))
+                assert _check_pkg_unused(extracted[0])[0] is False
+                assert _check_pkg_unused(extracted[1])[0] is False
+                os.unlink(join(tmp, 'linked-into-env.txt'))
+
+        rm_rf(extracted[0])
+        assert store.prune() == len(unique)
+        assert os.lstat(shared_path).st_nlink == 2
+
+
+@pytest.mark.skipif(on_win, reason="compares inode numbers")
+def test_content_store_replaces_modified_copy():
+    with TemporaryDirectory() as tmp:
+        channel_dir = join(tmp, 'channel', context.subdir)
+        store_dir = join(tmp, 'store')
+        shared = b'shared content\n' * 100
+        url_1 = _make_tarball(channel_dir, 'one', {'lib/shared.txt': shared})
+        url_2 = _make_tarball(channel_dir, 'two', {'lib/shared.txt': shared})
+
+        extracted = []
+        for url in (url_1, url_2):
+            with env_var('CONDA_PKGS_DIRS', join(tmp, 'pkgs'), reset_context):
+                with env_var('CONDA_CONTENT_STORE_DIR', store_dir, reset_context):
+                    PackageCacheData.clear()
+                    try:
+                        ProgressiveFetchExtract([MatchSpec(url)]).execute()
+                    finally:
+                        PackageCacheData.clear()
+            extracted.append(join(tmp, 'pkgs', basename_without_ext(url)))
+            if len(extracted) == 1:
+                # modified in place through a link, e.g. from an environment
+                with open(join(extracted[0], 'lib', 'shared.txt'), 'r+b') as fh:
+                    fh.write(b'EVIL')
+
+        path_2 = join(extracted[1], 'lib', 'shared.txt')
+        with open(path_2, 'rb') as fh:
+            assert fh.read() == shared
+        store_path = PackageContentStore(store_dir).store_path(
+            hashlib.sha256(shared).hexdigest(), os.lstat(path_2).st_mode & 0o7777)
+        assert os.lstat(store_path).st_ino == os.lstat(path_2).st_ino
+        assert os.lstat(join(extracted[0], 'lib', 'shared.txt')).st_ino != os.lstat(path_2).st_ino
+
+        # the extract manifests hold the digest of what's actually on disk
+        entry = read_extract_manifest(extracted[1])['paths']['lib/shared.txt']
+        assert get_recorded_digest(entry, path_2) == hashlib.sha256(shared).hexdigest()
+        path_1 = join(extracted[0], 'lib', 'shared.txt')
+        entry = read_extract_manifest(extracted[0])['paths'].get('lib/shared.txt')
+        assert get_recorded_digest(entry, path_1) != hashlib.sha256(shared).hexdigest()
+
+
+@pytest.mark.skipif(on_win, reason="compares inode numbers")
+def test_content_store_skips_other_users_files():
+    with TemporaryDirectory() as tmp:
+        channel_dir = join(tmp, 'channel', context.subdir)
+        store_dir = join(tmp, 'store')
+        shared = b'shared content\n' * 100
+        urls = [_make_tarball(channel_dir, name, {'lib/shared.txt': shared})
+                for name in ('one', 'two')]
+
+        extracted = []
+        for q, url in enumerate(urls):
+            # the second package is extracted by another user
+            uid = os.getuid() + q
+            with env_var('CONDA_PKGS_DIRS', join(tmp, 'pkgs'), reset_context):
+                with env_var('CONDA_CONTENT_STORE_DIR', store_dir, reset_context):
+                    PackageCacheData.clear()
+                    try:
+                        with mock.patch.object(os, 'getuid', return_value=uid):
+                            ProgressiveFetchExtract([MatchSpec(url)]).execute()
+                    finally:
+                        PackageCacheData.clear()
+            extracted.append(join(tmp, 'pkgs', basename_without_ext(url)))
+
+        assert os.lstat(join(extracted[0], 'lib', 'shared.txt')).st_nlink == 2
+        assert os.lstat(join(extracted[1], 'lib', 'shared.txt')).st_nlink == 1
@@ -1,12 +1,15 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+from contextlib import contextmanager
 from logging import getLogger
 from os.path import basename, dirname, isdir, isfile, join, lexists, getsize
 from shlex import split as shlex_split
 from subprocess import check_output
 import sys
 from tempfile import gettempdir
+from threading import Event, Thread
+from time import sleep
 from unittest import TestCase
 from uuid import uuid4
 
@@ -21,16 +24,22 @@ from conda.common.io import env_var
 from conda.common.path import get_bin_directory_short_path, get_python_noarch_target_path, \
     get_python_short_path, get_python_site_packages_short_path, parse_entry_point_def, pyc_path, \
     win_path_ok
-from conda.core.path_actions import CompilePycAction, CreatePythonEntryPointAction, LinkPathAction
+from conda.compat import TemporaryDirectory
+from conda.core.package_cache_data import PackageCacheData
+from conda.core.path_actions import (CacheUrlAction, CompilePycAction,
+                                     CreatePythonEntryPointAction, ExtractPackageAction,
+                                     LinkPathAction, _package_lock_path)
 from conda.exceptions import ParseError
-from conda.gateways.disk.create import create_link, mkdir_p
+from conda.gateways.disk.create import create_link, mkdir_p, write_as_json_to_file
 from conda.gateways.disk.delete import rm_rf
 from conda.gateways.disk.link import islink, stat_nlink
+from conda.gateways.disk.lock import advisory_lock
 from conda.gateways.disk.permissions import is_executable
 from conda.gateways.disk.read import compute_md5sum, compute_sha256sum
 from conda.gateways.disk.test import softlink_supported
 from conda.gateways.disk.update import touch
 from conda.models.enums import LinkType, NoarchType, PathType
+from conda.models.match_spec import MatchSpec
 from conda.models.records import PathDataV1
 
 try:
@@ -41,6 +50,48 @@ except ImportError:
 log = getLogger(__name__)
 
 
+@pytest.mark.skipif(on_win, reason="advisory locks need fcntl")
+def test_advisory_lock():
+    with TemporaryDirectory() as tmp:
+        lock_path = join(tmp, 'locks', 'foo-1.0-0.lock')
+        events = []
+        acquired = Event()
+
+        def hold_lock():
+            with advisory_lock(lock_path):
+                events.append('first')
+                acquired.set()
+                sleep(0.2)
+                events.append('first done')
+
+        t = Thread(target=hold_lock)
+        t.start()
+        acquired.wait()
+        with advisory_lock(lock_path):
+            events.append('second')
+        t.join()
+        assert events == ['first', 'first done', 'second']
+
+
+@contextmanager
+def held_by_another_process(lock_path):
+    # makes the caller's advisory_lock(lock_path) wait; a thread stands in for the process
+    acquired = Event()
+
+    def hold_lock():
+        with advisory_lock(lock_path):
+            acquired.set()
+            sleep(0.2)
+
+    t = Thread(target=hold_lock)
+    t.start()
+    acquired.wait()
+    try:
+        yield
+    finally:
+        t.join()
+
+
 def make_test_file(target_dir, suffix='', contents=''):
     if not isdir(target_dir):
         mkdir_p(target_dir)
@@ -338,7 +389,68 @@ class PathActionsTests(TestCase):
         axn.reverse()
         assert not lexists(axn.target_full_path)
 
-    # @pytest.mark.skipif(on_win, reason="unix-only test")
+    @pytest.mark.skipif(on_win, reason="advisory locks need fcntl")
+    def test_CacheUrlAction_reuses_tarball_fetched_by_another_process(self):
+        tarball_path = make_test_file(self.pkgs_dir, suffix='.tar.bz2')
+        md5sum = compute_md5sum(tarball_path)
+        axn = CacheUrlAction('https://conda.example.com/linux-64/' + basename(tarball_path),
+                             self.pkgs_dir, basename(tarball_path), md5sum=md5sum)
+        axn.verify()
+        lock_path = _package_lock_path(self.pkgs_dir, basename(tarball_path))
+        with patch('conda.gateways.connection.download.download',
+                   side_effect=AssertionError):
+            with held_by_another_process(lock_path):
+                axn.execute()
+        axn.cleanup()
+        assert compute_md5sum(tarball_path) == md5sum
+        assert isfile(lock_path)
+
+    @pytest.mark.skipif(on_win, reason="advisory locks need fcntl")
+    def test_ExtractPackageAction_reuses_package_extracted_by_another_process(self):
+        extracted_dir = join(self.pkgs_dir, 'foo-1.0-0')
+        mkdir_p(join(extracted_dir, 'info'))
+        write_as_json_to_file(join(extracted_dir, 'info', 'repodata_record.json'), {
+            'name': 'foo', 'version': '1.0', 'build': '0', 'build_number': 0,
+            'channel': 'https://conda.example.com', 'subdir': 'linux-64',
+            'fn': 'foo-1.0-0.tar.bz2', 'md5': 'a' * 32,
+        })
+        lock_path = _package_lock_path(self.pkgs_dir, 'foo-1.0-0')
+        axn = ExtractPackageAction(join(self.pkgs_dir, 'foo-1.0-0.tar.bz2'), self.pkgs_dir,
+                                   'foo-1.0-0', MatchSpec('foo'), 'a' * 32)
+        axn.verify()
+
+        # an incomplete package is extracted again
+        with patch('conda.core.path_actions.extract_tarball', side_effect=AssertionError):
+            with held_by_another_process(lock_path):
+                with pytest.raises(AssertionError):
+                    axn.execute()
+        axn.reverse()
+        for fn in ('index.json', 'paths.json'):
+            write_as_json_to_file(join(extracted_dir, 'info', fn), {})
+
+        # so is a complete one, when the lock didn't have to be waited on
+        with patch('conda.core.path_actions.extract_tarball', side_effect=AssertionError):
+            with pytest.raises(AssertionError):
+                axn.execute()
+        axn.reverse()
+
+        with patch('conda.core.path_actions.extract_tarball', side_effect=AssertionError):
+            with held_by_another_process(lock_path):
+                axn.execute()
+        pcrec = next(PackageCacheData(self.pkgs_dir).query(MatchSpec('foo')))
+        assert pcrec.extracted_package_dir == extracted_dir
+        axn.reverse()
+        assert isdir(extracted_dir)
+        PackageCacheData._cache_.pop(self.pkgs_dir)
+
+        # a different tarball is extracted again
+        axn = ExtractPackageAction(join(self.pkgs_dir, 'foo-1.0-0.tar.bz2'), self.pkgs_dir,
+                                   'foo-1.0-0', MatchSpec('foo'), 'b' * 32)
+        with patch('conda.core.path_actions.extract_tarball', side_effect=AssertionError):
+            with held_by_another_process(lock_path):
+                with pytest.raises(AssertionError):
+                    axn.execute()
+
     # def test_CreateApplicationSoftlinkAction_basic_symlink_unix(self):
     #     from conda.core.path_actions import CreateApplicationSoftlinkAction
     #
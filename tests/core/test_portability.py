@@ -1,10 +1,24 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, division, print_function, unicode_literals
 
-from conda.core.portability import SHEBANG_REGEX, replace_long_shebang
+from conda.common.compat import on_win
+from conda.core.portability import SHEBANG_REGEX, _PaddingError, \
+    get_recorded_placeholder_offsets, record_placeholder_offsets, replace_long_shebang, \
+    update_prefix
+from conda.gateways.disk.create import write_as_json_to_file
+from conda.gateways.disk.read import read_prefix_offsets
+from conda.models.enums import PathType
+from conda.models.records import PathDataV1, PathsData
 from conda.models.enums import FileMode
 from logging import getLogger
+import os
+from os import makedirs
+from os.path import join
+import pytest
 import re
+import shutil
+import tempfile
+from time import time
 from unittest import TestCase
 
 log = getLogger(__name__)
@@ -76,3 +90,184 @@ class ReplaceShebangTests(TestCase):
         new_shebang = b"#!/usr/bin/env escaped\\ space --and --flags -x"
         new_expected_data = b'\n'.join((new_shebang, content_line, content_line, content_line))
         assert new_expected_data == new_data
+
+
+def _regex_binary_replace(data, a, b):
+    # the original regex-based implementation, kept as a reference for the mmap engine
+    def replace(match):
+        occurances = match.group().count(a)
+        padding = (len(a) - len(b)) * occurances
+        if padding < 0:
+            raise _PaddingError
+        return match.group().replace(a, b) + b'\0' * padding
+    return re.sub(re.escape(a) + b'([^\0]*?)\0', replace, data)
+
+
+class PlaceholderOffsetsTests(TestCase):
+
+    placeholder = '/opt/anaconda1anaconda2anaconda3'
+
+    def setUp(self):
+        self.pkg_dir = tempfile.mkdtemp()
+        makedirs(join(self.pkg_dir, 'info'))
+        makedirs(join(self.pkg_dir, 'bin'))
+        makedirs(join(self.pkg_dir, 'lib'))
+        self.script = (b'#!/opt/anaconda1anaconda2anaconda3/bin/python\n'
+                       b'x=/opt/anaconda1anaconda2anaconda3\n')
+        self.library = b'\x7fELF/opt/anaconda1anaconda2anaconda3/lib\0junk\0'
+        with open(join(self.pkg_dir, 'bin', 'script'), 'wb') as fh:
+            fh.write(self.script)
+        with open(join(self.pkg_dir, 'lib', 'libfoo.so'), 'wb') as fh:
+            fh.write(self.library)
+        with open(join(self.pkg_dir, 'lib', 'plain.txt'), 'wb') as fh:
+            fh.write(b'/opt/anaconda1anaconda2anaconda3')
+        self.paths_data = PathsData(paths_version=1, paths=(
+            PathDataV1(_path='bin/script', path_type=PathType.hardlink,
+                       prefix_placeholder=self.placeholder, file_mode=FileMode.text),
+            PathDataV1(_path='lib/libfoo.so', path_type=PathType.hardlink,
+                       prefix_placeholder=self.placeholder, file_mode=FileMode.binary),
+            PathDataV1(_path='lib/plain.txt', path_type=PathType.hardlink),
+        ))
+
+    def tearDown(self):
+        shutil.rmtree(self.pkg_dir)
+
+    def _record(self):
+        prefix_offsets = record_placeholder_offsets(self.pkg_dir, self.paths_data)
+        write_as_json_to_file(join(self.pkg_dir, 'info', 'prefix_offsets.json'), prefix_offsets)
+        return read_prefix_offsets(self.pkg_dir)
+
+    def test_record_and_read(self):
+        prefix_offsets = self._record()
+        assert sorted(prefix_offsets) == ['bin/script', 'lib/libfoo.so']
+        assert prefix_offsets['bin/script']['offsets'] == [2, 48]
+        assert prefix_offsets['lib/libfoo.so']['offsets'] == [4]
+        assert prefix_offsets['lib/libfoo.so']['size'] == len(self.library)
+
+    def test_missing_sidecar(self):
+        assert read_prefix_offsets(self.pkg_dir) == {}
+
+    def test_update_prefix_with_offsets(self):
+        prefix_offsets = self._record()
+        for short_path, mode in (('bin/script', FileMode.text),
+                                 ('lib/libfoo.so', FileMode.binary)):
+            if on_win and mode == FileMode.binary:
+                continue
+            full_path = join(self.pkg_dir, short_path)
+            offsets = get_recorded_placeholder_offsets(prefix_offsets[short_path], full_path,
+                                                       self.placeholder)
+            assert offsets
+            with open(full_path, 'rb') as fh:
+                original = fh.read()
+            update_prefix(full_path, '/usr/local', self.placeholder, mode, offsets)
+            with open(full_path, 'rb') as fh:
+                data = fh.read()
+            assert self.placeholder.encode('utf-8') not in data
+            if mode == FileMode.binary:
+                assert data == _regex_binary_replace(original, self.placeholder.encode('utf-8'),
+                                                     b'/usr/local')
+            else:
+                assert data == original.replace(self.placeholder.encode('utf-8'), b'/usr/local')
+
+    def test_stale_entry_ignored(self):
+        prefix_offsets = self._record()
+        full_path = join(self.pkg_dir, 'bin', 'script')
+        with open(full_path, 'wb') as fh:
+            fh.write(b'#!/bin/sh\n' + self.script)
+        assert get_recorded_placeholder_offsets(prefix_offsets['bin/script'], full_path,
+                                                self.placeholder) is None
+        assert get_recorded_placeholder_offsets(prefix_offsets['lib/libfoo.so'],
+                                                join(self.pkg_dir, 'lib', 'libfoo.so'),
+                                                '/other/placeholder') is None
+
+    def test_wrong_offsets_fall_back_to_scan(self):
+        full_path = join(self.pkg_dir, 'bin', 'script')
+        update_prefix(full_path, '/usr/local', self.placeholder, FileMode.text, [3, 49])
+        with open(full_path, 'rb') as fh:
+            data = fh.read()
+        assert data == self.script.replace(self.placeholder.encode('utf-8'), b'/usr/local')
+
+
+@pytest.mark.skipif(on_win, reason="no binary replacement done on win")
+class BinaryPrefixInPlaceTests(TestCase):
+
+    placeholder = '/opt/anaconda1anaconda2anaconda3'
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = join(self.tmpdir, 'libfoo.so')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _write(self, data):
+        with open(self.path, 'wb') as fh:
+            fh.write(data)
+
+    def _read(self):
+        with open(self.path, 'rb') as fh:
+            return fh.read()
+
+    def test_replace_multiple_strings(self):
+        data = (b'\x7fELF' + b'\x01' * 100
+                + b'/opt/anaconda1anaconda2anaconda3/lib:/opt/anaconda1anaconda2anaconda3/x\0'
+                + b'junk\0\0/opt/anaconda1anaconda2anaconda3\0tail')
+        self._write(data)
+        update_prefix(self.path, '/usr/local', self.placeholder, FileMode.binary)
+        new_data = self._read()
+        assert len(new_data) == len(data)
+        assert new_data == _regex_binary_replace(data, self.placeholder.encode('utf-8'),
+                                                 b'/usr/local')
+        assert b'/usr/local/lib:/usr/local/x\0' in new_data
+
+    def test_no_placeholder_skips_write(self):
+        data = b'\x7fELF no placeholder here\0'
+        self._write(data)
+        os.utime(self.path, (1, 1))
+        update_prefix(self.path, '/usr/local', self.placeholder, FileMode.binary)
+        assert self._read() == data
+        assert os.stat(self.path).st_mtime == 1
+
+    def test_unterminated_placeholder_ignored(self):
+        data = b'\x7fELF/opt/anaconda1anaconda2anaconda3/lib'
+        self._write(data)
+        update_prefix(self.path, '/usr/local', self.placeholder, FileMode.binary)
+        assert self._read() == data
+
+    def test_empty_file(self):
+        self._write(b'')
+        update_prefix(self.path, '/usr/local', self.placeholder, FileMode.binary)
+        assert self._read() == b''
+
+    def test_padding_error_leaves_file_untouched(self):
+        data = b'/opt/anaconda1anaconda2anaconda3/a\0/opt/anaconda1anaconda2anaconda3\0'
+        self._write(data)
+        with pytest.raises(_PaddingError):
+            update_prefix(self.path, '/usr/local/' + 'x' * 40, self.placeholder,
+                          FileMode.binary)
+        assert self._read() == data
+
+    @pytest.mark.slow
+    def test_benchmark_large_binary(self):
+        # synthetic 64 MB shared library with a few hundred embedded prefix strings
+        placeholder = self.placeholder.encode('utf-8')
+        chunk = os.urandom(1 << 16).replace(b'/opt', b'/xpt')
+        blocks = []
+        for q in range(1024):
+            blocks.append(chunk)
+            if q % 4 == 0:
+                blocks.append(b'\0' + placeholder + b'/lib/libmkl_%d.so\0' % q)
+        data = b''.join(blocks)
+        self._write(data)
+
+        start = time()
+        expected = _regex_binary_replace(data, placeholder, b'/usr/local')
+        regex_time = time() - start
+
+        start = time()
+        update_prefix(self.path, '/usr/local', self.placeholder, FileMode.binary)
+        mmap_time = time() - start
+
+        log.info("binary prefix replacement of %d bytes: regex %.3fs, mmap %.3fs",
+                 len(data), regex_time, mmap_time)
+        assert self._read() == expected
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import json
+from logging import getLogger
+from os.path import isfile, join
+
+from conda.base.constants import PREFIX_MAGIC_FILE
+from conda.common.serialize import json_dump
+from conda.compat import TemporaryDirectory
+from conda.core.prefix_data import PrefixData, delete_prefix_from_linked_data
+from conda.gateways.disk.update import touch
+from conda.models.enums import FileMode, LinkType, PathType
+from conda.models.records import Link, PathDataV1, PathsData, PrefixRecord
+
+log = getLogger(__name__)
+
+
+def _prefix_record(name):
+    paths = (
+        PathDataV1(_path='bin/%s' % name, path_type=PathType.hardlink, sha256='a' * 64,
+                   size_in_bytes=10, prefix_placeholder='/opt/placeholder',
+                   file_mode=FileMode.text),
+        PathDataV1(_path='lib/%s.so' % name, path_type=PathType.softlink, no_link=True),
+        PathDataV1(_path='share/%s' % name, path_type=PathType.directory,
+                   sha256_in_prefix=None, inode_paths=('share/other',)),
+    )
+    return PrefixRecord(name=name, version='1.0', build='0', build_number=0,
+                        channel='conda-forge', subdir='linux-64', fn='%s-1.0-0.tar.bz2' % name,
+                        files=[p.path for p in paths], depends=['python'],
+                        paths_data=PathsData(paths_version=1, paths=paths),
+                        link=Link(source='/pkgs/%s-1.0-0' % name, type=LinkType.hardlink),
+                        requested_spec='%s' % name)
+
+
+def test_deferred_prefix_record_writes():
+    with TemporaryDirectory() as prefix:
+        touch(join(prefix, PREFIX_MAGIC_FILE), mkdir=True)
+        conda_meta_dir = join(prefix, 'conda-meta')
+        prefix_data = PrefixData(prefix)
+        try:
+            prefix_data.insert(_prefix_record('foo'), defer_write=True)
+            prefix_data.insert(_prefix_record('bar'), defer_write=True)
+            assert prefix_data.is_tracked('bin/foo')
+            assert not isfile(join(conda_meta_dir, 'foo-1.0-0.json'))
+
+            # removing a record before it is written leaves nothing to write
+            prefix_data.remove('bar')
+            prefix_data.flush()
+            assert not isfile(join(conda_meta_dir, 'bar-1.0-0.json'))
+
+            record_path = join(conda_meta_dir, 'foo-1.0-0.json')
+            with open(record_path) as fh:
+                content = fh.read()
+            assert '\n' not in content
+            assert json.loads(content) == json.loads(json_dump(_prefix_record('foo')))
+
+            delete_prefix_from_linked_data(prefix)
+            loaded = PrefixData(prefix).get('foo')
+            assert loaded == _prefix_record('foo')
+            assert [rec.name for rec in PrefixData(prefix).iter_path_owners('bin/foo')] == ['foo']
+        finally:
+            delete_prefix_from_linked_data(prefix)
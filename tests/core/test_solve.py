@@ -14,9 +14,12 @@ import pytest
 
 from conda.base.context import context, reset_context, Context
 from conda.common.io import env_var, env_vars, stderr_log_level, captured
+from conda.compat import TemporaryDirectory
 from conda.core.prefix_data import PrefixData
 from conda.core.solve import DepsModifier, Solver, UpdateModifier
-from conda.exceptions import UnsatisfiableError, SpecsConfigurationConflictError
+from conda.core.subdir_data import SubdirData
+from conda.exceptions import ChannelNotAllowed, SpecsConfigurationConflictError, \
+    UnsatisfiableError
 from conda.history import History
 from conda.models.channel import Channel
 from conda.models.records import PrefixRecord
@@ -152,6 +155,77 @@ def test_solve_1():
         assert convert_to_dist_str(final_state) == order
 
 
+def test_solve_cache():
+    specs = MatchSpec("numpy"),
+    get_index_r_1(context.subdir)
+    sd = SubdirData(Channel('https://conda.anaconda.org/channel-1/%s' % context.subdir))
+
+    with TemporaryDirectory() as cache_dir, patch('conda.core.solve.SOLVE_CACHE_DIR', cache_dir):
+        # without an etag or mod header the repodata state is unknown, so nothing is cached
+        with get_solver(specs) as solver:
+            final_state_1 = solver.solve_final_state()
+        assert not os.listdir(cache_dir)
+
+        with patch.dict(sd._internal_state, {'_etag': '"etag-1"'}):
+            with get_solver(specs) as solver:
+                assert tuple(solver.solve_final_state()) == tuple(final_state_1)
+            assert len(os.listdir(cache_dir)) == 1
+
+            with get_solver(specs) as solver, \
+                    patch.object(Solver, '_run_sat', side_effect=AssertionError):
+                final_state_2 = solver.solve_final_state()
+            assert convert_to_dist_str(final_state_2) == convert_to_dist_str(final_state_1)
+
+            # installed records come back merged with their repodata record
+            specs_to_add = MatchSpec("python=3"),
+            with get_solver(specs_to_add=specs_to_add, prefix_records=final_state_1,
+                            history_specs=specs) as solver:
+                final_state_3 = solver.solve_final_state()
+            with get_solver(specs_to_add=specs_to_add, prefix_records=final_state_1,
+                            history_specs=specs) as solver, \
+                    patch.object(Solver, '_run_sat', side_effect=AssertionError):
+                final_state_4 = solver.solve_final_state()
+            assert convert_to_dist_str(final_state_4) == convert_to_dist_str(final_state_3)
+            assert all(isinstance(prec, PrefixRecord) for prec in final_state_4)
+
+            # the key of an UPDATE_DEPS solve is taken before the solver changes its specs
+            with get_solver(specs, prefix_records=final_state_1,
+                            history_specs=specs) as solver:
+                final_state_5 = solver.solve_final_state(
+                    update_modifier=UpdateModifier.UPDATE_DEPS, prune=True)
+            with get_solver(specs, prefix_records=final_state_1,
+                            history_specs=specs) as solver, \
+                    patch.object(Solver, '_run_sat', side_effect=AssertionError):
+                final_state_6 = solver.solve_final_state(
+                    update_modifier=UpdateModifier.UPDATE_DEPS, prune=True)
+            assert convert_to_dist_str(final_state_6) == convert_to_dist_str(final_state_5)
+
+            # a channel that's no longer allowed isn't served from the cache
+            with env_var("CONDA_WHITELIST_CHANNELS", "channel-2", reset_context):
+                with get_solver(specs) as solver:
+                    with pytest.raises(ChannelNotAllowed):
+                        solver.solve_final_state()
+            with get_solver(specs) as solver, \
+                    patch('conda.core.solve.check_whitelist',
+                          side_effect=ChannelNotAllowed(sd.channel)):
+                with pytest.raises(ChannelNotAllowed):
+                    solver.solve_final_state()
+
+            # the cache can be turned off
+            with env_var("CONDA_SOLVE_CACHE_ENABLED", "false", reset_context):
+                with get_solver(specs) as solver, \
+                        patch.object(Solver, '_run_sat', side_effect=AssertionError):
+                    with pytest.raises(AssertionError):
+                        solver.solve_final_state()
+
+        # new repodata is a cache miss
+        with patch.dict(sd._internal_state, {'_etag': '"etag-2"'}):
+            with get_solver(specs) as solver, \
+                    patch.object(Solver, '_run_sat', side_effect=AssertionError):
+                with pytest.raises(AssertionError):
+                    solver.solve_final_state()
+
+
 def test_prune_1():
     specs = MatchSpec("numpy=1.6"), MatchSpec("python=2.7.3"), MatchSpec("accelerate"),
 
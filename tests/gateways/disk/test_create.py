@@ -1,5 +1,163 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, division, print_function, unicode_literals
+import bz2
+import hashlib
+from io import BytesIO
 from logging import getLogger
+import os
+from os.path import isfile, join
+import tarfile
+
+import pytest
+
+from conda.common.compat import on_win
+from conda.compat import TemporaryDirectory
+from conda.gateways.disk.create import (_do_copy, _do_reflink, create_link, extract_tarball,
+                                        reflink, write_extract_manifest)
+from conda.gateways.disk.link import islink, symlink
+from conda.gateways.disk.read import get_recorded_digest, read_extract_manifest
+from conda.gateways.disk.test import reflink_supported
+from conda.models.enums import LinkType
+
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
 
 log = getLogger(__name__)
+
+
+def _write_file(path, content):
+    with open(path, "w") as fh:
+        fh.write(content)
+
+
+def test_reflink_falls_back_to_copy():
+    with TemporaryDirectory() as td:
+        src = join(td, 'src')
+        dst = join(td, 'dst')
+        _write_file(src, 'some content')
+        create_link(src, dst, LinkType.reflink)
+        assert isfile(dst) and not islink(dst)
+        assert os.stat(src).st_ino != os.stat(dst).st_ino
+        with open(dst) as fh:
+            assert fh.read() == 'some content'
+
+        # writing to the clone never touches the source
+        _write_file(dst, 'other content')
+        with open(src) as fh:
+            assert fh.read() == 'some content'
+
+
+@pytest.mark.skipif(on_win, reason="relative symlinks are only preserved on unix")
+def test_reflink_keeps_relative_symlink():
+    with TemporaryDirectory() as td:
+        _write_file(join(td, 'target'), 'some content')
+        src = join(td, 'src')
+        dst = join(td, 'dst')
+        symlink('target', src)
+        create_link(src, dst, LinkType.reflink)
+        assert islink(dst)
+        assert os.readlink(dst) == 'target'
+
+
+def test_reflink_supported():
+    with TemporaryDirectory() as td:
+        src = join(td, 'src')
+        dst = join(td, 'dst')
+        _write_file(src, 'some content')
+        supported = reflink_supported(src, td)
+        assert supported in (True, False)
+        assert os.listdir(td) == ['src']
+
+        if supported:
+            # a real clone, never the copy fallback
+            with patch('conda.gateways.disk.create._do_copy', side_effect=AssertionError):
+                reflink(src, dst)
+        else:
+            log.info("reflink not supported on the filesystem of %s", td)
+            with pytest.raises(EnvironmentError):
+                _do_reflink(src, join(td, 'clone'))
+            with patch('conda.gateways.disk.create._do_copy', side_effect=_do_copy) as do_copy:
+                reflink(src, dst)
+            do_copy.assert_called_once_with(src, dst)
+
+        assert os.stat(src).st_ino != os.stat(dst).st_ino
+        with open(dst) as fh:
+            assert fh.read() == 'some content'
+        _write_file(dst, 'other content')
+        with open(src) as fh:
+            assert fh.read() == 'some content'
+
+
+@pytest.mark.parametrize('compression', ('', 'gz', 'bz2'))
+def test_extract_tarball_digests(compression):
+    with TemporaryDirectory() as td:
+        src = join(td, 'src')
+        os.makedirs(join(src, 'info'))
+        contents = {'info/index.json': '{}', 'lib/big.dat': 'x' * 1000000}
+        os.makedirs(join(src, 'lib'))
+        for short_path, content in contents.items():
+            _write_file(join(src, short_path), content)
+        tarball = join(td, 'pkg-1.0-0.tar.bz2')
+        with tarfile.open(tarball, 'w:' + compression) as t:
+            t.add(join(src, 'info'), 'info')
+            t.add(join(src, 'lib'), './lib')
+        with open(tarball, 'rb') as fh:
+            expected_md5 = hashlib.md5(fh.read()).hexdigest()
+
+        dst = join(td, 'pkg-1.0-0')
+        tarball_md5, member_digests = extract_tarball(tarball, dst)
+        assert tarball_md5 == expected_md5
+        assert {short_path: digest[:2] for short_path, digest in member_digests.items()} == {
+            short_path: (hashlib.sha256(content.encode('ascii')).hexdigest(), len(content))
+            for short_path, content in contents.items()
+        }
+        with open(join(dst, 'lib', 'big.dat')) as fh:
+            assert fh.read() == contents['lib/big.dat']
+
+        write_extract_manifest(dst, tarball, tarball_md5, member_digests)
+        manifest = read_extract_manifest(dst)
+        assert get_recorded_digest(manifest['tarball'], tarball, 'md5') == expected_md5
+        big_path = join(dst, 'lib', 'big.dat')
+        entry = manifest['paths']['lib/big.dat']
+        assert get_recorded_digest(entry, big_path) == member_digests['lib/big.dat'][0]
+
+        # a file modified after extraction must be hashed again
+        _write_file(big_path, 'y')
+        assert get_recorded_digest(entry, big_path) is None
+
+        # a file replaced since extraction is left out of the manifest
+        _write_file(big_path + '.new', 'x' * 1000000)
+        os.rename(big_path + '.new', big_path)
+        write_extract_manifest(dst, tarball, tarball_md5, member_digests)
+        assert 'lib/big.dat' not in read_extract_manifest(dst)['paths']
+
+
+@pytest.mark.parametrize('py3', (True, False))
+def test_extract_tarball_multi_stream_bz2(py3):
+    content = os.urandom(1000) * 300
+    tar_data = BytesIO()
+    with tarfile.open(fileobj=tar_data, mode='w') as t:
+        for short_path in ('info/index.json', 'lib/a.dat', 'lib/b.dat'):
+            tarinfo = tarfile.TarInfo(short_path)
+            tarinfo.size = len(content)
+            t.addfile(tarinfo, BytesIO(content))
+    tar_data = tar_data.getvalue()
+
+    with TemporaryDirectory() as td:
+        # one bzip2 stream per 100 KB block, as written by pbzip2
+        tarball = join(td, 'pkg-1.0-0.tar.bz2')
+        with open(tarball, 'wb') as fh:
+            for q in range(0, len(tar_data), 100000):
+                fh.write(bz2.compress(tar_data[q:q + 100000]))
+        with open(tarball, 'rb') as fh:
+            expected_md5 = hashlib.md5(fh.read()).hexdigest()
+
+        dst = join(td, 'pkg-1.0-0')
+        with patch('conda.gateways.disk.create.PY3', py3):
+            tarball_md5, member_digests = extract_tarball(tarball, dst)
+        assert tarball_md5 == expected_md5
+        assert sorted(member_digests) == ['info/index.json', 'lib/a.dat', 'lib/b.dat']
+        with open(join(dst, 'lib', 'b.dat'), 'rb') as fh:
+            assert fh.read() == content
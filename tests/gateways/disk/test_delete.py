@@ -7,10 +7,12 @@ from os.path import isdir, isfile, islink, join, lexists
 
 import pytest
 
+from conda.base.context import reset_context
 from conda.compat import TemporaryDirectory
 from conda.common.compat import on_win
+from conda.common.io import env_var
 from conda.gateways.disk.create import create_link, mkdir_p
-from conda.gateways.disk.delete import move_to_trash, rm_rf
+from conda.gateways.disk.delete import bulk_rm_rf, delete_trash, move_to_trash, rm_rf
 from conda.gateways.disk.link import islink, symlink
 from conda.gateways.disk.test import softlink_supported
 from conda.gateways.disk.update import touch
@@ -180,3 +182,45 @@ def test_try_rmdir_all_empty_doesnt_exist():
         assert isdir(td)
         try_rmdir_all_empty(td)
         assert not isdir(td)
+
+
+def _make_tree(root):
+    for q in range(3):
+        subdir = join(root, 'dir%d' % q, 'nested')
+        mkdir_p(subdir)
+        for r in range(50):
+            _write_file(join(subdir, 'file%d' % r), 'content')
+    _write_file(join(root, 'top'), 'content')
+
+
+def test_bulk_rm_rf():
+    with TemporaryDirectory() as tmp:
+        pkgs_dir = join(tmp, 'pkgs')
+        mkdir_p(pkgs_dir)
+        trees = [join(tmp, 'tree%d' % q) for q in range(3)]
+        for tree in trees:
+            _make_tree(tree)
+        outside_file = join(tmp, 'outside')
+        _write_file(outside_file, 'content')
+        if softlink_supported(outside_file, tmp):
+            create_link(tmp, join(trees[0], 'dir_link'), link_type=LinkType.softlink)
+        with env_var('CONDA_PKGS_DIRS', pkgs_dir, reset_context):
+            assert bulk_rm_rf(trees + [join(tmp, 'doesnt_exist')])
+            for tree in trees:
+                assert not lexists(tree)
+            assert isfile(outside_file)
+            assert os.listdir(join(pkgs_dir, '.trash')) == []
+
+
+def test_bulk_rm_rf_defer():
+    with TemporaryDirectory() as tmp:
+        pkgs_dir = join(tmp, 'pkgs')
+        mkdir_p(pkgs_dir)
+        tree = join(tmp, 'tree')
+        _make_tree(tree)
+        with env_var('CONDA_PKGS_DIRS', pkgs_dir, reset_context):
+            assert bulk_rm_rf((tree,), defer=True)
+            assert not lexists(tree)
+            assert len(os.listdir(join(pkgs_dir, '.trash'))) == 1
+            delete_trash()
+            assert os.listdir(join(pkgs_dir, '.trash')) == []
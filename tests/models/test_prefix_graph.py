@@ -1,7 +1,10 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+from logging import getLogger
 from pprint import pprint
+import random
+from time import time
 
 from conda._vendor.auxlib.decorators import memoize
 from conda.base.context import reset_context
@@ -10,6 +13,7 @@ from conda.exceptions import CyclicalDependencyError
 from conda.models.match_spec import MatchSpec
 import conda.models.prefix_graph
 from conda.models.prefix_graph import PrefixGraph
+from conda.models.records import PackageRecord
 import pytest
 from tests.core.test_solve import get_solver_4, get_solver_5
 
@@ -18,6 +22,8 @@ try:
 except ImportError:
     from mock import Mock, patch
 
+log = getLogger(__name__)
+
 @memoize
 def get_conda_build_record_set():
     specs = MatchSpec("conda"), MatchSpec("conda-build"), MatchSpec("intel-openmp"),
@@ -920,3 +926,57 @@ def test_deep_cyclical_dependency():
         'sqlite',
     )
     assert nodes == order
+
+
+def _make_random_records(count, seed=0):
+    # each package depends on up to five packages with a lower number, so the graph is acyclic
+    rng = random.Random(seed)
+    records = []
+    for q in range(count):
+        depends = sorted(set('pkg%d >=1.0' % rng.randrange(q) for _ in range(min(q, 5))))
+        records.append(PackageRecord(
+            name='pkg%d' % q, version='1.0', build='0', build_number=0, channel='defaults',
+            subdir='linux-64', fn='pkg%d-1.0-0.tar.bz2' % q, depends=depends,
+        ))
+    return records
+
+
+def test_random_graph_matches_brute_force():
+    records = _make_random_records(200)
+    specs = (MatchSpec('pkg199'), MatchSpec('pkg150'))
+    graph = PrefixGraph(records, specs)
+    for rec in records:
+        dep_specs = tuple(MatchSpec(d) for d in rec.depends)
+        assert graph.graph[rec] == set(r for r in records
+                                       if any(ms.match(r) for ms in dep_specs))
+    order = tuple(graph.graph)
+    for rec in order:
+        assert all(order.index(parent) < order.index(rec) for parent in graph.graph[rec])
+
+    # prune leaves exactly the specs and their ancestors
+    kept = set(graph.all_ancestors(graph.get_node_by_name('pkg199')))
+    kept |= set(graph.all_ancestors(graph.get_node_by_name('pkg150')))
+    kept |= {graph.get_node_by_name('pkg199'), graph.get_node_by_name('pkg150')}
+    removed = graph.prune()
+    assert set(graph.graph) == kept
+    assert set(removed) == set(records) - kept
+    assert all(not (parents - kept) for parents in graph.graph.values())
+
+    removed = graph.remove_youngest_descendant_nodes_with_specs()
+    assert 'pkg199' in [rec.name for rec in removed]
+    assert all(not (parents & set(removed)) for parents in graph.graph.values())
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize('count', (100, 500, 1000, 2500, 5000))
+def test_benchmark_prefix_graph_scaling(count):
+    records = _make_random_records(count)
+    start = time()
+    graph = PrefixGraph(records, (MatchSpec('pkg%d' % (count - 1)),))
+    built = time()
+    graph.prune()
+    pruned = time()
+    log.info("PrefixGraph with %d nodes: build %.3fs, prune %.3fs",
+             count, built - start, pruned - built)
+    # quadratic construction took about 35s for 1500 nodes
+    assert built - start < count / 500.0
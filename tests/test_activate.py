@@ -17,10 +17,12 @@ from conda.activate import CmdExeActivator, CshActivator, FishActivator, PosixAc
     PowershellActivator, XonshActivator, activator_map, main as activate_main, native_path_to_unix
 from conda.base.constants import ROOT_ENV_NAME
 from conda.base.context import context, reset_context
+from conda.cli.main import main as conda_main
 from conda.common.compat import ensure_text_type, iteritems, on_win, \
     string_types
 from conda.common.io import captured, env_var, env_vars
 from conda.exceptions import EnvironmentLocationNotFound, EnvironmentNameNotFound
+from conda.gateways.activation_cache import ActivationCache
 from conda.gateways.disk.create import mkdir_p
 from conda.gateways.disk.delete import rm_rf
 from conda.gateways.disk.update import touch
@@ -551,6 +553,63 @@ class ActivatorUnitTests(TestCase):
                     assert builder['activate_scripts'] == ()
                     assert builder['deactivate_scripts'] == (activator.path_conversion(deactivate_d_1),)
 
+    def test_activation_cache(self):
+        with tempdir() as td:
+            prefix = join(td, 'env')
+            mkdir_p(join(prefix, 'conda-meta'))
+            activate_d_dir = mkdir_p(join(prefix, 'etc', 'conda', 'activate.d'))
+
+            def _activate():
+                with captured() as c:
+                    rc = conda_main('conda', 'shell.posix', 'activate', prefix)
+                assert rc == 0 and not c.stderr
+                return c.stdout
+
+            with patch('conda.gateways.activation_cache.ACTIVATE_CACHE_DIR', join(td, 'cache')):
+                first = _activate()
+                assert len(os.listdir(join(td, 'cache'))) == 1
+
+                with patch.object(PosixActivator, 'execute', side_effect=AssertionError):
+                    assert _activate() == first
+
+                # a new activate.d script invalidates the cached commands
+                touch(join(activate_d_dir, 'new-script.sh'))
+                second = _activate()
+                assert second != first
+                assert 'new-script.sh' in second
+
+                # so does a different PATH
+                with env_var('PATH', os.pathsep.join((td, os.environ['PATH']))):
+                    assert td + os.pathsep in _activate()
+                with patch.object(PosixActivator, 'execute', side_effect=AssertionError):
+                    assert _activate() == second
+
+                # and so does pointing $CONDARC at another file
+                with open(join(td, 'condarc'), 'w') as fh:
+                    fh.write('changeps1: false\n')
+                with env_var('CONDARC', join(td, 'condarc')):
+                    assert ActivationCache('posix', ('activate', prefix)).load() is None
+
+    @pytest.mark.slow
+    @pytest.mark.skipif(on_win, reason="times a posix activation")
+    def test_benchmark_activation_cache(self):
+        from subprocess import check_output
+        from time import time
+        with tempdir() as td:
+            prefix = join(td, 'env')
+            mkdir_p(join(prefix, 'conda-meta'))
+            cmd = (sys.executable, '-m', 'conda', 'shell.posix', 'activate', prefix)
+            with env_vars({'HOME': td, 'PYTHONPATH': dirname(CONDA_PACKAGE_ROOT)}):
+                timings = []
+                for _ in range(3):
+                    start = time()
+                    output = check_output(cmd)
+                    timings.append(time() - start)
+                    assert ensure_text_type(output).startswith("PS1=")
+            assert isdir(join(td, '.conda', 'activate_cache'))
+            log.info("conda shell.posix activate: uncached %.3fs, cached %.3fs, %.3fs",
+                     *timings)
+
 
 class ShellWrapperUnitTests(TestCase):
 
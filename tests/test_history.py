@@ -204,4 +204,53 @@ def test_minimum_conda_version_error():
         exception_string = repr(exc.value)
         print(exception_string)
         assert "minimum conda version: 42.42" in exception_string
-        assert "$ conda install -p" in exception_string
\ No newline at end of file
+        assert "$ conda install -p" in exception_string
+
+def test_history_index():
+    with tempdir() as prefix:
+        mkdir_p(join(prefix, 'conda-meta'))
+        h = History(prefix)
+
+        def write_revision(rev, link, unlink=(), specs=()):
+            with open(h.path, 'a') as fh:
+                fh.write("==> 2018-01-01 00:00:%02d <==\n" % (rev % 60))
+                fh.write("# cmd: conda install %s\n" % ' '.join(specs))
+                for dist in unlink:
+                    fh.write("-%s\n" % dist)
+                for dist in link:
+                    fh.write("+%s\n" % dist)
+                if specs:
+                    fh.write("# update specs: %s\n" % list(specs))
+
+        write_revision(0, ('python-3.6.0-0', 'zlib-1.2.11-0'), specs=('python',))
+        for rev in range(1, 12):
+            write_revision(rev, ('pkg%d-1.0-0' % rev,), ('pkg%d-1.0-0' % (rev - 1),) if rev > 1
+                           else (), specs=('pkg%d' % rev,))
+
+        with mock.patch('conda.history.HISTORY_INDEX_MIN_SIZE', 0), \
+                mock.patch('conda.history.HISTORY_CHECKPOINT_INTERVAL', 3):
+            states = [state for _, state in h.construct_states()]
+            assert h.get_state() == states[-1]
+            assert isfile(h.index_path)
+            for rev in range(-len(states), len(states)):
+                assert h.get_state(rev) == states[rev]
+
+            # revisions appended after the index was written are replayed from the tail
+            write_revision(12, ('pkg12-1.0-0',), ('pkg11-1.0-0',), specs=('pkg12',))
+            write_revision(13, ('numpy-1.15.0-0',), specs=('numpy',))
+            states = [state for _, state in h.construct_states()]
+            assert h.get_state() == states[-1]
+            assert h.get_state(12) == states[12]
+
+            with mock.patch.object(History, 'parse', side_effect=AssertionError):
+                assert h.get_state() == states[-1]
+                assert set(h._load_indexed()[0]['specs']) == {'python'} | {
+                    'pkg%d' % rev for rev in range(1, 13)}
+
+            # a rewritten history file invalidates the index
+            with open(h.path, 'w') as fh:
+                fh.write('')
+            write_revision(0, ('zlib-1.2.11-0',))
+            write_revision(1, ('xz-5.2.4-0',))
+            assert h.get_state() == {'zlib-1.2.11-0', 'xz-5.2.4-0'}
+            assert h._load_indexed()[0]['revisions'] == 1
@@ -5,12 +5,21 @@ Created to test py3k compatibility.
 
 from __future__ import print_function, division, absolute_import
 
+from logging import getLogger
 import os
+from os.path import join
+from subprocess import PIPE, Popen
 import sys
 import unittest
+
+import pytest
+
 import conda
+from conda.compat import TemporaryDirectory
 from conda.utils import on_win
 
+log = getLogger(__name__)
+
 PREFIX = os.path.dirname(os.path.abspath(conda.__file__))
 
 
@@ -54,5 +63,68 @@ class TestImportAllConda(unittest.TestCase):
         self._test_import('_vendor')
 
 
+# Upper bounds, in ms, on the summed import time of top-level conda modules for a command,
+# along with modules the command must not import at all. The budgets are a few times the
+# measured cost so the test only trips on real regressions.
+IMPORT_TIME_CASES = (
+    (('--version',), 400, ('requests', 'ruamel.yaml', 'conda._vendor.tqdm',
+                           'conda._vendor.auxlib.entity', 'conda.base.context')),
+    (('shell.bash', 'hook'), 600, ('requests', 'ruamel.yaml', 'conda._vendor.tqdm',
+                                   'conda._vendor.auxlib.entity')),
+    (('list', '-p', '{prefix}'), 1200, ('requests', 'ruamel.yaml', 'conda._vendor.tqdm')),
+    (('info', '--envs'), 1200, ('requests', 'ruamel.yaml', 'conda._vendor.tqdm')),
+)
+
+
+def _import_times(args):
+    with TemporaryDirectory() as home:
+        prefix = join(home, 'env')
+        os.makedirs(join(prefix, 'conda-meta'))
+        open(join(prefix, 'conda-meta', 'history'), 'w').close()
+        args = tuple(arg.format(prefix=prefix) for arg in args)
+
+        env = dict(os.environ)
+        env.pop('CONDARC', None)
+        env.update({
+            'HOME': home,
+            'USERPROFILE': home,
+            'PYTHONPATH': os.pathsep.join(path for path in (os.path.dirname(PREFIX),
+                                                            env.get('PYTHONPATH')) if path),
+        })
+        p = Popen((sys.executable, '-X', 'importtime', '-m', 'conda') + args,
+                  stdout=PIPE, stderr=PIPE, env=env)
+        stdout, stderr = p.communicate()
+    assert p.returncode == 0, (args, stdout, stderr)
+    times = {}
+    for line in stderr.decode('utf-8').splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line.split('|')
+        if cumulative.strip().isdigit():
+            times[name.rstrip()] = int(cumulative)
+    return times
+
+
+@pytest.mark.skipif(sys.version_info < (3, 7), reason="-X importtime requires python 3.7")
+@pytest.mark.parametrize('args,forbidden', [(args, forbidden)
+                                             for args, _, forbidden in IMPORT_TIME_CASES])
+def test_import_forbidden_modules(args, forbidden):
+    imported = set(name.strip() for name in _import_times(args))
+    assert not imported.intersection(forbidden), (args, imported.intersection(forbidden))
+
+
+@pytest.mark.slow
+@pytest.mark.skipif(sys.version_info < (3, 7), reason="-X importtime requires python 3.7")
+@pytest.mark.parametrize('args,budget_ms', [(args, budget_ms)
+                                            for args, budget_ms, _ in IMPORT_TIME_CASES])
+def test_import_time_budget(args, budget_ms):
+    # wall-clock timing depends on the machine, so this is only run with the slow tests
+    times = _import_times(args)
+    conda_ms = sum(cumulative for name, cumulative in times.items()
+                   if name.startswith(' conda')) / 1000.
+    log.info("conda %s: %.0f ms importing conda modules", ' '.join(args), conda_ms)
+    assert conda_ms < budget_ms, (args, conda_ms)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,9 +1,15 @@
+import os
 import os.path
 import sys
 import unittest
 
+import pytest
+
+from conda.base.constants import PREFIX_MAGIC_FILE
+from conda.core.prefix_data import PrefixData, delete_prefix_from_linked_data
 from conda.core.subdir_data import cache_fn_url
-from conda.misc import url_pat, walk_prefix
+from conda.misc import _file_contains, untracked, url_pat, walk_prefix
+from conda.models.records import PrefixRecord
 
 
 class TestMisc(unittest.TestCase):
@@ -71,5 +77,40 @@ def test_walk_prefix(tmpdir):  # tmpdir is a py.test utility
     assert walk_prefix(tmpdir.strpath) == answer
 
 
+@pytest.mark.skipif(sys.platform == 'win32', reason="symlinks need privileges on windows")
+def test_walk_prefix_symlinked_dir(tmpdir):
+    make_mock_directory(tmpdir, {"lib": {"real": {"testfile": None}}})
+    os.symlink(tmpdir.join("lib", "real").strpath, tmpdir.join("lib", "link").strpath)
+    os.symlink(tmpdir.join("missing").strpath, tmpdir.join("lib", "broken").strpath)
+
+    # symlinks to directories are listed, but not followed
+    assert walk_prefix(tmpdir.strpath) == {"lib/real/testfile", "lib/link", "lib/broken"}
+
+
+def test_untracked(tmpdir):
+    make_mock_directory(tmpdir, {
+        "conda-meta": {"history": None},
+        "lib": {"foo.py": None, "foo.pyc": None, "bar.py": None, "bar.py~": None},
+    })
+    prefix = tmpdir.strpath
+    try:
+        PrefixData(prefix).insert(PrefixRecord(
+            name='foo', version='1.0', build='0', build_number=0, channel='defaults',
+            subdir='noarch', fn='foo-1.0-0.tar.bz2', files=('lib/foo.py',),
+        ))
+        assert os.path.isfile(os.path.join(prefix, PREFIX_MAGIC_FILE))
+        assert untracked(prefix) == {"lib/bar.py"}
+    finally:
+        delete_prefix_from_linked_data(prefix)
+
+
+def test_file_contains(tmpdir):
+    path = tmpdir.join("data")
+    path.write_binary(b"x" * 10 + b"/opt/prefix" + b"y" * 10)
+    for chunk_size in (1, 5, 15, 1024):
+        assert _file_contains(path.strpath, b"/opt/prefix", chunk_size)
+        assert not _file_contains(path.strpath, b"/opt/other", chunk_size)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -6,12 +6,14 @@ import unittest
 from datetime import datetime
 import pytest
 
+from conda.base.constants import MAX_CHANNEL_PRIORITY
 from conda.base.context import context, reset_context
 from conda.common.compat import iteritems, itervalues
 from conda.common.io import env_var
 from conda.exceptions import UnsatisfiableError
 from conda.models.channel import Channel
 from conda.models.records import PackageRecord
+from conda.models.version import VersionOrder
 from conda.resolve import MatchSpec, Resolve, ResolvePackageNotFound
 
 from .helpers import get_index_r_1, raises, get_index_r_4
@@ -1624,6 +1626,36 @@ def test_channel_priority_2():
         }
 
 
+def test_version_key_ranks_versions_per_group():
+    this_index = index.copy()
+    index4, r4 = get_index_r_4()
+    this_index.update(index4)
+    channels = (Channel('channel-1'), Channel('channel-4'))
+
+    def reference_key(r, prec):
+        channel_priority = r._channel_priorities_map.get(prec.channel.name, 1)
+        valid = 1 if channel_priority < MAX_CHANNEL_PRIORITY else 0
+        version = VersionOrder(prec.version)
+        if context.channel_priority:
+            return (valid, -channel_priority, version, prec.build_number, prec.get('timestamp', 0),
+                    prec.build)
+        else:
+            return (valid, version, -channel_priority, prec.build_number, prec.get('timestamp', 0),
+                    prec.build)
+
+    numpy_prec = next(prec for prec in this_index if prec.name == 'numpy')
+    outside_index = [PackageRecord.from_objects(numpy_prec, version=version)
+                     for version in ('1.6.0', '1.7.1.0', '1.8rc1', '99')]
+
+    for channel_priority in ("True", "False"):
+        with env_var("CONDA_CHANNEL_PRIORITY", channel_priority, reset_context):
+            this_r = Resolve(this_index, channels=channels)
+            for name, group in iteritems(this_r.groups):
+                precs = group + outside_index if name == 'numpy' else group
+                assert (sorted(precs, key=this_r.version_key)
+                        == sorted(precs, key=lambda prec: reference_key(this_r, prec)))
+
+
 def test_dependency_sort():
     specs = ['pandas','python 2.7*','numpy 1.6*']
     installed = r.install(specs)